@@ -1,18 +1,29 @@
-from tokens import Token
-
 """
 ====================
        树结点
 ====================
 is_normal_node: bool, 该结点是一个正常结点，还是一个包含错误子串的未解析成功的结点。
-info: list[Token], 打包起来的错误子串，最后我们要根据这个错误子串来将这个结点修复为正确结点。
+info: tuple[int, int], 错误恢复时被跳过的错误子串在源码中的区间[start, end)，最后我们要根据
+      这个错误子串来将这个结点修复为正确结点。正常结点都是同一个空元组()。
+span: tuple[int, int], 结点在源码中的区间[start, end)。声明、语句块、if语句和错误结点会记录，
+      表达式和参数为None。增量重解析靠它找到编辑所在的子树。
 """
 
 
 class Tree:
+    __slots__ = ("is_normal_node", "info", "span")
+    # 所有字段名，基类的在前，由__init_subclass__按各个类的__slots__收集
+    _fields = __slots__
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = cls._fields + cls.__dict__.get("__slots__", ())
+
     def __init__(self):
         self.is_normal_node = True
-        self.info: list[Token] = []
+        # 正常结点共用同一个空元组，只有错误结点才另外分配
+        self.info: tuple[int, int] = ()
+        self.span: tuple[int, int] = None
         return
 
 
@@ -25,6 +36,8 @@ package_name: str, 包名
 
 
 class PackageDecl(Tree):
+    __slots__ = ("package_name",)
+
     def __init__(self, package_name: str):
         super().__init__()
         self.package_name = package_name
@@ -42,6 +55,8 @@ defs: list[Tree], 类体，类体中只能有
 
 
 class ClassDecl(Tree):
+    __slots__ = ("name", "defs", "access", "extends")
+
     def __init__(self, access: int, class_name: str, defs: list[Tree], extends: Tree):
         super().__init__()
         self.name = class_name
@@ -57,10 +72,13 @@ class ClassDecl(Tree):
 ====================
 package_decl: str, 包名
 defs: list[ClassDecl], 该文件下的所有类定义
+source: str, 对应的源码，只有incremental.parse会记录，其余情况下没有这个字段
 """
 
 
 class CompilationUnit(Tree):
+    __slots__ = ("package_decl", "defs", "source")
+
     def __init__(self, pack_name: PackageDecl, defs: list[ClassDecl]):
         super().__init__()
         self.package_decl = pack_name
@@ -84,6 +102,8 @@ class CompilationUnit(Tree):
 
 
 class Statement(Tree):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
         return
@@ -98,6 +118,8 @@ class Statement(Tree):
 
 
 class Expression(Tree):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
         return
@@ -112,12 +134,64 @@ defs: list[Statement], 块中所有语句
 
 
 class Block(Tree):
+    __slots__ = ("defs",)
+
     def __init__(self, defs: list[Statement]):
         super().__init__()
         self.defs = defs
         return
 
 
+class LazyBlock(Block):
+    """
+    outline模式下还没有解析的方法体(见Parser的outline参数)。内存布局和Block一样，
+    defs的位置先存着(loader, start, end)；第一次读写任何字段时调用loader(start, end)
+    解析[start, end)这段源码，填好各个字段，自己变成普通的Block。
+    type(node) is LazyBlock说明方法体还没有解析过
+    """
+
+    __slots__ = ()
+
+    def __init__(self, loader, start: int, end: int):
+        _slots["defs"].__set__(self, (loader, start, end))
+        return
+
+    def load(self):
+        if type(self) is not LazyBlock:
+            return
+        loader, start, end = _slots["defs"].__get__(self)
+        block = loader(start, end)
+        self.__class__ = Block
+        self.defs = block.defs
+        self.is_normal_node = block.is_normal_node
+        self.info = block.info
+        self.span = block.span
+        return
+
+    def __reduce__(self):
+        self.load()
+        return self.__reduce_ex__(2)
+
+
+def _loading(name: str) -> property:
+    slot = _slots[name]
+
+    def get(self):
+        self.load()
+        return slot.__get__(self)
+
+    def set(self, value):
+        self.load()
+        slot.__set__(self, value)
+
+    return property(get, set)
+
+
+_slots = {name: getattr(Block, name) for name in Block._fields}
+for _name in Block._fields:
+    setattr(LazyBlock, _name, _loading(_name))
+
+
 """
 ====================
       变量定义
@@ -129,6 +203,8 @@ initialization: Expression, 变量的初始化表达式
 
 
 class VarDecl(Statement):
+    __slots__ = ("access", "var_type", "initialization")
+
     def __init__(self, access: int, var_type: Expression, initialization: Expression):
         super().__init__()
         self.access = access
@@ -148,6 +224,8 @@ else_part: Statement, if(...) {then_part} else {else_part}
 
 
 class IfStatement(Statement):
+    __slots__ = ("cond", "then_part", "else_part")
+
     def __init__(self, cond: Expression, then_part: Statement, else_part: Statement):
         super().__init__()
         self.cond = cond
@@ -164,6 +242,8 @@ tag: str，表示何种基本类型，比如int基本类型就是"int"
 
 
 class PrimitiveType(Expression):
+    __slots__ = ("tag",)
+
     def __init__(self, type_tag: str):
         super().__init__()
         self.tag = type_tag
@@ -178,6 +258,8 @@ name: str, 标识符的名称
 
 
 class Ident(Expression):
+    __slots__ = ("name",)
+
     def __init__(self, name):
         super().__init__()
         self.name = name
@@ -196,6 +278,8 @@ body: Block, 方法体
 
 
 class MethodDecl(Tree):
+    __slots__ = ("restype", "name", "params", "body", "access")
+
     def __init__(
         self,
         access: int,
@@ -222,6 +306,8 @@ value: 具体值
 
 
 class Literal(Expression):
+    __slots__ = ("type_tag", "value")
+
     def __init__(self, type_tag: str, value):
         super().__init__()
         self.type_tag = type_tag
@@ -238,7 +324,186 @@ rhs: Expression, 赋值的右值
 
 
 class Assignment(Expression):
+    __slots__ = ("lhs", "rhs")
+
     def __init__(self, lhs: Expression, rhs: Expression):
         super().__init__()
         self.lhs = lhs
         self.rhs = rhs
+
+
+"""
+====================
+       结点布局
+====================
+schemas: 各结点类构造函数的参数：(字段名, 种类)，种类是"value"、"node"或者"nodes"(list)。
+         arena按它存结点，serialize按它写结点，遍历按它找子结点(child_slots)
+"""
+
+schemas: dict[type, tuple[tuple[str, str], ...]] = {
+    PackageDecl: (("package_name", "value"),),
+    ClassDecl: (("access", "value"), ("name", "node"), ("defs", "nodes"), ("extends", "node")),
+    CompilationUnit: (("package_decl", "node"), ("defs", "nodes")),
+    Statement: (),
+    Expression: (),
+    Block: (("defs", "nodes"),),
+    VarDecl: (("access", "value"), ("var_type", "node"), ("initialization", "node")),
+    IfStatement: (("cond", "node"), ("then_part", "node"), ("else_part", "node")),
+    PrimitiveType: (("tag", "value"),),
+    Ident: (("name", "value"),),
+    MethodDecl: (
+        ("access", "value"),
+        ("restype", "node"),
+        ("name", "value"),
+        ("params", "nodes"),
+        ("body", "node"),
+    ),
+    Literal: (("type_tag", "value"), ("value", "value")),
+    Assignment: (("lhs", "node"), ("rhs", "node")),
+}
+
+
+"""
+====================
+       构造接口
+====================
+Parser通过builder创建结点和设置区间、错误信息，默认的TreeBuilder直接创建上面这些对象，
+arena.ArenaBuilder则把结点写进扁平数组，返回的是下标，events.EventBuilder不建结点，
+只产生事件。enter在类和方法的头部(到名字为止)解析完时调用，这时结点还没有创建。
+lazy在outline模式下代替方法体，loader(start, end)能解析出源码[start, end)处的块。
+"""
+
+
+class TreeBuilder:
+    def make(self, cls: type, *args) -> Tree:
+        return cls(*args)
+
+    def set_span(self, node: Tree, start: int, end: int):
+        node.span = (start, end)
+
+    def set_error(self, node: Tree, info: tuple[int, int], policy=None):
+        node.is_normal_node = False
+        node.info = info
+
+    def enter(self, cls: type, name, access: int, start: int, end: int):
+        pass
+
+    def lazy(self, loader, start: int, end: int) -> Tree:
+        return LazyBlock(loader, start, end)
+
+    def add_def(self, unit: CompilationUnit, node: Tree):
+        unit.add_def(node)
+
+    def result(self, unit: CompilationUnit):
+        return unit
+
+
+"""
+====================
+       树的遍历
+====================
+fields: 结点的各个字段，结点类都用__slots__，没有__dict__，不能用vars
+child_slots: 结点类里可能放子结点的字段，由schemas得出并按类缓存，不用逐个字段isinstance
+walk: 先序遍历node及其所有子孙结点，用显式栈，不受递归深度限制，
+      prune(node)为真时不进入node的子结点(node本身还是会给出)
+shift: 把子树中记录的源码区间整体平移delta，用于把一段源码单独解析出的树放回原处
+to_dict: 把子树转成只含dict、list和基本类型的结构，可以直接json.dumps，结点类型记在"type"里
+"""
+
+
+def fields(node: Tree):
+    """
+    依次给出(字段名, 值)，没有赋过值的字段跳过
+    """
+    for name in node._fields:
+        value = getattr(node, name, _unset)
+        if value is not _unset:
+            yield name, value
+
+
+_unset = object()
+
+
+_child_slots: dict[type, tuple[tuple[str, bool], ...]] = {}
+
+
+def child_slots(cls: type) -> tuple[tuple[str, bool], ...]:
+    """
+    cls的结点里可能放子结点的字段：(字段名, 是否是list)
+    """
+    slots = _child_slots.get(cls)
+    if slots is None:
+        # 没有自己schema的子类(比如LazyBlock)用最近的有schema的基类的
+        base = next((c for c in cls.__mro__ if c in schemas), None)
+        if base is not None:
+            slots = tuple((name, kind == "nodes") for name, kind in schemas[base] if kind != "value")
+        else:
+            slots = tuple(
+                (name, False) for name in cls._fields if name not in ("is_normal_node", "info", "span")
+            )
+        _child_slots[cls] = slots
+    return slots
+
+
+def iter_children(node: Tree):
+    for name, many in child_slots(type(node)):
+        value = getattr(node, name, None)
+        if many:
+            if isinstance(value, list):
+                for child in value:
+                    if isinstance(child, Tree):
+                        yield child
+        elif isinstance(value, Tree):
+            yield value
+
+
+def children(node: Tree) -> list[Tree]:
+    return list(iter_children(node))
+
+
+def walk(node: Tree, prune=None):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        if prune is not None and prune(node):
+            continue
+        start = len(stack)
+        for name, many in child_slots(type(node)):
+            value = getattr(node, name, None)
+            if many:
+                if isinstance(value, list):
+                    stack.extend(child for child in value if isinstance(child, Tree))
+            elif isinstance(value, Tree):
+                stack.append(value)
+        stack[start:] = reversed(stack[start:])
+
+
+def shift(node: Tree, delta: int):
+    for n in walk(node):
+        if n.span is not None:
+            n.span = (n.span[0] + delta, n.span[1] + delta)
+        if not n.is_normal_node:
+            n.info = (n.info[0] + delta, n.info[1] + delta)
+
+
+def to_dict(value):
+    # 和walk一样用显式栈：先建好空的dict/list占位，栈里记(值, 放到哪个容器, 键)
+    root = [None]
+    stack = [(value, root, 0)]
+    while stack:
+        value, owner, key = stack.pop()
+        if isinstance(value, Tree):
+            if type(value) is LazyBlock:
+                value.load()
+            result = {"type": type(value).__name__}
+            for name, field in fields(value):
+                result[name] = None
+                stack.append((field, result, name))
+        elif isinstance(value, (list, tuple)):
+            result = [None] * len(value)
+            stack.extend((item, result, i) for i, item in enumerate(value))
+        else:
+            result = value
+        owner[key] = result
+    return root[0]
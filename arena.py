@@ -0,0 +1,271 @@
+from array import array
+
+from Tree import *
+
+"""
+====================
+     扁平语法树
+====================
+把整棵树存在几个平行的数组里，结点用下标表示，不为每个结点创建Python对象：
+kinds: 结点类型在node_classes中的编号
+roles: 结点是父结点的第几个字段(见Tree.schemas)，同一个list字段里的结点role相同
+parents, first_child, next_sibling: 树的结构，0表示没有，下标0是占位，不是结点
+starts, ends: 结点的span，没有时为-1
+payloads: values中的下标，values[payload]是结点所有非list字段的值组成的元组，
+          是子结点的字段在元组里是None。相同的元组只存一份，名字和字面量大量重复时很省
+flags: 1是正常结点，0是错误结点，错误结点的info另存在infos里
+
+解析出错时已经建好的一部分结点会被丢弃，它们留在数组里但不在树上，kind记为DETACHED。
+
+Parser(..., flat=True)直接建出FlatTree。view(index)给出一个轻量的视图对象，
+有和Tree.py中的类同样的属性，to_tree(index)可以转回普通的树。
+"""
+
+node_classes = list(schemas)
+DETACHED = 255
+_kind_of = {cls: kind for kind, cls in enumerate(node_classes)}
+# 每种结点的字段名 -> (在schemas中的位置, 种类, 在payload元组中的位置)
+_layouts = []
+for _cls in node_classes:
+    _layout, _slot = {}, 0
+    for _role, (_name, _type) in enumerate(schemas[_cls]):
+        _layout[_name] = (_role, _type, _slot)
+        if _type != "nodes":
+            _slot += 1
+    _layouts.append(_layout)
+
+
+class FlatTree:
+    def __init__(self):
+        self.kinds = array("B", [0])
+        self.roles = array("B", [0])
+        self.flags = array("B", [1])
+        self.parents = array("i", [0])
+        self.first_child = array("i", [0])
+        self.next_sibling = array("i", [0])
+        self.starts = array("i", [-1])
+        self.ends = array("i", [-1])
+        self.payloads = array("i", [0])
+        self.values: list[tuple] = [()]
+        self.infos: dict[int, tuple[int, int]] = {}
+        self.root = 0
+        self.detached = 0
+        return
+
+    def __len__(self):
+        """
+        树上的结点数，不算下标0的占位和被丢弃的结点
+        """
+        return len(self.kinds) - 1 - self.detached
+
+    def children(self, index: int):
+        child = self.first_child[index]
+        next_sibling = self.next_sibling
+        while child:
+            yield child
+            child = next_sibling[child]
+
+    def walk(self, index: int = None):
+        """
+        先序遍历，给出结点下标
+        """
+        first_child, next_sibling, parents = self.first_child, self.next_sibling, self.parents
+        top = node = self.root if index is None else index
+        # 沿着first_child往下，没有孩子时找自己或祖先的next_sibling，不需要栈
+        while True:
+            yield node
+            child = first_child[node]
+            if child:
+                node = child
+                continue
+            while node != top and not next_sibling[node]:
+                node = parents[node]
+            if node == top:
+                return
+            node = next_sibling[node]
+
+    def count(self, cls: type) -> int:
+        return self.kinds.count(_kind_of[cls])
+
+    def error_count(self) -> int:
+        return self.flags.count(0)
+
+    def node_class(self, index: int) -> type:
+        return node_classes[self.kinds[index]]
+
+    def span(self, index: int):
+        start = self.starts[index]
+        return None if start < 0 else (start, self.ends[index])
+
+    def info(self, index: int):
+        return self.infos.get(index, ())
+
+    def child(self, index: int, role: int) -> int:
+        """
+        第role个字段上的子结点，没有时为0
+        """
+        for child in self.children(index):
+            if self.roles[child] == role:
+                return child
+        return 0
+
+    def field(self, index: int, name: str, convert):
+        """
+        结点的一个字段，子结点经过convert(下标)转换，list字段给出转换结果的list
+        """
+        role, type_, slot = _layouts[self.kinds[index]][name]
+        if type_ == "nodes":
+            roles = self.roles
+            return [convert(child) for child in self.children(index) if roles[child] == role]
+        if type_ == "node":
+            child = self.child(index, role)
+            if child:
+                return convert(child)
+        return self.values[self.payloads[index]][slot]
+
+    def view(self, index: int = None) -> "NodeView":
+        return NodeView(self, self.root if index is None else index)
+
+    def to_tree(self, index: int = None) -> Tree:
+        """
+        转成Tree.py中的对象
+        """
+        if index is None:
+            index = self.root
+        cls = node_classes[self.kinds[index]]
+        node = cls(*[self.field(index, name, self.to_tree) for name, _ in schemas[cls]])
+        node.span = self.span(index)
+        if not self.flags[index]:
+            node.is_normal_node = False
+            node.info = self.infos[index]
+        return node
+
+
+class NodeView:
+    """
+    FlatTree中一个结点的视图，属性和Tree.py中对应的类相同，子结点同样以视图给出
+    """
+
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree: FlatTree, index: int):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def node_class(self) -> type:
+        return self.tree.node_class(self.index)
+
+    @property
+    def is_normal_node(self) -> bool:
+        return bool(self.tree.flags[self.index])
+
+    @property
+    def info(self):
+        return self.tree.info(self.index)
+
+    @property
+    def span(self):
+        return self.tree.span(self.index)
+
+    def __getattr__(self, name: str):
+        tree = self.tree
+        if name not in _layouts[tree.kinds[self.index]]:
+            raise AttributeError(f"{self.node_class.__name__} has no field {name!r}")
+        return tree.field(self.index, name, tree.view)
+
+    def __eq__(self, other):
+        return isinstance(other, NodeView) and self.tree is other.tree and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    def __repr__(self):
+        return f"<{self.node_class.__name__} view #{self.index}>"
+
+
+class ArenaBuilder(TreeBuilder):
+    """
+    供Parser使用：make返回结点下标而不是对象，结点按创建的先后追加到FlatTree中
+    """
+
+    def __init__(self):
+        self.tree = FlatTree()
+        self.last_child = array("i", [0])
+        self.interned: dict[tuple, int] = {(): 0}
+        return
+
+    def make(self, cls: type, *args) -> int:
+        tree = self.tree
+        kind = _kind_of[cls]
+        index = len(tree.kinds)
+        tree.kinds.append(kind)
+        tree.roles.append(0)
+        tree.flags.append(1)
+        tree.parents.append(0)
+        tree.first_child.append(0)
+        tree.next_sibling.append(0)
+        tree.starts.append(-1)
+        tree.ends.append(-1)
+        self.last_child.append(0)
+
+        payload = []
+        for role, ((_, type_), arg) in enumerate(zip(schemas[cls], args)):
+            if type_ == "nodes":
+                for child in arg:
+                    self.link(index, role, child)
+                continue
+            if type_ == "node" and _is_handle(arg):
+                self.link(index, role, arg)
+                arg = None
+            payload.append(arg)
+        payload = tuple(payload)
+        slot = self.interned.get(payload)
+        if slot is None:
+            slot = self.interned[payload] = len(tree.values)
+            tree.values.append(payload)
+        tree.payloads.append(slot)
+        return index
+
+    def link(self, parent: int, role: int, child: int):
+        tree = self.tree
+        tree.parents[child] = parent
+        tree.roles[child] = role
+        last = self.last_child[parent]
+        if last:
+            tree.next_sibling[last] = child
+        else:
+            tree.first_child[parent] = child
+        self.last_child[parent] = child
+
+    def set_span(self, node: int, start: int, end: int):
+        self.tree.starts[node] = start
+        self.tree.ends[node] = end
+
+    def set_error(self, node: int, info: tuple[int, int], policy=None):
+        self.tree.flags[node] = 0
+        self.tree.infos[node] = info
+
+    def add_def(self, unit: int, node: int):
+        self.link(unit, _layouts[_kind_of[CompilationUnit]]["defs"][0], node)
+
+    def result(self, unit: int) -> FlatTree:
+        tree = self.tree
+        tree.root = unit
+        parents = tree.parents
+        for index in range(1, len(parents)):
+            if not parents[index] and index != unit:
+                self.detach(index)
+        return tree
+
+    def detach(self, index: int):
+        tree = self.tree
+        for node in tree.walk(index):
+            tree.kinds[node] = DETACHED
+            tree.flags[node] = 1
+            tree.infos.pop(node, None)
+            tree.detached += 1
+
+
+def _is_handle(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
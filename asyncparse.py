@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+from diagnostics import Diagnostics
+from lexer import RegexLexer
+from parser import Parser
+from tokens import EOS
+
+"""
+====================
+    asyncio接口
+====================
+在事件循环里同步解析大文件会卡住整个循环。parse_async把解析交给executor
+(默认是循环自带的线程池，也可以传入ProcessPoolExecutor)，结果是(语法树, Diagnostics)。
+源码不超过in_loop_max个字符时直接在循环里解析，每解析完一个顶层类定义检查一次，
+连续占用超过time_slice秒就让出一次控制权，循环的延迟大约不超过一个类定义的解析时间。
+
+AsyncParser面向语言服务器这样的场景：
+parse(document, source): 同一个文档的新请求会取消还没完成的旧请求，旧请求的调用方得到
+    CancelledError。已经交给线程或进程的解析没法中途停下，只是结果被丢掉。
+max_concurrent: 同时在解析的请求数上限，多出来的排队等候，排队时被取消的不会再解析
+parse_many(sources): 批量解析，受同样的并发上限约束，结果按sources的顺序给出
+"""
+
+
+def parse_source(source: str, flat: bool = False):
+    """
+    在executor里执行，返回值可以pickle，能用于进程池
+    """
+    parser = Parser(source, RegexLexer, flat=flat, diagnostics=Diagnostics())
+    return parser.parse_compilation_unit(), parser.diagnostics
+
+
+async def parse_in_loop(source: str, time_slice: float = 0.005, flat: bool = False):
+    """
+    在当前循环里解析，在顶层类定义之间按time_slice让出控制权
+    """
+    parser = Parser(source, RegexLexer, flat=flat, diagnostics=Diagnostics())
+    clock = time.perf_counter
+    deadline = clock() + time_slice
+    start = parser.token_start
+    unit = parser.parse_unit_header()
+    while parser.token.kind != EOS:
+        parser.builder.add_def(unit, parser.parse_toplevel_def())
+        if clock() >= deadline:
+            await asyncio.sleep(0)
+            deadline = clock() + time_slice
+    return parser.finish_unit(unit, start), parser.diagnostics
+
+
+async def parse_async(
+    source: str,
+    executor=None,
+    in_loop_max: int = 0,
+    time_slice: float = 0.005,
+    flat: bool = False,
+):
+    """
+    executor: concurrent.futures里的executor，None时用循环默认的线程池
+    in_loop_max: 不超过这个长度的源码在循环里解析，省掉交给executor的开销
+    time_slice: 在循环里解析时最多连续占用多少秒
+    """
+    if len(source) <= in_loop_max:
+        return await parse_in_loop(source, time_slice, flat)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, parse_source, source, flat)
+
+
+class AsyncParser:
+    def __init__(
+        self,
+        executor=None,
+        max_concurrent: int = 4,
+        in_loop_max: int = 0,
+        time_slice: float = 0.005,
+        flat: bool = False,
+    ):
+        self.executor = executor
+        self.max_concurrent = max_concurrent
+        self.in_loop_max = in_loop_max
+        self.time_slice = time_slice
+        self.flat = flat
+        # 信号量要在循环里创建，第一次用到时再建
+        self.semaphore: asyncio.Semaphore = None
+        self.pending: dict[object, asyncio.Task] = {}
+        return
+
+    async def run(self, source: str):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        async with self.semaphore:
+            return await parse_async(
+                source, self.executor, self.in_loop_max, self.time_slice, self.flat
+            )
+
+    async def parse(self, document, source: str):
+        """
+        解析document的最新内容，之前对同一个document还没完成的请求被取消
+        """
+        old = self.pending.get(document)
+        if old is not None:
+            old.cancel()
+        task = asyncio.ensure_future(self.run(source))
+        self.pending[document] = task
+        try:
+            return await task
+        finally:
+            if self.pending.get(document) is task:
+                del self.pending[document]
+
+    async def parse_many(self, sources) -> list:
+        return await asyncio.gather(*[self.run(source) for source in sources])
+
+
+async def parse_many_async(sources, executor=None, max_concurrent: int = 4) -> list:
+    return await AsyncParser(executor, max_concurrent).parse_many(sources)
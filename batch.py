@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from Tree import to_dict, walk
+from cache import ParseCache
+from diagnostics import Diagnostics
+from lexer import RegexLexer
+from parser import Parser
+
+"""
+====================
+     批量解析
+====================
+把大量文件分块交给进程池解析，按完成的先后顺序逐个产出每个文件的结果。
+同时在途的块数有上限，消费者处理得慢时不会再提交新块，内存不会随文件数增长。
+
+命令行：
+python -m batch src/ other/File.java -j 8 [--tree] > results.jsonl
+每行一个JSON对象：path, errors(语法错误数), error_nodes(错误结点数), seconds，
+加--tree时还有tree，读文件失败时只有path和failure。
+加--cache DIR时解析结果存到DIR里，再次运行时内容没变的文件直接读出上次的结果。
+"""
+
+# 每个工作进程各有一个磁盘缓存的入口，只用磁盘那一层，内存里不保留
+_caches: dict[str, ParseCache] = {}
+
+
+def cache_for(directory: str) -> ParseCache:
+    cache = _caches.get(directory)
+    if cache is None:
+        cache = _caches[directory] = ParseCache(max_entries=0, directory=directory)
+    return cache
+
+
+def parse_file(path: str, tree: bool = False, cache_dir: str = None) -> dict:
+    start = time.perf_counter()
+    try:
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return {"path": path, "failure": str(e)}
+    if cache_dir is not None:
+        unit, errors = cache_for(cache_dir).parse_counted(source)
+    else:
+        try:
+            parser = Parser(source, RegexLexer, diagnostics=Diagnostics.discard())
+            unit = parser.parse_compilation_unit()
+        except RecursionError:
+            # 嵌套太深，换成显式栈重新解析，结果和递归解析的一样
+            parser = Parser(source, RegexLexer, diagnostics=Diagnostics.discard(), explicit_stack=True)
+            unit = parser.parse_compilation_unit()
+        errors = parser.errors
+    result = {
+        "path": path,
+        "errors": errors,
+        "error_nodes": sum(not node.is_normal_node for node in walk(unit)),
+        "seconds": time.perf_counter() - start,
+    }
+    if tree:
+        result["tree"] = to_dict(unit)
+    return result
+
+
+def parse_chunk(paths: list[str], tree: bool, cache_dir: str = None) -> list[dict]:
+    return [parse_file(path, tree, cache_dir) for path in paths]
+
+
+def chunked(paths, size: int):
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parse_many(
+    paths,
+    workers: int = None,
+    chunk_size: int = 16,
+    max_in_flight: int = None,
+    tree: bool = False,
+    cache_dir: str = None,
+):
+    """
+    paths: 文件路径，可以是惰性的迭代器
+    workers: 进程数，默认os.cpu_count()，为1时在当前进程里直接解析
+    chunk_size: 每个任务包含的文件数，文件很小时调大可以减少进程间通信
+    max_in_flight: 同时提交但还没取走结果的任务数上限，默认workers的两倍
+    tree: 结果里是否附带序列化的语法树
+    cache_dir: 解析结果的磁盘缓存目录，多个进程共用
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = chunked(paths, chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            yield from parse_chunk(chunk, tree, cache_dir)
+        return
+
+    max_in_flight = max_in_flight or workers * 2
+    with ProcessPoolExecutor(workers) as executor:
+        pending = set()
+        for chunk in chunks:
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            pending.add(executor.submit(parse_chunk, chunk, tree, cache_dir))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def find_sources(paths: list[str], suffix: str):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(suffix):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="python -m batch", description="parse many files")
+    arg_parser.add_argument("paths", nargs="+", help="files or directories")
+    arg_parser.add_argument("-j", "--workers", type=int, default=None)
+    arg_parser.add_argument("--chunk-size", type=int, default=16)
+    arg_parser.add_argument("--max-in-flight", type=int, default=None)
+    arg_parser.add_argument("--suffix", default=".java", help="file suffix searched in directories")
+    arg_parser.add_argument("--tree", action="store_true", help="include the serialized tree")
+    arg_parser.add_argument("--cache", default=None, metavar="DIR", help="on-disk parse cache")
+    args = arg_parser.parse_args(argv)
+
+    start = time.perf_counter()
+    files = errors = 0
+    results = parse_many(
+        find_sources(args.paths, args.suffix),
+        args.workers,
+        args.chunk_size,
+        args.max_in_flight,
+        args.tree,
+        args.cache,
+    )
+    for result in results:
+        files += 1
+        errors += result.get("errors", 0)
+        sys.stdout.write(json.dumps(result) + "\n")
+    seconds = time.perf_counter() - start
+    print(f"{files} files, {errors} errors, {seconds:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
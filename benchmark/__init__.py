@@ -0,0 +1,3 @@
+"""
+性能基准，在仓库根目录下用 python -m benchmark.<模块名> 运行
+"""
@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+import time
+
+from asyncparse import parse_async
+from benchmark.corpus import generate
+
+"""
+解析一个大文件时事件循环的最大停顿：一个每毫秒醒一次的任务记录相邻两次醒来的间隔。
+sync: 在循环里一口气解析完；in-loop: 在类定义之间按time_slice让出；thread: 交给线程池。
+交给线程时停顿来自GIL，在循环里解析时剩下的停顿主要是垃圾回收。
+python -m benchmark.bench_async --classes 400
+"""
+
+
+async def max_gap(source: str, **kwargs) -> float:
+    gaps = []
+    done = False
+
+    async def tick():
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    ticker = asyncio.ensure_future(tick())
+    await asyncio.sleep(0.01)
+    await parse_async(source, **kwargs)
+    done = True
+    await ticker
+    return max(gaps)
+
+
+async def run(classes: int, time_slice: float):
+    source = generate(classes, seed=9, depth=3)
+    modes = {
+        "sync": {"in_loop_max": len(source), "time_slice": float("inf")},
+        "in-loop": {"in_loop_max": len(source), "time_slice": time_slice},
+        "thread": {},
+    }
+    for name, kwargs in modes.items():
+        gap = await max_gap(source, **kwargs)
+        print(f"{name:<8} max loop gap {gap * 1000:7.1f} ms")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="event loop latency")
+    arg_parser.add_argument("--classes", type=int, default=400)
+    arg_parser.add_argument("--time-slice", type=float, default=0.005)
+    args = arg_parser.parse_args()
+    asyncio.run(run(args.classes, args.time_slice))
+
+
+if __name__ == "__main__":
+    main()
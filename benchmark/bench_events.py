@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from diagnostics import Diagnostics
+from events import iter_events, iter_file_events
+from lexer import RegexLexer
+from parser import Parser
+from benchmark.bench_input import peak_rss_kb
+from benchmark.corpus import generate
+
+"""
+事件流(events.iter_events)和建整棵树的速度与峰值内存(RSS)。
+tree/flat/events先把整个文件读成str；tree-stream和events-stream按块流式读入。
+每种方式在单独的子进程里跑，互不影响峰值内存。
+python -m benchmark.bench_events --classes 20000
+"""
+
+MODES = ("tree", "flat", "events", "tree-stream", "events-stream")
+
+
+def run_child(mode: str, path: str):
+    start = time.perf_counter()
+    diagnostics = Diagnostics.discard()
+    if mode.endswith("-stream"):
+        if mode == "events-stream":
+            for _ in iter_file_events(path, diagnostics=diagnostics):
+                pass
+        else:
+            with Parser.from_file(path, "stream", diagnostics=diagnostics) as parser:
+                unit = parser.parse_compilation_unit()
+    else:
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        if mode == "events":
+            for _ in iter_events(source, diagnostics=diagnostics):
+                pass
+        else:
+            parser = Parser(source, RegexLexer, flat=mode == "flat", diagnostics=diagnostics)
+            unit = parser.parse_compilation_unit()
+    seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "rss_kb": peak_rss_kb()}))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="event streaming vs tree building")
+    arg_parser.add_argument("--classes", type=int, default=20000)
+    arg_parser.add_argument("--errors", type=float, default=0.0)
+    arg_parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"))
+    args = arg_parser.parse_args()
+    if args.child:
+        run_child(*args.child)
+        return
+
+    with tempfile.NamedTemporaryFile("w", suffix=".java", delete=False) as f:
+        f.write(generate(args.classes, seed=6, depth=3, errors=args.errors))
+        path = f.name
+    try:
+        size = os.path.getsize(path)
+        print(f"source: {size / 2**20:.1f} MiB")
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmark.bench_events", "--child", mode, path],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(out)
+            rate = size / 2**20 / result["seconds"]
+            print(
+                f"{mode:<14} {result['seconds']:6.2f}s  {rate:5.2f} MiB/s  "
+                f"peak RSS {result['rss_kb'] / 1024:7.1f} MiB"
+            )
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
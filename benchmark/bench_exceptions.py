@@ -0,0 +1,49 @@
+import argparse
+import time
+
+from diagnostics import Diagnostics
+from lexer import RegexLexer
+from parser import Parser
+from benchmark.bench_lexer import make_source
+from benchmark.bench_recovery import corrupt
+
+"""
+抛异常和不抛异常(Parser(..., exceptions=False))两种出错方式在不同错误密度下的解析耗时。
+python -m benchmark.bench_exceptions --classes 500
+"""
+
+
+def parse_times(source: str, repeat: int) -> tuple[float, float]:
+    """
+    两种方式交替着各跑repeat次，取各自最快的一次，减少机器负载波动的影响
+    """
+    best = {True: float("inf"), False: float("inf")}
+    for _ in range(repeat):
+        for exceptions in (True, False):
+            start = time.perf_counter()
+            parser = Parser(
+                source, RegexLexer, diagnostics=Diagnostics.discard(), exceptions=exceptions
+            )
+            parser.parse_compilation_unit()
+            best[exceptions] = min(best[exceptions], time.perf_counter() - start)
+    return best[True], best[False]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="exception-free error path")
+    arg_parser.add_argument("--classes", type=int, default=500)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    source = make_source(args.classes)
+    for density in (0.0, 0.01, 0.05, 0.1, 0.25, 0.5):
+        text = corrupt(source, density)
+        raising, returning = parse_times(text, args.repeat)
+        print(
+            f"errors {density:4.0%}  raise {raising * 1e3:7.1f} ms  "
+            f"return {returning * 1e3:7.1f} ms  x{raising / returning:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
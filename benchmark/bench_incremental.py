@@ -0,0 +1,54 @@
+import argparse
+import time
+
+import incremental
+from benchmark.bench_lexer import make_source
+
+"""
+模拟在文件中间的一个方法体里逐字输入：每次按键后用reparse更新语法树，
+和每次都整个文件重新解析比较。文件翻倍时reparse的耗时应该只有平移后面结点的那部分在增长。
+python -m benchmark.bench_incremental --classes 500 --keys 200
+"""
+
+
+def type_keys(classes: int, keys: int) -> tuple[float, float, int]:
+    source = make_source(classes)
+    # 在中间那个类的if语句块里输入
+    offset = source.index("x = 42;", len(source) // 2)
+    text = "x = 4;\n"
+    unit = incremental.parse(source)
+    partial = full = 0.0
+    reused = 0
+    for i in range(keys):
+        key = text[i % len(text)]
+        edit = (offset, 0, key)
+        start = time.perf_counter()
+        result = incremental.reparse(unit, edit)
+        partial += time.perf_counter() - start
+        reused += result is unit
+        unit = result
+        source = unit.source
+        start = time.perf_counter()
+        incremental.parse(source)
+        full += time.perf_counter() - start
+        offset += 1
+    return partial / keys, full / keys, reused
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="incremental reparse latency")
+    arg_parser.add_argument("--classes", type=int, default=500)
+    arg_parser.add_argument("--keys", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    for scale in (1, 2, 4):
+        classes = args.classes * scale
+        partial, full, reused = type_keys(classes, args.keys)
+        print(
+            f"{classes:6d} classes  reparse {partial * 1e3:7.3f} ms/key  "
+            f"full {full * 1e3:7.2f} ms/key  reused {reused}/{args.keys}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from lexer import BytesLexer, RegexLexer, StreamLexer
+from benchmark.bench_lexer import make_source
+
+"""
+三种输入方式的速度和峰值内存(RSS)：整个读成str、mmap、分块流式读取。
+每种方式在单独的子进程里跑，互不影响峰值内存。
+mmap的RSS包含已经访问过的文件页，这部分是页缓存，内存紧张时可以直接回收。
+python -m benchmark.bench_input --classes 50000
+"""
+
+
+def open_lexer(mode: str, path: str):
+    if mode == "str":
+        with open(path, encoding="utf-8") as f:
+            return RegexLexer(f.read())
+    elif mode == "mmap":
+        return BytesLexer.open(path)
+    else:
+        return StreamLexer(open(path, encoding="utf-8"))
+
+
+def run_child(mode: str, path: str):
+    start = time.perf_counter()
+    lexer = open_lexer(mode, path)
+    tokens = 0
+    while lexer.next().name != "EOS":
+        tokens += 1
+    if mode != "str":
+        lexer.close()
+    seconds = time.perf_counter() - start
+    print(json.dumps({"tokens": tokens, "seconds": seconds, "rss_kb": peak_rss_kb()}))
+
+
+def peak_rss_kb() -> int:
+    # ru_maxrss会把fork出子进程时父进程的内存也算进去，Linux上优先读VmHWM
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="input modes")
+    arg_parser.add_argument("--classes", type=int, default=50000)
+    arg_parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"))
+    args = arg_parser.parse_args()
+    if args.child:
+        run_child(*args.child)
+        return
+
+    with tempfile.NamedTemporaryFile("w", suffix=".java", delete=False) as f:
+        f.write(make_source(args.classes))
+        path = f.name
+    try:
+        print(f"source: {os.path.getsize(path) / 2**20:.1f} MiB")
+        for mode in ("str", "mmap", "stream"):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmark.bench_input", "--child", mode, path],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(out)
+            rate = result["tokens"] / result["seconds"]
+            print(f"{mode:<7} {result['seconds']:.2f}s  {rate:,.0f} tokens/s  peak RSS {result['rss_kb'] / 1024:.1f} MiB")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import time
+
+from lexer import Lexer, RegexLexer
+
+"""
+词法分析器吞吐量对比：逐字符的Lexer与预编译正则的RegexLexer。
+python -m benchmark.bench_lexer --classes 2000
+"""
+
+template = """
+public class C{i} {{
+    int field{i} = {i};
+    private boolean flag{i};
+    void method{i}(int a) {{
+        int x = 12345;
+        if (true) {{
+            x = 42;
+        }} else {{
+            flag{i} = false;
+        }}
+    }}
+}}
+"""
+
+
+def make_source(classes: int) -> str:
+    return "package bench;\n" + "".join(template.format(i=i) for i in range(classes))
+
+
+def count_tokens(lexer_cls, source: str) -> int:
+    lexer = lexer_cls(source)
+    n = 0
+    while lexer.next().name != "EOS":
+        n += 1
+    return n
+
+
+def measure(lexer_cls, source: str, repeat: int) -> tuple[int, float]:
+    best = float("inf")
+    tokens = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = count_tokens(lexer_cls, source)
+        best = min(best, time.perf_counter() - start)
+    return tokens, best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="lexer throughput")
+    arg_parser.add_argument("--classes", type=int, default=2000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    source = make_source(args.classes)
+    print(f"source: {len(source)} chars")
+    baseline = None
+    for lexer_cls in (Lexer, RegexLexer):
+        tokens, seconds = measure(lexer_cls, source, args.repeat)
+        rate = tokens / seconds
+        note = "" if baseline is None else f"  ({rate / baseline:.1f}x)"
+        baseline = baseline or rate
+        print(f"{lexer_cls.__name__:<12} {tokens} tokens  {seconds:.3f}s  {rate:,.0f} tokens/s{note}")
+
+
+if __name__ == "__main__":
+    main()
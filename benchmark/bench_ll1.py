@@ -0,0 +1,53 @@
+import argparse
+import time
+
+from diagnostics import Diagnostics
+from lexer import RegexLexer
+from ll1 import TableParser
+from parser import Parser
+from benchmark.corpus import generate
+
+"""
+表驱动的LL(1)识别(ll1.TableParser)和手写的递归下降Parser比较：时间和报告的错误数。
+TableParser不建树，只给出推导序列，所以只能看作解析的下限。
+python -m benchmark.bench_ll1 --classes 300 [--errors 0.02]
+"""
+
+
+def best(repeat: int, func):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def hand_written(source: str) -> int:
+    parser = Parser(source, RegexLexer, diagnostics=Diagnostics.discard())
+    parser.parse_compilation_unit()
+    return parser.errors
+
+
+def table_driven(source: str) -> int:
+    parser = TableParser(source, RegexLexer, diagnostics=Diagnostics.discard())
+    parser.parse()
+    return parser.errors
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="table-driven LL(1) parsing")
+    arg_parser.add_argument("--classes", type=int, default=300)
+    arg_parser.add_argument("--errors", type=float, default=0.0)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    source = generate(args.classes, seed=4, depth=3, errors=args.errors)
+    print(f"source {len(source) / 1024:.0f} KiB")
+    for name, parse in (("recursive descent", hand_written), ("LL(1) table", table_driven)):
+        seconds, errors = best(args.repeat, lambda: parse(source))
+        print(f"{name:<18} {seconds * 1000:8.1f} ms  {errors} errors")
+
+
+if __name__ == "__main__":
+    main()
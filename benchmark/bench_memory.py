@@ -0,0 +1,40 @@
+import argparse
+import gc
+import tracemalloc
+
+from Tree import walk
+from lexer import RegexLexer
+from parser import Parser
+from benchmark.bench_lexer import make_source
+
+"""
+语法树每个结点占用的内存：解析结束、解析器释放之后仍被树引用着的字节数除以结点数。
+同时比较对象树和扁平的FlatTree(Parser(..., flat=True))。
+python -m benchmark.bench_memory --classes 2000
+"""
+
+
+def measure(source: str, flat: bool = False) -> tuple[int, int]:
+    tracemalloc.start()
+    unit = Parser(source, RegexLexer, flat=flat).parse_compilation_unit()
+    # 出错时的异常和栈帧之间有引用环，先回收掉，只留下树本身
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(unit) if flat else sum(1 for _ in walk(unit))
+    return count, size
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="tree memory")
+    arg_parser.add_argument("--classes", type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    source = make_source(args.classes)
+    for name, flat in (("Tree", False), ("FlatTree", True)):
+        count, size = measure(source, flat)
+        print(f"{name:<9} {count} nodes  {size / 1e6:.1f} MB  {size / count:.1f} bytes/node")
+
+
+if __name__ == "__main__":
+    main()
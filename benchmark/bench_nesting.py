@@ -0,0 +1,59 @@
+import argparse
+import time
+
+from diagnostics import Diagnostics
+from lexer import RegexLexer
+from parser import Parser
+from benchmark.corpus import generate
+
+"""
+递归解析和显式栈(explicit_stack=True)解析语句的比较：普通的合成语料，以及很深的if/块嵌套。
+递归版本在嵌套太深时抛出RecursionError，这时只列出它用了多久；其余列出错误数。
+python -m benchmark.bench_nesting --classes 300 --depth 500
+"""
+
+
+def parse_time(source: str, repeat: int, **kwargs):
+    """
+    返回(最快的耗时, 错误数)，RecursionError时错误数的位置是"RecursionError"
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser = Parser(source, RegexLexer, diagnostics=Diagnostics.discard(), **kwargs)
+        try:
+            parser.parse_compilation_unit()
+        except RecursionError:
+            return time.perf_counter() - start, "RecursionError"
+        times.append(time.perf_counter() - start)
+    return min(times), f"{parser.errors} errors"
+
+
+def nested(depth: int) -> str:
+    return "class A { void m() { " + "if (x) {" * depth + "x = 1;" + "}" * depth + " } }"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="explicit stack statements")
+    arg_parser.add_argument("--classes", type=int, default=300)
+    arg_parser.add_argument("--depth", type=int, default=500)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    sources = {
+        "corpus": generate(args.classes, seed=5, depth=4),
+        "corpus 5% errors": generate(args.classes, seed=5, depth=4, errors=0.05),
+        f"nested {args.depth}": nested(args.depth),
+        "nested 100000": nested(100000),
+    }
+    for name, source in sources.items():
+        row = [f"{name:<18}"]
+        for label, stack in (("recursive", False), ("stack", True)):
+            repeat = 1 if len(source) > 1 << 20 else args.repeat
+            seconds, errors = parse_time(source, repeat, explicit_stack=stack)
+            row.append(f"{label} {seconds * 1000:8.1f} ms ({errors})")
+        print("  ".join(row))
+
+
+if __name__ == "__main__":
+    main()
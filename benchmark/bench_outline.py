@@ -0,0 +1,76 @@
+import argparse
+import time
+
+from Tree import walk
+from diagnostics import Diagnostics
+from events import iter_events
+from lexer import RegexLexer
+from parser import Parser
+from benchmark.corpus import generate
+
+"""
+outline模式(方法体按括号配对跳过，访问时才解析)和完整解析的比较。
+tree: 只取类、方法、字段的签名；walk: 解析后遍历整棵树，outline时所有方法体都在遍历中解析，
+看惰性解析本身多花多少。
+python -m benchmark.bench_outline --classes 300 [--errors 0.02]
+"""
+
+
+def best(repeat: int, func):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def signatures(unit) -> int:
+    count = 0
+    for class_decl in unit.defs:
+        for member in class_decl.defs:
+            count += 1
+    return count
+
+
+def tree(source: str, outline: bool) -> int:
+    parser = Parser(source, RegexLexer, diagnostics=Diagnostics.discard(), outline=outline)
+    return signatures(parser.parse_compilation_unit())
+
+
+def walked(source: str, outline: bool) -> int:
+    parser = Parser(source, RegexLexer, diagnostics=Diagnostics.discard(), outline=outline)
+    return sum(1 for _ in walk(parser.parse_compilation_unit()))
+
+
+def events(source: str, outline: bool) -> int:
+    return sum(1 for _ in iter_events(source, outline=outline))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="outline parsing with lazy method bodies")
+    arg_parser.add_argument("--classes", type=int, default=300)
+    arg_parser.add_argument("--errors", type=float, default=0.0)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    source = generate(args.classes, seed=7, depth=3, errors=args.errors)
+    print(f"source {len(source) / 1024:.0f} KiB")
+    cases = (
+        ("full tree", lambda: tree(source, False)),
+        ("outline tree", lambda: tree(source, True)),
+        ("full walk", lambda: walked(source, False)),
+        ("outline walk", lambda: walked(source, True)),
+        ("full events", lambda: events(source, False)),
+        ("outline events", lambda: events(source, True)),
+    )
+    baseline = None
+    for name, func in cases:
+        seconds, count = best(args.repeat, func)
+        if baseline is None:
+            baseline = seconds
+        print(f"{name:<18} {seconds * 1000:8.1f} ms  x{baseline / seconds:5.2f}  ({count})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Tree import walk
+from lexer import RegexLexer
+from parser import Parser
+from parallel import parse_parallel
+from benchmark.bench_lexer import make_source
+from benchmark.bench_recovery import corrupt
+
+"""
+串行解析与parse_parallel在不同进程数下的耗时和加速比，并检查两者结果一致。
+python -m benchmark.bench_parallel --classes 20000 --workers 1 2 4 8
+加速比取决于机器的核数：进程数超过核数之后不会再变快。进程池在计时之外预先建好，
+计时包括切段、把源码片段发给子进程、把树传回来以及拼接。
+"""
+
+
+def shape(unit) -> list:
+    return [(type(node).__name__, node.is_normal_node, node.span) for node in walk(unit)]
+
+
+def timed(parse) -> tuple[float, object]:
+    start = time.perf_counter()
+    unit = parse()
+    return time.perf_counter() - start, unit
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="parallel parsing")
+    arg_parser.add_argument("--classes", type=int, default=20000)
+    arg_parser.add_argument("--errors", type=float, default=0.0)
+    arg_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = arg_parser.parse_args()
+
+    source = corrupt(make_source(args.classes), args.errors)
+    print(f"source: {len(source) / 2**20:.1f} MiB, {os.cpu_count()} cpus")
+    serial, expected = timed(lambda: Parser(source, RegexLexer).parse_compilation_unit())
+    print(f"serial      {serial:.2f}s")
+    expected = shape(expected)
+    for workers in args.workers:
+        with ProcessPoolExecutor(workers) as executor:
+            # 先让所有子进程完成启动和导入
+            list(executor.map(abs, range(workers)))
+            seconds, unit = timed(lambda: parse_parallel(source, executor=executor))
+        same = "same" if shape(unit) == expected else "DIFFERENT"
+        print(f"{workers} workers   {seconds:.2f}s  {serial / seconds:.2f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from diagnostics import Diagnostics, TextReporter
+from lexer import RegexLexer
+from parser import Parser
+from benchmark.bench_lexer import make_source
+
+"""
+解析时间随错误密度的变化。错误密度是被破坏的行所占的比例，
+每个密度下再翻倍源码规模，看每KB耗时是否保持不变(线性)。
+python -m benchmark.bench_recovery --classes 500 [--prescan] [--diagnostics text]
+--prescan时先建括号配对表(需要NumPy)，恢复时整段跳过括号。
+--diagnostics: collect(默认)全部记下，discard只计数，text像以前一样逐条打印(写到内存里)。
+"""
+
+diagnostic_modes = {
+    "collect": Diagnostics,
+    "discard": Diagnostics.discard,
+    "text": lambda: Diagnostics(reporter=TextReporter()),
+}
+
+corruptions = [") (", "= =", "{", "}", "int int", "123abc"]
+
+
+def corrupt(source: str, density: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    lines = source.split("\n")
+    for i, line in enumerate(lines):
+        if line.strip() and rng.random() < density:
+            words = line.split(" ")
+            words[rng.randrange(len(words))] = rng.choice(corruptions)
+            lines[i] = " ".join(words)
+    return "\n".join(lines)
+
+
+def parse_time(source: str, prescan: bool = False, diagnostics: str = "collect") -> float:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        parser = Parser(
+            source, RegexLexer, prescan=prescan, diagnostics=diagnostic_modes[diagnostics]()
+        )
+        parser.parse_compilation_unit()
+    return time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="recovery cost")
+    arg_parser.add_argument("--classes", type=int, default=500)
+    arg_parser.add_argument("--prescan", action="store_true")
+    arg_parser.add_argument("--diagnostics", choices=list(diagnostic_modes), default="collect")
+    args = arg_parser.parse_args()
+
+    for density in (0.0, 0.01, 0.05, 0.1, 0.25, 0.5):
+        row = []
+        for scale in (1, 2, 4):
+            source = corrupt(make_source(args.classes * scale), density)
+            seconds = parse_time(source, args.prescan, args.diagnostics)
+            row.append(f"x{scale}: {seconds * 1e3:7.1f} ms ({seconds * 1e6 / (len(source) / 1024):.0f} us/KB)")
+        print(f"errors {density:4.0%}  " + "  ".join(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import pickle
+import time
+
+from diagnostics import Diagnostics
+from lexer import RegexLexer
+from parser import Parser
+from serialize import dumps, loads
+from benchmark.corpus import generate
+
+"""
+serialize的二进制格式和pickle比较：编码后的大小、编码和解码的时间(取几次里最好的)。
+python -m benchmark.bench_serialize --classes 500 [--errors 0.01]
+"""
+
+
+def best(repeat: int, func):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="tree serialization")
+    arg_parser.add_argument("--classes", type=int, default=500)
+    arg_parser.add_argument("--errors", type=float, default=0.0)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    source = generate(args.classes, seed=2, depth=3, errors=args.errors)
+    unit = Parser(source, RegexLexer, diagnostics=Diagnostics.discard()).parse_compilation_unit()
+    formats = {
+        "pickle": (lambda: pickle.dumps(unit, pickle.HIGHEST_PROTOCOL), pickle.loads),
+        "binary": (lambda: dumps(unit), loads),
+    }
+    print(f"source {len(source) / 1024:.0f} KiB")
+    for name, (encode, decode) in formats.items():
+        encode_time, data = best(args.repeat, encode)
+        decode_time, _ = best(args.repeat, lambda: decode(data))
+        print(
+            f"{name:<7} {len(data) / 1024:8.1f} KiB  "
+            f"encode {encode_time * 1000:7.1f} ms  decode {decode_time * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
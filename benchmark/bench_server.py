@@ -0,0 +1,70 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from diagnostics import Diagnostics
+from lexer import RegexLexer
+from parser import Parser
+from server import Client, ParseServer
+from benchmark.corpus import generate
+
+"""
+每个文件的延迟：每次起一个新进程(python -m batch FILE -j 1)、发给常驻的解析服务、
+以及在当前进程里直接解析(纯解析时间)。
+python -m benchmark.bench_server --files 20 --classes 10
+"""
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="server latency")
+    arg_parser.add_argument("--files", type=int, default=20)
+    arg_parser.add_argument("--classes", type=int, default=10)
+    args = arg_parser.parse_args()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(folder, f"F{i}.java")
+            with open(path, "w") as f:
+                f.write(generate(args.classes, seed=i, errors=0.02))
+            paths.append(path)
+
+        start = time.perf_counter()
+        for path in paths:
+            subprocess.run(
+                [sys.executable, "-m", "batch", path, "-j", "1"],
+                cwd=root, check=True, capture_output=True,
+            )
+        fresh = (time.perf_counter() - start) / len(paths)
+
+        server = ParseServer(os.path.join(folder, "server.sock"))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with Client(server.path) as client:
+                start = time.perf_counter()
+                for path in paths:
+                    client.parse_path(path)
+                warm = (time.perf_counter() - start) / len(paths)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        start = time.perf_counter()
+        for path in paths:
+            with open(path) as f:
+                Parser(f.read(), RegexLexer, diagnostics=Diagnostics()).parse_compilation_unit()
+        direct = (time.perf_counter() - start) / len(paths)
+
+    print(f"fresh process  {fresh * 1000:8.1f} ms/file")
+    print(f"server         {warm * 1000:8.1f} ms/file")
+    print(f"parse only     {direct * 1000:8.1f} ms/file")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import argparse
+import tracemalloc
+
+from lexer import Lexer
+from tokenstream import TokenStream
+from benchmark.bench_lexer import make_source
+
+"""
+每个token占用的内存：Lexer产生的Token对象列表与TokenStream的平行数组。
+python -m benchmark.bench_tokenstream --classes 2000
+"""
+
+
+def token_list(source: str) -> list:
+    lexer = Lexer(source)
+    tokens = []
+    while True:
+        token = lexer.next()
+        tokens.append((token, lexer.start, lexer.end))
+        if token.name == "EOS":
+            return tokens
+
+
+def measure(build, source: str) -> tuple[int, int]:
+    tracemalloc.start()
+    result = build(source)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(result), size
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="token memory")
+    arg_parser.add_argument("--classes", type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    source = make_source(args.classes)
+    for name, build in (("Token list", token_list), ("TokenStream", TokenStream)):
+        count, size = measure(build, source)
+        print(f"{name:<12} {count} tokens  {size / count:.1f} bytes/token")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import time
+
+import Tree
+from diagnostics import Diagnostics
+from lexer import RegexLexer
+from parser import Parser
+from visitor import TreeIndex, Visitor, find
+from benchmark.corpus import generate
+
+"""
+遍历的开销：Tree.walk(按类缓存的子结点字段)、
+Visitor的enter/leave分派，以及找出所有MethodDecl：遍历、建好索引后查询、在FlatTree上扫描。
+python -m benchmark.bench_visitor --classes 500
+"""
+
+
+class Counter(Visitor):
+    def __init__(self):
+        self.methods = 0
+
+    def enter_MethodDecl(self, node):
+        self.methods += 1
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="tree walking")
+    arg_parser.add_argument("--classes", type=int, default=500)
+    args = arg_parser.parse_args()
+
+    source = generate(args.classes, seed=4, depth=3)
+    unit = Parser(source, RegexLexer, diagnostics=Diagnostics.discard()).parse_compilation_unit()
+    flat = Parser(source, RegexLexer, flat=True, diagnostics=Diagnostics.discard()).parse_compilation_unit()
+    index_time, index = timed(lambda: TreeIndex(unit))
+    rows = [
+        ("Tree.walk", lambda: sum(1 for _ in Tree.walk(unit))),
+        ("Visitor.visit", lambda: Counter().visit(unit)),
+        ("find MethodDecl (walk)", lambda: sum(1 for _ in find(unit, Tree.MethodDecl))),
+        ("find MethodDecl (index)", lambda: sum(1 for _ in find(unit, Tree.MethodDecl, index))),
+        ("find MethodDecl (flat)", lambda: sum(1 for _ in find(flat, Tree.MethodDecl))),
+    ]
+    for name, func in rows:
+        seconds, _ = timed(func)
+        print(f"{name:<24} {seconds * 1000:8.2f} ms")
+    print(f"{'building TreeIndex':<24} {index_time * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
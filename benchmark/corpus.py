@@ -0,0 +1,177 @@
+import argparse
+import random
+
+"""
+可复现的合成语料：按种子生成语法支持范围内的程序(包声明、类、字段、方法、嵌套的if和块、赋值)。
+classes: 类的个数，决定规模
+members: 每个类的字段和方法数
+statements: 每个块里的语句数
+depth: if和块最多嵌套几层
+errors: 注入错误的密度，每个语句、字段以0到1之间的这个概率被破坏一处
+同样的参数和种子总是得到同样的源码。
+python -m benchmark.corpus --classes 10 --depth 3 --errors 0.05 > sample.java
+"""
+
+modifiers = ["", "public ", "protected ", "private "]
+types = ["int", "boolean"]
+# 注入的错误：换掉、删掉或插入一个token
+corruptions = [") (", "= =", "{", "}", "int int", "123abc", "if", ";", "class"]
+
+
+class Generator:
+    def __init__(
+        self,
+        seed: int = 0,
+        members: int = 6,
+        statements: int = 4,
+        depth: int = 2,
+        errors: float = 0.0,
+    ):
+        self.rng = random.Random(seed)
+        # 错误单独用一个随机数序列，不同的错误密度下程序本身完全相同
+        self.error_rng = random.Random(seed + 1)
+        self.members = members
+        self.statements = statements
+        self.depth = depth
+        self.errors = errors
+        self.names = 0
+        return
+
+    def name(self, prefix: str) -> str:
+        self.names += 1
+        return f"{prefix}{self.names}"
+
+    def corrupt(self, line: str) -> str:
+        """
+        以errors的概率把这一行里的某个词换掉、删掉或在它前面插入一个错误的token
+        """
+        rng = self.error_rng
+        if rng.random() >= self.errors:
+            return line
+        indent = line[: len(line) - len(line.lstrip(" "))]
+        words = line.split()
+        if not words:
+            return line
+        i = rng.randrange(len(words))
+        action = rng.random()
+        if action < 0.4:
+            words[i] = rng.choice(corruptions)
+        elif action < 0.6:
+            del words[i]
+        else:
+            words.insert(i, rng.choice(corruptions))
+        return indent + " ".join(words)
+
+    def expression(self, variables: list[str]) -> str:
+        choice = self.rng.random()
+        if choice < 0.4 or not variables:
+            return str(self.rng.randrange(100000))
+        if choice < 0.6:
+            return self.rng.choice(["true", "false"])
+        if choice < 0.8:
+            return self.rng.choice(variables)
+        return f"{self.rng.choice(variables)} = {self.expression(variables)}"
+
+    def condition(self, variables: list[str]) -> str:
+        # 整数字面量后面紧跟)时lexer会把它当成错误的token，条件里不用
+        if variables and self.rng.random() < 0.5:
+            return self.rng.choice(variables)
+        return self.rng.choice(["true", "false"])
+
+    def statement(self, variables: list[str], depth: int, indent: str, out: list[str]):
+        choice = self.rng.random()
+        if depth < self.depth and choice < 0.2:
+            out.append(self.corrupt(f"{indent}if ({self.condition(variables)}) {{"))
+            self.block_body(variables, depth + 1, indent + "    ", out)
+            if self.rng.random() < 0.5:
+                out.append(self.corrupt(f"{indent}}} else {{"))
+                self.block_body(variables, depth + 1, indent + "    ", out)
+            out.append(self.corrupt(f"{indent}}}"))
+        elif depth < self.depth and choice < 0.3:
+            out.append(self.corrupt(f"{indent}{{"))
+            self.block_body(variables, depth + 1, indent + "    ", out)
+            out.append(self.corrupt(f"{indent}}}"))
+        elif choice < 0.6:
+            name = self.name("v")
+            line = f"{indent}{self.rng.choice(types)} {name}"
+            if self.rng.random() < 0.7:
+                line += f" = {self.expression(variables)}"
+            out.append(self.corrupt(line + ";"))
+            variables.append(name)
+        elif variables:
+            target = self.rng.choice(variables)
+            out.append(self.corrupt(f"{indent}{target} = {self.expression(variables)};"))
+        else:
+            out.append(self.corrupt(f"{indent}{self.expression(variables)};"))
+
+    def block_body(self, variables: list[str], depth: int, indent: str, out: list[str]):
+        scope = list(variables)
+        for _ in range(self.rng.randint(1, self.statements)):
+            self.statement(scope, depth, indent, out)
+
+    def member(self, fields: list[str], out: list[str]):
+        modifier = self.rng.choice(modifiers)
+        if self.rng.random() < 0.4:
+            name = self.name("f")
+            line = f"    {modifier}{self.rng.choice(types)} {name}"
+            if self.rng.random() < 0.5:
+                line += f" = {self.expression(fields)}"
+            out.append(self.corrupt(line + ";"))
+            fields.append(name)
+            return
+        restype = self.rng.choice(["void"] + types)
+        params, variables = "", list(fields)
+        # lexer不认识逗号，参数最多一个
+        if self.rng.random() < 0.5:
+            param = self.name("p")
+            params = f"{self.rng.choice(types)} {param}"
+            variables.append(param)
+        out.append(self.corrupt(f"    {modifier}{restype} {self.name('m')}({params}) {{"))
+        self.block_body(variables, 0, "        ", out)
+        out.append(self.corrupt("    }"))
+
+    def class_decl(self, out: list[str]):
+        # lexer没有extends关键字，不生成继承
+        out.append(self.corrupt(f"{self.rng.choice(modifiers)}class {self.name('C')} {{"))
+        fields = []
+        for _ in range(self.rng.randint(1, self.members)):
+            self.member(fields, out)
+        out.append(self.corrupt("}"))
+        out.append("")
+
+    def source(self, classes: int) -> str:
+        out = [self.corrupt(f"package {self.name('pkg')};"), ""]
+        for _ in range(classes):
+            self.class_decl(out)
+        return "\n".join(out)
+
+
+def generate(
+    classes: int,
+    seed: int = 0,
+    members: int = 6,
+    statements: int = 4,
+    depth: int = 2,
+    errors: float = 0.0,
+) -> str:
+    return Generator(seed, members, statements, depth, errors).source(classes)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="synthetic corpus")
+    arg_parser.add_argument("--classes", type=int, default=10)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--members", type=int, default=6)
+    arg_parser.add_argument("--statements", type=int, default=4)
+    arg_parser.add_argument("--depth", type=int, default=2)
+    arg_parser.add_argument("--errors", type=float, default=0.0)
+    args = arg_parser.parse_args()
+    print(
+        generate(
+            args.classes, args.seed, args.members, args.statements, args.depth, args.errors
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from Tree import walk
+from diagnostics import Diagnostics
+from lexer import RegexLexer
+from tokens import token_kind
+from parser import Parser
+from benchmark.corpus import generate
+
+"""
+基准套件：在benchmark.corpus生成的固定语料上测几项指标，和保存的基线比较。
+lexer_tokens_per_sec: RegexLexer每秒切出的token数
+parser_nodes_per_sec: 无错误的语料上解析器每秒建出的结点数
+recovery_cost: 同一份程序注入10%错误后每字节的解析时间是无错误时的几倍
+peak_kb_per_source_kb: 解析时tracemalloc记录的峰值内存除以源码大小
+startup_ms: 在新进程里import parser比空进程多花的时间
+每项跑几次取最好的一次。比基线差超过threshold(比例)就算退化，退出码为1。
+基线和机器有关，换了机器要先用--save重新生成。
+python -m benchmark.suite [--quick] [--threshold 0.25] [--save]
+"""
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# 指标 -> 是否越大越好
+metrics = {
+    "lexer_tokens_per_sec": True,
+    "parser_nodes_per_sec": True,
+    "recovery_cost": False,
+    "peak_kb_per_source_kb": False,
+    "startup_ms": False,
+}
+
+
+def best(repeat: int, func) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def parse(source: str):
+    return Parser(source, RegexLexer, diagnostics=Diagnostics.discard()).parse_compilation_unit()
+
+
+def lexer_tokens_per_sec(source: str, repeat: int) -> float:
+    eos = token_kind["EOS"]
+
+    def run():
+        lexer = RegexLexer(source)
+        while lexer.next_kind() != eos:
+            pass
+
+    tokens = 0
+    lexer = RegexLexer(source)
+    while lexer.next_kind() != eos:
+        tokens += 1
+    return tokens / best(repeat, run)
+
+
+def parser_nodes_per_sec(source: str, repeat: int) -> float:
+    nodes = sum(1 for _ in walk(parse(source)))
+    return nodes / best(repeat, lambda: parse(source))
+
+
+def recovery_cost(clean: str, broken: str, repeat: int) -> float:
+    clean_time = best(repeat, lambda: parse(clean)) / len(clean)
+    broken_time = best(repeat, lambda: parse(broken)) / len(broken)
+    return broken_time / clean_time
+
+
+def peak_kb_per_source_kb(source: str) -> float:
+    tracemalloc.start()
+    try:
+        tree = parse(source)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del tree
+    return peak / len(source)
+
+
+def startup_ms(repeat: int) -> float:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def run(code: str):
+        subprocess.run([sys.executable, "-c", code], cwd=root, check=True, capture_output=True)
+
+    return (best(repeat, lambda: run("import parser")) - best(repeat, lambda: run("pass"))) * 1000
+
+
+def measure(classes: int, repeat: int) -> dict:
+    clean = generate(classes, seed=1, depth=3)
+    broken = generate(classes, seed=1, depth=3, errors=0.1)
+    return {
+        "lexer_tokens_per_sec": lexer_tokens_per_sec(clean, repeat),
+        "parser_nodes_per_sec": parser_nodes_per_sec(clean, repeat),
+        "recovery_cost": recovery_cost(clean, broken, repeat),
+        "peak_kb_per_source_kb": peak_kb_per_source_kb(clean),
+        "startup_ms": startup_ms(max(repeat * 2, 10)),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    返回退化了的指标的说明
+    """
+    regressions = []
+    for name, higher_is_better in metrics.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name], results[name]
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > threshold:
+            regressions.append(f"{name}: {old:,.3f} -> {new:,.3f} ({change:.0%} worse)")
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="benchmark suite")
+    arg_parser.add_argument("--classes", type=int, default=300)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--quick", action="store_true", help="smaller corpus, fewer repeats")
+    arg_parser.add_argument("--baseline", default=BASELINE)
+    arg_parser.add_argument("--threshold", type=float, default=0.25)
+    arg_parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    args = arg_parser.parse_args()
+    if args.quick:
+        args.classes, args.repeat = min(args.classes, 50), min(args.repeat, 2)
+
+    results = measure(args.classes, args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    for name in metrics:
+        old = baseline.get(name)
+        old = "" if old is None else f"  (baseline {old:,.3f})"
+        print(f"{name:<24}{results[name]:>16,.3f}{old}")
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({name: round(value, 3) for name, value in results.items()}, f, indent=2)
+            f.write("\n")
+        print(f"saved {args.baseline}")
+        return
+    regressions = compare(results, baseline, args.threshold)
+    for line in regressions:
+        print("REGRESSION " + line)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
+from Tree import CompilationUnit
+from diagnostics import Diagnostics
+from lexer import RegexLexer
+from parser import PARSER_VERSION, Parser
+from serialize import dumps, loads
+
+"""
+====================
+     解析结果缓存
+====================
+以源码内容的哈希(blake2b)加上PARSER_VERSION作为键，缓存解析出的语法树和语法错误数。
+内存里是一个LRU，条目数和字节数任一超过上限就淘汰最久没用过的，字节数按源码的
+长度估算。给出directory时再加一层磁盘缓存，可以被多个进程共享：
+先写临时文件再os.replace，读者不会看到写了一半的文件，读失败的文件当作没有命中。
+磁盘上每个文件是4字节的语法错误数加上serialize编码的树。不用pickle：目录可能是共享的，
+解码时不会执行文件里的任何东西，而且serialize不受树的嵌套深度限制。
+
+缓存返回的是同一棵树，调用方不能修改它(比如交给incremental.reparse)。
+"""
+
+
+class ParseCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 << 20,
+        directory: str = None,
+        lexer_cls=RegexLexer,
+    ):
+        """
+        max_entries, max_bytes: 内存LRU的上限，为0时不在内存里缓存
+        directory: 磁盘缓存的目录，None时只用内存
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.lexer_cls = lexer_cls
+        self.entries: OrderedDict[str, tuple[CompilationUnit, int, int]] = OrderedDict()
+        self.size = 0
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        return
+
+    @staticmethod
+    def key(source) -> str:
+        data = source.encode("utf-8") if isinstance(source, str) else bytes(source)
+        digest = hashlib.blake2b(data, digest_size=20, person=b"fuzzyparser")
+        digest.update(str(PARSER_VERSION).encode())
+        return digest.hexdigest()
+
+    def parse(self, source: str) -> CompilationUnit:
+        return self.parse_counted(source)[0]
+
+    def parse_counted(self, source: str) -> tuple[CompilationUnit, int]:
+        """
+        返回(语法树, 语法错误数)
+        """
+        key = self.key(source)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0], entry[1]
+
+        result = self.load(key)
+        if result is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            try:
+                parser = Parser(source, self.lexer_cls, diagnostics=Diagnostics.discard())
+                unit = parser.parse_compilation_unit()
+            except RecursionError:
+                # 嵌套太深，换成显式栈重新解析，结果和递归解析的一样
+                parser = Parser(
+                    source, self.lexer_cls, diagnostics=Diagnostics.discard(), explicit_stack=True
+                )
+                unit = parser.parse_compilation_unit()
+            result = unit, parser.errors
+            self.store(key, result)
+        self.remember(key, result, len(source))
+        return result
+
+    def remember(self, key: str, result: tuple[CompilationUnit, int], size: int):
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        self.entries[key] = (result[0], result[1], size)
+        self.size += size
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, (_, _, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+            self.evictions += 1
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".tree")
+
+    def load(self, key: str):
+        if self.directory is None:
+            return None
+        try:
+            with open(self.path(key), "rb") as f:
+                data = f.read()
+            errors = int.from_bytes(data[:4], "little")
+            return loads(memoryview(data)[4:]), errors
+        except Exception:
+            # 读不了、损坏或者不兼容的文件当作没有命中，之后会被重新写入的结果覆盖
+            return None
+
+    def store(self, key: str, result: tuple[CompilationUnit, int]):
+        if self.directory is None:
+            return
+        unit, errors = result
+        try:
+            data = errors.to_bytes(4, "little") + dumps(unit)
+        except (TypeError, OverflowError):
+            # 编码不了的树不写到磁盘，只留在内存里
+            return
+        path = self.path(key)
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+    def clear(self):
+        """
+        清空内存里的缓存，磁盘上的不动
+        """
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
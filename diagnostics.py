@@ -0,0 +1,128 @@
+import sys
+from array import array
+from enum import IntEnum
+from typing import NamedTuple
+
+"""
+====================
+       诊断信息
+====================
+解析器把遇到的问题记成(code, start, end, expected, detail)，存在几个平行的数组里，
+消息文本要用的时候才格式化。
+limit: 最多保留多少条，之后的只计数；为0时什么都不保留，只数错误个数；None为不限。
+reporter: 每保留一条就调用一次，TextReporter按原来print的格式输出。
+"""
+
+
+class Code(IntEnum):
+    UNEXPECTED_TOKEN = 1
+    PACKAGE = 2
+    CLASS = 3
+    METHOD = 4
+    VARIABLE = 5
+    PARAMS = 6
+    METHOD_BODY = 7
+    BLOCK = 8
+    IF = 9
+    EXPRESSION = 10
+    STATEMENT = 11
+    THEN_PART = 12
+    ELSE_PART = 13
+    # 变量定义内部的附注，真正的错误由调用方记录，不计入错误数
+    VARIABLE_NOTE = 14
+
+
+templates = {
+    Code.UNEXPECTED_TOKEN: "Syntax error: expected {expected}, but got {detail}",
+    Code.PACKAGE: "Error parsing package declaration: {detail}",
+    Code.CLASS: "Error parsing class declaration: {detail}",
+    Code.METHOD: "Error parsing method declaration: {detail}",
+    Code.VARIABLE: "Error parsing variable declaration: {detail}",
+    Code.PARAMS: "Error parsing parameter list: {detail}",
+    Code.METHOD_BODY: "Error parsing method body: {detail}",
+    Code.BLOCK: "Error parsing block: {detail}",
+    Code.IF: "Error parsing if statement: {detail}",
+    Code.EXPRESSION: "Error parsing expression: {detail}",
+    Code.STATEMENT: "Error parsing statement: {detail}",
+    Code.THEN_PART: "Error parsing then part of if statement: {detail}",
+    Code.ELSE_PART: "Error parsing else part of if statement: {detail}",
+    Code.VARIABLE_NOTE: "Error in variable declaration: {detail}",
+}
+
+notes = frozenset({Code.VARIABLE_NOTE})
+
+
+def format_message(code: int, expected, detail) -> str:
+    return templates[code].format(expected=expected, detail=detail)
+
+
+class Diagnostic(NamedTuple):
+    code: Code
+    span: tuple[int, int]
+    expected: object
+    detail: str
+
+    @property
+    def message(self) -> str:
+        return format_message(self.code, self.expected, self.detail)
+
+
+class Diagnostics:
+    def __init__(self, limit: int = None, reporter=None):
+        self.limit = limit
+        self.reporter = reporter
+        self.codes = array("B")
+        self.starts = array("i")
+        self.ends = array("i")
+        self.expected = []
+        self.details = []
+        # 错误总数，包括超出limit没有保留的
+        self.errors = 0
+        return
+
+    @classmethod
+    def discard(cls) -> "Diagnostics":
+        return cls(limit=0)
+
+    def add(self, code: int, start: int, end: int, expected=None, detail=None):
+        if code not in notes:
+            self.errors += 1
+        if self.limit is not None and len(self.codes) >= self.limit:
+            return
+        self.codes.append(code)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.expected.append(expected)
+        self.details.append(detail)
+        if self.reporter is not None:
+            self.reporter(code, start, end, expected, detail)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index: int) -> Diagnostic:
+        return Diagnostic(
+            Code(self.codes[index]),
+            (self.starts[index], self.ends[index]),
+            self.expected[index],
+            self.details[index],
+        )
+
+    def __iter__(self):
+        for index in range(len(self.codes)):
+            yield self[index]
+
+    def messages(self) -> list[str]:
+        return [diagnostic.message for diagnostic in self]
+
+
+class TextReporter:
+    """
+    把每条诊断按原来parser里print的格式写到file
+    """
+
+    def __init__(self, file=None):
+        self.file = file
+
+    def __call__(self, code: int, start: int, end: int, expected, detail):
+        print(format_message(code, expected, detail), file=self.file or sys.stdout)
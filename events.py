@@ -0,0 +1,165 @@
+from typing import NamedTuple
+
+from Tree import *
+from diagnostics import Diagnostics
+from lexer import RegexLexer
+from parser import Parser
+from tokens import EOS
+
+"""
+====================
+      事件流解析
+====================
+和parse_compilation_unit同一套解析逻辑，但EventBuilder不创建结点，只把遇到的结构
+记成事件，iter_events每解析完一个顶层类定义就把这期间的事件交出去。
+内存只和单个类定义的大小有关，调用方不再迭代时解析随之停下。
+
+kind           span                 name          detail
+package        包声明               包名          None
+enter_class    类头(到类名为止)      类名          访问修饰符
+exit_class     整个类               类名          False表示类是错误结点
+enter_method   方法头(到方法名为止)  方法名        访问修饰符
+method         整个方法             方法名        返回类型，错误结点为None
+field          整个字段定义          变量名        类型
+statement      整个语句             结点类名      None
+error          错误结点             恢复策略名    被跳过的区间(info)
+
+method、field、statement在对应结构解析完时给出，所以方法体里的statement在method之前。
+和树里一样，表达式语句没有区间，不单独给出；方法体本身不算statement。
+错误结点先给出error，如果它结束的是一个已经enter过的类或方法，再给出对应的
+exit_class或method，enter和结束总是成对的。
+Parser的outline=True时方法体整段跳过，没有statement事件，只要签名时快得多。
+"""
+
+
+class Event(NamedTuple):
+    kind: str
+    span: tuple[int, int]
+    name: str
+    detail: object
+
+
+class EventBuilder(TreeBuilder):
+    """
+    make返回的是轻量的句柄：Ident和PrimitiveType是名字本身，包、类、方法、变量定义是
+    (类, 名字, 附加信息)，其他的是结点类。Parser对make的结果只做真假判断和传递，够用了
+    """
+
+    def __init__(self):
+        self.events: list[Event] = []
+        # 已经enter还没结束的类名和方法名
+        self.class_name = None
+        self.method_name = None
+        # 紧跟在类型后面的Ident是变量名，留给接下来的VarDecl
+        self.previous = None
+        self.var_name = ""
+        self.error = None
+        self.body = -1
+        return
+
+    def make(self, cls: type, *args):
+        previous, self.previous = self.previous, cls
+        if cls is Ident:
+            if previous is PrimitiveType:
+                self.var_name = args[0]
+            return args[0]
+        if cls is PrimitiveType:
+            return args[0]
+        if cls is VarDecl:
+            name, self.var_name = self.var_name, ""
+            return VarDecl, name, args[1]
+        if cls is MethodDecl:
+            # 刚给出的Block是方法体，不是语句
+            if self.body == len(self.events) - 1:
+                self.events.pop()
+            self.body = -1
+            return MethodDecl, args[2], args[1]
+        if cls is ClassDecl:
+            return ClassDecl, args[1], None
+        if cls is PackageDecl:
+            return PackageDecl, args[0], None
+        return cls
+
+    def enter(self, cls: type, name, access: int, start: int, end: int):
+        if cls is ClassDecl:
+            self.class_name = name
+            self.events.append(Event("enter_class", (start, end), name, access))
+        else:
+            self.method_name = name
+            self.events.append(Event("enter_method", (start, end), name, access))
+
+    def set_error(self, node, info: tuple[int, int], policy=None):
+        self.error = info, policy.name if policy is not None else ""
+
+    def set_span(self, node, start: int, end: int):
+        events = self.events
+        span = (start, end)
+        error = self.error
+        if error is not None:
+            self.error = None
+            events.append(Event("error", span, error[1], error[0]))
+        if type(node) is tuple:
+            cls, name, detail = node
+        else:
+            cls, name, detail = node, "", None
+        if cls is ClassDecl:
+            if self.class_name is not None:
+                events.append(Event("exit_class", span, self.class_name, error is None))
+                self.class_name = None
+        elif cls is MethodDecl:
+            if self.method_name is not None:
+                events.append(Event("method", span, self.method_name, None if error else detail))
+                self.method_name = None
+        elif error is not None or cls is CompilationUnit:
+            pass
+        elif cls is VarDecl:
+            if self.method_name is None:
+                events.append(Event("field", span, name, detail))
+            else:
+                events.append(Event("statement", span, "VarDecl", None))
+        elif cls is PackageDecl:
+            events.append(Event("package", span, name, None))
+        else:
+            if cls is Block:
+                self.body = len(events)
+            events.append(Event("statement", span, cls.__name__, None))
+
+    def lazy(self, loader, start: int, end: int):
+        # outline模式跳过的方法体里没有事件
+        return Block
+
+    def add_def(self, unit, node):
+        pass
+
+    def result(self, unit):
+        return None
+
+
+def iter_events(source=None, lexer_cls=RegexLexer, parser: Parser = None, **options):
+    """
+    逐个给出source的解析事件。parser: 直接给出一个用EventBuilder建好的Parser
+    (比如Parser.from_file(path, builder=EventBuilder()))，这时忽略其他参数。
+    options是Parser的其他参数，诊断默认只计数不保留
+    """
+    if parser is None:
+        options.setdefault("diagnostics", Diagnostics.discard())
+        parser = Parser(source, lexer_cls, builder=EventBuilder(), **options)
+    events = parser.builder.events
+    parser.parse_unit_header()
+    while True:
+        if events:
+            yield from events
+            events.clear()
+        if parser.token.kind == EOS:
+            return
+        parser.parse_toplevel_def()
+
+
+def iter_file_events(path: str, mode: str = "stream", **options):
+    """
+    直接从文件解析，mode同Parser.from_file，默认stream只保留一个有限的窗口。
+    迭代完或者调用方中途停下(close)时关闭文件
+    """
+    options.setdefault("diagnostics", Diagnostics.discard())
+    with Parser.from_file(path, mode, builder=EventBuilder(), **options) as parser:
+        yield from iter_events(parser=parser)
@@ -0,0 +1,368 @@
+import argparse
+import hashlib
+import pprint
+import sys
+
+from tokens import EOS, kind_names, token_kind
+
+"""
+====================
+   语法和LL(1)分析表
+====================
+GRAMMAR是parser.py各parse_*方法docstring里那份语法的BNF形式，[...]和*展开成了
+...Opt、...s这样的辅助非终结符。全大写的是token种类(tokens.TokenKind的名字)，
+其余是非终结符，ε表示空串。语句里的变量定义不带修饰符，和parse_simple_statement一致。
+
+由它算出NULLABLE、FIRST、FOLLOW和LL(1)预测表，表里同一格有多个产生式时就是冲突：
+- PREFER里给出了的，直接选指定的产生式(else跟最近的if)；
+- 否则依次试2..MAX_K个token的向前看，各产生式能推出的前k个token互不为前缀时就用
+  LOOKAHEAD表区分(方法和字段的定义都以[修饰符] 类型 ID开头，is_method_declaration
+  靠向前看解决的就是这个)；
+- 仍然分不开的按产生式的先后选第一个，记在CONFLICTS里。
+
+算表(主要是k个token的向前看)约30ms，载入生成好的grammar_tables.py约5ms，省进程启动的时间。
+import时只要GRAMMAR的摘要没变就直接用生成好的表，否则当场重新算：
+    python grammar.py             打印FIRST、FOLLOW和冲突
+    python grammar.py --write     重新生成grammar_tables.py
+符号在表里用整数表示：token种类编号小于NONTERMINAL，非终结符是NONTERMINAL + 编号。
+"""
+
+GRAMMAR = """
+CompilationUnit: PackageOpt ClassDecls
+PackageOpt: PACKAGE ID SEMI | ε
+ClassDecls: ClassDecl ClassDecls | ε
+ClassDecl: ModifierOpt CLASS ID ExtendsOpt LBRACE ClassMembers RBRACE
+ExtendsOpt: EXTENDS ID | ε
+ClassMembers: ClassMember ClassMembers | ε
+ClassMember: MethodDecl | VarDecl
+MethodDecl: ModifierOpt ReturnType ID LPAREN ParamList RPAREN MethodBody
+ReturnType: VOID | Type
+MethodBody: Block | SEMI
+ParamList: Param Params | ε
+Params: COMMA Param Params | ε
+Param: Type ID
+VarDecl: ModifierOpt Type ID InitOpt SEMI
+LocalVarDecl: Type ID InitOpt SEMI
+InitOpt: EQ Expression | ε
+ModifierOpt: PUBLIC | PROTECTED | PRIVATE | ε
+Type: INT | BOOLEAN
+Block: LBRACE Statements RBRACE
+Statements: Statement Statements | ε
+Statement: Block | IfStatement | LocalVarDecl | Expression SEMI
+IfStatement: IF LPAREN Expression RPAREN Statement ElseOpt
+ElseOpt: ELSE Statement | ε
+Expression: ID AssignOpt | INT_LITERAL | TRUE | FALSE
+AssignOpt: EQ Expression | ε
+"""
+
+# 冲突时直接选用的产生式：非终结符 -> 右部
+PREFER = {"ElseOpt": "ELSE Statement"}
+MAX_K = 4
+NONTERMINAL = 256
+TABLE_NAMES = (
+    "DIGEST", "NONTERMINALS", "PRODUCTIONS", "NULLABLE", "FIRST", "FOLLOW", "TABLE",
+    "LOOKAHEAD", "CONFLICTS",
+)
+
+
+def digest() -> str:
+    data = repr((GRAMMAR, sorted(PREFER.items()), MAX_K, kind_names)).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def read_grammar(text: str):
+    """
+    返回(非终结符名列表, 产生式列表)，产生式是(左部编号, 右部符号元组)
+    """
+    rules = []
+    for line in text.strip().splitlines():
+        lhs, _, rhs = line.partition(":")
+        rules.append((lhs.strip(), [alt.split() for alt in rhs.split("|")]))
+    nonterminals = [lhs for lhs, _ in rules]
+    number = {name: NONTERMINAL + i for i, name in enumerate(nonterminals)}
+
+    def symbol(name: str) -> int:
+        if name in number:
+            return number[name]
+        if name not in token_kind:
+            raise ValueError(f"unknown symbol {name!r} in grammar")
+        return token_kind[name]
+
+    productions = []
+    for i, (_, alts) in enumerate(rules):
+        for alt in alts:
+            if alt == ["ε"]:
+                alt = []
+            productions.append((i, tuple(symbol(name) for name in alt)))
+    return nonterminals, productions
+
+
+def symbol_name(symbol: int, nonterminals: list[str]) -> str:
+    if symbol >= NONTERMINAL:
+        return nonterminals[symbol - NONTERMINAL]
+    return kind_names[symbol]
+
+
+class Grammar:
+    def __init__(self, text: str = GRAMMAR, prefer: dict = PREFER, max_k: int = MAX_K):
+        self.nonterminals, self.productions = read_grammar(text)
+        self.prefer = {
+            self.nonterminals.index(lhs): p
+            for lhs, rhs in prefer.items()
+            for p in self.by_lhs_of(lhs)
+            if self.production_text(p) == " ".join(rhs.split())
+        }
+        self.max_k = max_k
+        self.nullable = self.compute_nullable()
+        self.first = self.compute_first()
+        self.follow = self.compute_follow()
+        self.first_k = {}
+        self.table, self.lookahead, self.conflicts = self.compute_table()
+        return
+
+    def by_lhs_of(self, name: str) -> list[int]:
+        lhs = self.nonterminals.index(name)
+        return [p for p, production in enumerate(self.productions) if production[0] == lhs]
+
+    def compute_nullable(self) -> list[bool]:
+        nullable = [False] * len(self.nonterminals)
+        changed = True
+        while changed:
+            changed = False
+            for lhs, rhs in self.productions:
+                if not nullable[lhs] and all(
+                    s >= NONTERMINAL and nullable[s - NONTERMINAL] for s in rhs
+                ):
+                    nullable[lhs] = changed = True
+        return nullable
+
+    def compute_first(self) -> list[set[int]]:
+        first = [set() for _ in self.nonterminals]
+        changed = True
+        while changed:
+            changed = False
+            for lhs, rhs in self.productions:
+                before = len(first[lhs])
+                first[lhs] |= self.first_of(rhs, first)
+                changed |= len(first[lhs]) != before
+        return first
+
+    def first_of(self, symbols, first=None) -> set[int]:
+        """
+        符号串能推出的第一个token的集合，不含ε
+        """
+        first = self.first if first is None else first
+        result = set()
+        for s in symbols:
+            if s < NONTERMINAL:
+                result.add(s)
+                return result
+            result |= first[s - NONTERMINAL]
+            if not self.nullable[s - NONTERMINAL]:
+                return result
+        return result
+
+    def nullable_of(self, symbols) -> bool:
+        return all(s >= NONTERMINAL and self.nullable[s - NONTERMINAL] for s in symbols)
+
+    def compute_follow(self) -> list[set[int]]:
+        follow = [set() for _ in self.nonterminals]
+        follow[0].add(EOS)
+        changed = True
+        while changed:
+            changed = False
+            for lhs, rhs in self.productions:
+                for i, s in enumerate(rhs):
+                    if s < NONTERMINAL:
+                        continue
+                    target = follow[s - NONTERMINAL]
+                    before = len(target)
+                    rest = rhs[i + 1:]
+                    target |= self.first_of(rest)
+                    if self.nullable_of(rest):
+                        target |= follow[lhs]
+                    changed |= len(target) != before
+        return follow
+
+    def predict(self, p: int) -> set[int]:
+        lhs, rhs = self.productions[p]
+        result = self.first_of(rhs)
+        if self.nullable_of(rhs):
+            result |= self.follow[lhs]
+        return result
+
+    def compute_first_k(self, k: int) -> list[set[tuple]]:
+        """
+        各非终结符能推出的前k个token(不足k个的是推出的整个串)
+        """
+        first = [set() for _ in self.nonterminals]
+        changed = True
+        while changed:
+            changed = False
+            for lhs, rhs in self.productions:
+                before = len(first[lhs])
+                first[lhs] |= self.first_k_of(rhs, k, first)
+                changed |= len(first[lhs]) != before
+        return first
+
+    def first_k_of(self, symbols, k: int, first=None) -> set[tuple]:
+        if first is None:
+            first = self.first_k.get(k)
+            if first is None:
+                first = self.first_k[k] = self.compute_first_k(k)
+        prefixes = {()}
+        for s in symbols:
+            if all(len(prefix) >= k for prefix in prefixes):
+                break
+            options = {(s,)} if s < NONTERMINAL else first[s - NONTERMINAL]
+            prefixes = {
+                (prefix + option)[:k] if len(prefix) < k else prefix
+                for prefix in prefixes
+                for option in options
+            }
+        return prefixes
+
+    def compute_table(self):
+        """
+        table[非终结符][token种类]是要用的产生式，-1表示出错；
+        lookahead[(非终结符, token种类)] = (k, {前k个token: 产生式})；conflicts是说明文字
+        """
+        table = [[-1] * len(kind_names) for _ in self.nonterminals]
+        cells: dict[tuple[int, int], list[int]] = {}
+        for p, (lhs, _) in enumerate(self.productions):
+            for kind in sorted(self.predict(p)):
+                cells.setdefault((lhs, kind), []).append(p)
+        lookahead = {}
+        conflicts = []
+        for (lhs, kind), options in cells.items():
+            table[lhs][kind] = options[0]
+            if len(options) == 1:
+                continue
+            names = " / ".join(self.production_text(p) for p in options)
+            where = f"{self.nonterminals[lhs]} on {kind_names[kind]}: {names}"
+            if lhs in self.prefer and self.prefer[lhs] in options:
+                table[lhs][kind] = self.prefer[lhs]
+                conflicts.append(f"{where}, resolved by preference")
+                continue
+            resolved = self.resolve(lhs, kind, options)
+            if resolved is None:
+                conflicts.append(f"{where}, unresolved, using the first")
+            else:
+                lookahead[(lhs, kind)] = resolved
+                conflicts.append(f"{where}, resolved with {resolved[0]} tokens of lookahead")
+        return table, lookahead, conflicts
+
+    def resolve(self, lhs: int, kind: int, options: list[int]):
+        for k in range(2, self.max_k + 1):
+            choices = {}
+            sets = []
+            for p in options:
+                rhs = self.productions[p][1]
+                if self.nullable_of(rhs):
+                    # 能推出空串时还要看后面跟的东西，这里不处理
+                    return None
+                prefixes = {s for s in self.first_k_of(rhs, k) if s[:1] == (kind,)}
+                sets.append(prefixes)
+                for prefix in prefixes:
+                    choices[prefix] = p
+            if not any(
+                a[:len(b)] == b or b[:len(a)] == a
+                for i, x in enumerate(sets)
+                for y in sets[i + 1:]
+                for a in x
+                for b in y
+            ):
+                return k, choices
+        return None
+
+    def production_text(self, p: int) -> str:
+        lhs, rhs = self.productions[p]
+        names = " ".join(symbol_name(s, self.nonterminals) for s in rhs)
+        return names or "ε"
+
+    def named(self, sets: list[set[int]]) -> dict[str, list[str]]:
+        return {
+            name: sorted(kind_names[kind] for kind in sets[i])
+            for i, name in enumerate(self.nonterminals)
+        }
+
+    def tables(self) -> dict:
+        return {
+            "DIGEST": digest(),
+            "NONTERMINALS": self.nonterminals,
+            "PRODUCTIONS": self.productions,
+            "NULLABLE": self.nullable,
+            "FIRST": [frozenset(s) for s in self.first],
+            "FOLLOW": [frozenset(s) for s in self.follow],
+            "TABLE": self.table,
+            "LOOKAHEAD": self.lookahead,
+            "CONFLICTS": self.conflicts,
+        }
+
+
+def generate(path: str = None):
+    """
+    把分析表写成Python模块，默认写到本文件旁边的grammar_tables.py
+    """
+    if path is None:
+        path = __file__.rsplit(".", 1)[0] + "_tables.py"
+    lines = ['"""\n由grammar.py生成，不要手改：python grammar.py --write\n"""\n']
+    for name, value in Grammar().tables().items():
+        lines.append(f"{name} = {pprint.pformat(value, width=100, compact=True)}\n")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+class Tables:
+    """
+    import时载入的分析表，属性同grammar_tables.py里的各个名字
+    """
+
+    def __init__(self, values: dict):
+        self.__dict__.update((name.lower(), value) for name, value in values.items())
+        self.index = {name: NONTERMINAL + i for i, name in enumerate(self.nonterminals)}
+
+    def nonterminal(self, name: str) -> int:
+        return self.index[name] - NONTERMINAL
+
+    def first_of(self, name: str) -> frozenset:
+        return self.first[self.nonterminal(name)]
+
+    def follow_of(self, name: str) -> frozenset:
+        return self.follow[self.nonterminal(name)]
+
+
+def load() -> Tables:
+    try:
+        import grammar_tables
+    except ImportError:
+        grammar_tables = None
+    if grammar_tables is not None and grammar_tables.DIGEST == digest():
+        return Tables({name: getattr(grammar_tables, name) for name in TABLE_NAMES})
+    return Tables(Grammar().tables())
+
+
+tables = load()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(prog="python grammar.py", description="LL(1) tables")
+    arg_parser.add_argument("--write", action="store_true", help="regenerate grammar_tables.py")
+    args = arg_parser.parse_args()
+    if args.write:
+        generate()
+        return
+    grammar = Grammar()
+    for title, sets in (("FIRST", grammar.first), ("FOLLOW", grammar.follow)):
+        print(title)
+        for name, kinds in grammar.named(sets).items():
+            print(f"  {name:<16} {' '.join(kinds)}")
+    print("CONFLICTS")
+    for conflict in grammar.conflicts:
+        print(f"  {conflict}")
+    if any("unresolved" in conflict for conflict in grammar.conflicts):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+由grammar.py生成，不要手改：python grammar.py --write
+"""
+
+DIGEST = 'd9bbbf06f8e32ac90dc107dd2e439ef7'
+
+NONTERMINALS = ['CompilationUnit', 'PackageOpt', 'ClassDecls', 'ClassDecl', 'ExtendsOpt', 'ClassMembers',
+ 'ClassMember', 'MethodDecl', 'ReturnType', 'MethodBody', 'ParamList', 'Params', 'Param', 'VarDecl',
+ 'LocalVarDecl', 'InitOpt', 'ModifierOpt', 'Type', 'Block', 'Statements', 'Statement',
+ 'IfStatement', 'ElseOpt', 'Expression', 'AssignOpt']
+
+PRODUCTIONS = [(0, (257, 258)), (1, (5, 2, 7)), (1, ()), (2, (259, 258)), (2, ()),
+ (3, (272, 6, 2, 260, 11, 261, 12)), (4, (23, 2)), (4, ()), (5, (262, 261)), (5, ()), (6, (263,)),
+ (6, (269,)), (7, (272, 264, 2, 16, 266, 17, 265)), (8, (14,)), (8, (273,)), (9, (274,)), (9, (7,)),
+ (10, (268, 267)), (10, ()), (11, (24, 268, 267)), (11, ()), (12, (273, 2)),
+ (13, (272, 273, 2, 271, 7)), (14, (273, 2, 271, 7)), (15, (13, 279)), (15, ()), (16, (8,)),
+ (16, (9,)), (16, (10,)), (16, ()), (17, (21,)), (17, (22,)), (18, (11, 275, 12)), (19, (276, 275)),
+ (19, ()), (20, (274,)), (20, (277,)), (20, (270,)), (20, (279, 7)),
+ (21, (15, 16, 279, 17, 276, 278)), (22, (18, 276)), (22, ()), (23, (2, 280)), (23, (3,)),
+ (23, (19,)), (23, (20,)), (24, (13, 279)), (24, ())]
+
+NULLABLE = [True, True, True, False, True, True, False, False, False, False, True, True, False, False, False,
+ True, True, False, False, True, False, False, True, False, True]
+
+FIRST = [frozenset({5, 6, 8, 9, 10}), frozenset({5}), frozenset({8, 9, 10, 6}), frozenset({8, 9, 10, 6}),
+ frozenset({23}), frozenset({21, 22, 8, 9, 10, 14}), frozenset({21, 22, 8, 9, 10, 14}),
+ frozenset({21, 22, 8, 9, 10, 14}), frozenset({21, 22, 14}), frozenset({11, 7}),
+ frozenset({21, 22}), frozenset({24}), frozenset({21, 22}), frozenset({21, 22, 8, 9, 10}),
+ frozenset({21, 22}), frozenset({13}), frozenset({8, 9, 10}), frozenset({21, 22}), frozenset({11}),
+ frozenset({2, 3, 11, 15, 19, 20, 21, 22}), frozenset({2, 3, 11, 15, 19, 20, 21, 22}),
+ frozenset({15}), frozenset({18}), frozenset({3, 2, 19, 20}), frozenset({13})]
+
+FOLLOW = [frozenset({0}), frozenset({0, 6, 8, 9, 10}), frozenset({0}), frozenset({0, 6, 8, 9, 10}),
+ frozenset({11}), frozenset({12}), frozenset({21, 22, 8, 9, 10, 12, 14}),
+ frozenset({21, 22, 8, 9, 10, 12, 14}), frozenset({2}), frozenset({21, 22, 8, 9, 10, 12, 14}),
+ frozenset({17}), frozenset({17}), frozenset({24, 17}), frozenset({21, 22, 8, 9, 10, 12, 14}),
+ frozenset({2, 3, 11, 12, 15, 18, 19, 20, 21, 22}), frozenset({7}), frozenset({14, 21, 6, 22}),
+ frozenset({2}), frozenset({2, 3, 8, 9, 10, 11, 12, 14, 15, 18, 19, 20, 21, 22}), frozenset({12}),
+ frozenset({2, 3, 11, 12, 15, 18, 19, 20, 21, 22}),
+ frozenset({2, 3, 11, 12, 15, 18, 19, 20, 21, 22}),
+ frozenset({2, 3, 11, 12, 15, 18, 19, 20, 21, 22}), frozenset({17, 7}), frozenset({17, 7})]
+
+TABLE = [[0, -1, -1, -1, -1, 0, 0, -1, 0, 0, 0, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1],
+ [2, -1, -1, -1, -1, 1, 2, -1, 2, 2, 2, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1],
+ [4, -1, -1, -1, -1, -1, 3, -1, 3, 3, 3, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1],
+ [-1, -1, -1, -1, -1, -1, 5, -1, 5, 5, 5, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1],
+ [-1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, 7, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, 6, -1],
+ [-1, -1, -1, -1, -1, -1, -1, -1, 8, 8, 8, -1, 9, -1, 8, -1, -1, -1, -1, -1, -1, 8, 8, -1, -1],
+ [-1, -1, -1, -1, -1, -1, -1, -1, 10, 10, 10, -1, -1, -1, 10, -1, -1, -1, -1, -1, -1, 10, 10, -1,
+  -1],
+ [-1, -1, -1, -1, -1, -1, -1, -1, 12, 12, 12, -1, -1, -1, 12, -1, -1, -1, -1, -1, -1, 12, 12, -1,
+  -1],
+ [-1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, 13, -1, -1, -1, -1, -1, -1, 14, 14, -1,
+  -1],
+ [-1, -1, -1, -1, -1, -1, -1, 16, -1, -1, -1, 15, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1,
+  -1],
+ [-1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, 18, -1, -1, -1, 17, 17, -1,
+  -1],
+ [-1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, 20, -1, -1, -1, -1, -1, -1,
+  19],
+ [-1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, 21, 21, -1,
+  -1],
+ [-1, -1, -1, -1, -1, -1, -1, -1, 22, 22, 22, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, 22, 22, -1,
+  -1],
+ [-1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, 23, 23, -1,
+  -1],
+ [-1, -1, -1, -1, -1, -1, -1, 25, -1, -1, -1, -1, -1, 24, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1,
+  -1],
+ [-1, -1, -1, -1, -1, -1, 29, -1, 26, 27, 28, -1, -1, -1, 29, -1, -1, -1, -1, -1, -1, 29, 29, -1,
+  -1],
+ [-1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, 30, 31, -1,
+  -1],
+ [-1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, 32, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1,
+  -1],
+ [-1, -1, 33, 33, -1, -1, -1, -1, -1, -1, -1, 33, 34, -1, -1, 33, -1, -1, -1, 33, 33, 33, 33, -1,
+  -1],
+ [-1, -1, 38, 38, -1, -1, -1, -1, -1, -1, -1, 35, -1, -1, -1, 36, -1, -1, -1, 38, 38, 37, 37, -1,
+  -1],
+ [-1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, 39, -1, -1, -1, -1, -1, -1, -1, -1,
+  -1],
+ [-1, -1, 41, 41, -1, -1, -1, -1, -1, -1, -1, 41, 41, -1, -1, 41, -1, -1, 40, 41, 41, 41, 41, -1,
+  -1],
+ [-1, -1, 42, 43, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, 44, 45, -1, -1, -1,
+  -1],
+ [-1, -1, -1, -1, -1, -1, -1, 47, -1, -1, -1, -1, -1, 46, -1, -1, -1, 47, -1, -1, -1, -1, -1, -1,
+  -1]]
+
+LOOKAHEAD = {(6, 8): (4,
+          {(8, 14, 2, 16): 10,
+           (8, 21, 2, 7): 11,
+           (8, 21, 2, 13): 11,
+           (8, 21, 2, 16): 10,
+           (8, 22, 2, 7): 11,
+           (8, 22, 2, 13): 11,
+           (8, 22, 2, 16): 10}),
+ (6, 9): (4,
+          {(9, 14, 2, 16): 10,
+           (9, 21, 2, 7): 11,
+           (9, 21, 2, 13): 11,
+           (9, 21, 2, 16): 10,
+           (9, 22, 2, 7): 11,
+           (9, 22, 2, 13): 11,
+           (9, 22, 2, 16): 10}),
+ (6, 10): (4,
+           {(10, 14, 2, 16): 10,
+            (10, 21, 2, 7): 11,
+            (10, 21, 2, 13): 11,
+            (10, 21, 2, 16): 10,
+            (10, 22, 2, 7): 11,
+            (10, 22, 2, 13): 11,
+            (10, 22, 2, 16): 10}),
+ (6, 21): (3, {(21, 2, 7): 11, (21, 2, 13): 11, (21, 2, 16): 10}),
+ (6, 22): (3, {(22, 2, 7): 11, (22, 2, 13): 11, (22, 2, 16): 10})}
+
+CONFLICTS = ['ClassMember on PUBLIC: MethodDecl / VarDecl, resolved with 4 tokens of lookahead',
+ 'ClassMember on PROTECTED: MethodDecl / VarDecl, resolved with 4 tokens of lookahead',
+ 'ClassMember on PRIVATE: MethodDecl / VarDecl, resolved with 4 tokens of lookahead',
+ 'ClassMember on INT: MethodDecl / VarDecl, resolved with 3 tokens of lookahead',
+ 'ClassMember on BOOLEAN: MethodDecl / VarDecl, resolved with 3 tokens of lookahead',
+ 'ElseOpt on ELSE: ELSE Statement / ε, resolved by preference']
@@ -0,0 +1,155 @@
+from Tree import *
+from lexer import RegexLexer
+from parser import Parser
+
+"""
+====================
+     增量重解析
+====================
+编辑器每次按键只改动源码的一小段。reparse找到按span严格包含这次编辑的最内层
+MethodDecl、Block或ClassDecl，只把这一段重新解析，换掉旧树里的那棵子树，再把它后面
+所有结点的区间平移，得到的树和整个文件重新解析的结果完全一样。
+
+只有新子树恰好在旧的右界(平移之后)结束、后面的token也还是原来那个时才会采用，
+否则往外一层再试，一直到整个文件重新解析。错误恢复的"原地打转"判断依赖上一次恢复
+停下的位置，可能受它影响的情况也一律往外退。
+
+edit: (offset, removed, inserted)，把源码[offset, offset + removed)换成inserted。
+旧树会被原地修改，树上的source记录着它对应的源码。
+"""
+
+
+def parse(source: str) -> CompilationUnit:
+    """
+    完整解析，得到的树可以交给reparse
+    """
+    unit = Parser(source, RegexLexer).parse_compilation_unit()
+    unit.source = source
+    return unit
+
+
+def reparse(old_unit: CompilationUnit, edit: tuple[int, int, str]) -> CompilationUnit:
+    offset, removed, inserted = edit
+    old = old_unit.source
+    if offset < 0 or removed < 0 or offset + removed > len(old):
+        raise ValueError(f"edit {offset}:{offset + removed} out of range")
+    new = old[:offset] + inserted + old[offset + removed:]
+    delta = len(inserted) - removed
+
+    for owner, key, node in reversed(enclosing(old_unit, offset, offset + removed)):
+        parse_region = _entries.get(type(node))
+        if parse_region is None:
+            continue
+        replacement = reparse_region(old, new, node, parse_region, delta)
+        if replacement is not None:
+            move(old_unit, node, delta)
+            if isinstance(owner, list):
+                owner[key] = replacement
+            else:
+                setattr(owner, key, replacement)
+            old_unit.source = new
+            return old_unit
+    return parse(new)
+
+
+def enclosing(unit: CompilationUnit, lo: int, hi: int) -> list:
+    """
+    从外到内列出按span严格包含[lo, hi)的正常结点，每项是(所在的list或结点, 下标或属性名, 结点)
+    """
+    path = []
+    slots = _slots(unit)
+    while slots:
+        for owner, key in slots:
+            node = owner[key] if isinstance(owner, list) else getattr(owner, key)
+            if (
+                isinstance(node, Tree)
+                and node.is_normal_node
+                and node.span is not None
+                and node.span[0] < lo
+                and hi < node.span[1]
+            ):
+                path.append((owner, key, node))
+                slots = _slots(node)
+                break
+        else:
+            break
+    return path
+
+
+def _slots(node: Tree) -> list:
+    if isinstance(node, (CompilationUnit, ClassDecl, Block)):
+        return [(node.defs, i) for i in range(len(node.defs))]
+    if isinstance(node, MethodDecl):
+        return [(node, "body")]
+    if isinstance(node, IfStatement):
+        return [(node, "then_part"), (node, "else_part")]
+    return []
+
+
+# 重新解析各种结点时从哪个方法进入，和完整解析时调用它们的地方一致
+_entries = {
+    ClassDecl: Parser.parse_toplevel_def,
+    MethodDecl: Parser.parse_class_member,
+    Block: Parser.parse_block,
+}
+
+
+def reparse_region(old: str, new: str, node: Tree, parse_region, delta: int):
+    """
+    在新源码上从node的起点重新解析，边界和解析器状态都和原来对得上时返回新子树，否则返回None
+    """
+    start, end = node.span
+    old_next = next_token_start(old, end)
+    # 旧子树里某次恢复恰好停在后面那个token上的话，后面的解析可能依赖这一点
+    for n in walk(node):
+        if not n.is_normal_node and not old[n.info[1]:old_next].strip(" \n\t"):
+            return None
+
+    parser = Parser(new, RegexLexer)
+    parser.seek(start)
+    replacement = parse_region(parser)
+    if parser.prev_end != end + delta or parser.token_start != old_next + delta:
+        return None
+    if parser.recovered_at == parser.token_start:
+        return None
+    # 在第一个token上就恢复的话，结果取决于这之前最后一次恢复停在哪里
+    for n in walk(replacement):
+        if not n.is_normal_node and n.info[0] == start:
+            return None
+    return replacement
+
+
+def next_token_start(source: str, offset: int) -> int:
+    lexer = RegexLexer(source)
+    lexer.skip_to(offset)
+    lexer.next()
+    return lexer.start
+
+
+def move(unit: CompilationUnit, node: Tree, delta: int):
+    """
+    node将被换掉：它之后的结点平移delta，包含它的结点右端延长delta，它之前的结点不动。
+    表达式内部不记录区间，所以只需要走到语句这一层。
+    """
+    start, end = node.span
+    stack = [unit]
+    while stack:
+        n = stack.pop()
+        if n is node:
+            continue
+        span = n.span
+        if span is not None:
+            if span[1] <= start:
+                continue
+            if span[0] >= end:
+                n.span = (span[0] + delta, span[1] + delta)
+                if not n.is_normal_node:
+                    n.info = (n.info[0] + delta, n.info[1] + delta)
+            else:
+                n.span = (span[0], span[1] + delta)
+        for owner, key in _slots(n):
+            child = owner[key] if isinstance(owner, list) else getattr(owner, key)
+            if isinstance(child, Tree):
+                stack.append(child)
+        if isinstance(n, CompilationUnit) and isinstance(n.package_decl, Tree):
+            stack.append(n.package_decl)
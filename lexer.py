@@ -1,13 +1,27 @@
+import mmap
+import re
+from array import array
+from bisect import bisect_left
+
 from tokens import *
 
 """
 简单词法分析器，直接用就行
+每次next之后，start和end是刚读出的token在源码中的区间[start, end)
 """
+_blanks = frozenset(" \n\t")
+_punctuations = frozenset(";{}=()")
+# 整数后面必须紧跟这些字符之一，否则是错误的token
+_int_ends = _blanks | {";"}
+_word_ends = _blanks | _punctuations | {"end_of_stream"}
+
+
 class Lexer:
     def __init__(self, stream: str):
         self.stream = stream
         self.n = len(stream)
         self.ptr = 0
+        self.start = self.end = 0
         self.buf = []
         self.current = self.stream[self.ptr]
         return
@@ -23,18 +37,34 @@ class Lexer:
             self.current = self.stream[self.ptr]
 
     def next(self) -> Token:
-        while self.current in [' ', '\n', '\t']:
+        while self.current in _blanks:
             self.next_char()
         if self.ptr >= self.n or self.current == "end_of_stream":
+            self.start = self.end = self.n
             return eof
+        self.start = self.ptr
         if '0' <= self.current <= '9':
-            return self.parse_int()
-        elif self.current in [';', '{', '}', '=', '(', ')']:
+            token = self.parse_int()
+        elif self.current in _punctuations:
             token = shared_str_to_terminal[self.current]
             self.next_char()
-            return token
         else:
-            return self.parse_word()
+            token = self.parse_word()
+        self.end = self.n if self.current == "end_of_stream" else self.ptr
+        return token
+
+    def next_kind(self) -> int:
+        return self.next().kind
+
+    def skip_to(self, offset: int):
+        """
+        直接跳到字符偏移offset处
+        """
+        if offset < self.n:
+            self.set_pos(offset)
+        else:
+            self.ptr = self.n - 1
+            self.current = "end_of_stream"
 
     def set_pos(self, pos: int):
         if pos < self.n:
@@ -47,31 +77,285 @@ class Lexer:
         while '0' <= self.current <= '9':
             self.buf.append(self.current)
             self.next_char()
-        if self.current in [' ', '\n', '\t', ';']:
-            return Token("INT_LITERAL", int("".join(self.buf)))
+        if self.current in _int_ends:
+            return Token("INT_LITERAL", int("".join(self.buf)), INT_LITERAL)
         else:
-            self.skip(["(", ")", "{", "}", "=", ";", " ", "\n", "\t"])
+            self.skip(_word_ends)
             return test_terminal_illegal_token
 
     def parse_word(self) -> Token:
         self.buf = []
-        while self.current not in ["(", ")", "{", "}", "=", ";", " ", "\n", "\t", "end_of_stream"]:
+        while self.current not in _word_ends:
             self.buf.append(self.current)
             self.next_char()
         word = "".join(self.buf)
-        if word in shared_str_to_terminal.keys():
-            return shared_str_to_terminal[word]
-        else:
-            return Token("ID", word)
+        token = shared_str_to_terminal.get(word)
+        if token is None:
+            return Token("ID", word, ID)
+        return token
 
-    def skip(self, expect: list[str]):
-        expect.append("end_of_stream")
+    def skip(self, expect: frozenset[str]):
+        """
+        跳到expect中的字符或者流末尾
+        """
         while self.current not in expect:
             self.next_char()
     
     def __len__(self):
         return self.n
 
+
+"""
+基于预编译正则的词法分析器，与Lexer产生完全相同的token序列，只是快得多。
+整个词法规则编成一个主正则，每次next只做一次match，不再逐字符推进。
+ptr指向下一个未读字符，读到流末尾后等于n。
+同一个词只会创建一个ID token，之后直接复用；缓存超过word_cache_size个词时清空重来，
+免得词汇量很大的生成代码让缓存无限增长。
+"""
+_master_pattern = re.compile(
+    r"[ \n\t]*(?:"
+    r"(?P<INT>[0-9]+)(?=[ \n\t;])"
+    r"|(?P<ERROR>[0-9][^(){}=; \n\t]*)"
+    r"|(?P<PUNCT>[;{}=()])"
+    r"|(?P<WORD>[^(){}=; \n\t]+)"
+    r")"
+)
+
+# 主正则里各个分组的编号(m.lastindex)对应的token种类，None表示要按词查
+_INT_GROUP, _ERROR_GROUP, _PUNCT_GROUP, _WORD_GROUP = 1, 2, 3, 4
+_group_kinds = [None, INT_LITERAL, ERROR, None, None]
+_word_kinds = {word: token.kind for word, token in shared_str_to_terminal.items()}
+
+
+class RegexLexer:
+    pattern = _master_pattern
+    keywords = shared_str_to_terminal
+    word_kinds = _word_kinds
+    word_cache_size = 4096
+
+    def __init__(self, stream: str):
+        self.stream = stream
+        self.n = len(stream)
+        self.ptr = 0
+        self.start = self.end = 0
+        self.match = self.pattern.match
+        self.words = dict(self.keywords)
+        return
+
+    def next(self) -> Token:
+        m = self.match(self.stream, self.ptr)
+        if m is None:
+            # 只剩空白，直接停在流末尾
+            self.ptr = self.start = self.end = self.n
+            return eof
+        group = m.lastindex
+        self.start = m.start(group)
+        self.ptr = self.end = m.end()
+        return self.token_of(m, group)
+
+    def next_kind(self) -> int:
+        """
+        只读出下一个token的种类编号，不创建Token对象
+        """
+        m = self.match(self.stream, self.ptr)
+        if m is None:
+            self.ptr = self.start = self.end = self.n
+            return EOS
+        group = m.lastindex
+        self.start = m.start(group)
+        self.ptr = self.end = m.end()
+        return self.kind_of(m, group)
+
+    def token_of(self, m, group: int) -> Token:
+        if group >= _PUNCT_GROUP:
+            word = m.group(group)
+            token = self.words.get(word)
+            if token is None:
+                if len(self.words) >= self.word_cache_size:
+                    self.words = dict(self.keywords)
+                token = self.words[word] = Token("ID", self.text(word), ID)
+            return token
+        elif group == _INT_GROUP:
+            return Token("INT_LITERAL", int(m.group(group)), INT_LITERAL)
+        else:
+            return test_terminal_illegal_token
+
+    def kind_of(self, m, group: int) -> int:
+        kind = _group_kinds[group]
+        if kind is None:
+            return self.word_kinds.get(m.group(group), ID)
+        return kind
+
+    def text(self, word) -> str:
+        return word
+
+    def set_pos(self, pos: int):
+        if pos < self.n:
+            self.ptr = pos
+
+    def skip_to(self, offset: int):
+        self.ptr = min(offset, self.n)
+
+    def __len__(self):
+        return self.n
+
+
+"""
+====================
+     行号索引
+====================
+把源码偏移换算成(行, 列)，行列都从1开始。
+换行符位置表在第一次查询时才建立，之后每次查询只是一次二分。
+source可以是str，也可以是bytes或mmap；分块读入源码时传None，再用add逐块登记。
+"""
+
+
+class LineIndex:
+    def __init__(self, source: str):
+        self.source = source
+        self.newlines = None
+        return
+
+    def build(self):
+        self.newlines = array("i")
+        if self.source is not None:
+            self.add(self.source, 0)
+
+    def add(self, text, offset: int):
+        """
+        登记从offset开始的一段源码中的换行
+        """
+        if self.newlines is None:
+            self.newlines = array("i")
+        newline = "\n" if isinstance(text, str) else b"\n"
+        newlines = self.newlines
+        find = text.find
+        pos = find(newline)
+        while pos >= 0:
+            newlines.append(offset + pos)
+            pos = find(newline, pos + 1)
+
+    def line_col(self, offset: int) -> tuple[int, int]:
+        if self.newlines is None:
+            self.build()
+        line = bisect_left(self.newlines, offset)
+        if line == 0:
+            return 1, offset + 1
+        return line + 1, offset - self.newlines[line - 1]
+
+
+"""
+在bytes、bytearray或mmap上工作的RegexLexer，源码按ASCII/UTF-8处理，
+start、end、ptr都是字节偏移。ID的内容在第一次出现时解码成str。
+"""
+_bytes_master_pattern = re.compile(_master_pattern.pattern.encode())
+
+
+class BytesLexer(RegexLexer):
+    pattern = _bytes_master_pattern
+    keywords = {word.encode(): token for word, token in shared_str_to_terminal.items()}
+    word_kinds = {word.encode(): kind for word, kind in _word_kinds.items()}
+
+    @classmethod
+    def open(cls, path: str):
+        """
+        把文件只读地映射到内存，直接在映射上做词法分析
+        """
+        with open(path, "rb") as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # 空文件不能映射
+                data = b""
+        return cls(data)
+
+    def text(self, word: bytes) -> str:
+        return word.decode()
+
+    def close(self):
+        if isinstance(self.stream, mmap.mmap):
+            self.stream.close()
+
+
+"""
+按块读取文本文件的RegexLexer，内存里只保留一个有限的滑动窗口。
+stream: 文本文件对象，每次读入chunk_size个字符
+匹配碰到窗口末尾时说明token可能还没读完，先读下一块再重新匹配，所以跨块的token
+也能完整读出。ptr、start、end是整个文件中的字符偏移，base是窗口开头的偏移。
+读新块时会丢掉ptr之前超过chunk_size的部分，但总会留住最近recent_tokens个token，
+set_pos只能回到窗口之内。
+换行位置在读入时顺便记进lines，不需要整个源码也能查行列。
+"""
+
+
+class StreamLexer(RegexLexer):
+    recent_tokens = 8
+
+    def __init__(self, stream, chunk_size: int = 1 << 16):
+        super().__init__("")
+        self.reader = stream
+        self.chunk_size = chunk_size
+        self.base = 0
+        # 最近几个token开始前的位置，环形存放
+        self.recent = [0] * self.recent_tokens
+        self.count = 0
+        self.eof = False
+        self.lines = LineIndex(None)
+        self.refill()
+        return
+
+    def refill(self):
+        chunk = self.reader.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return
+        keep = min(self.ptr - self.chunk_size, min(self.recent)) - self.base
+        if keep > 0:
+            self.stream = self.stream[keep:]
+            self.base += keep
+        self.lines.add(chunk, self.base + len(self.stream))
+        self.stream += chunk
+        self.n = self.base + len(self.stream)
+
+    def scan(self):
+        self.recent[self.count % self.recent_tokens] = self.ptr
+        self.count += 1
+        while True:
+            m = self.match(self.stream, self.ptr - self.base)
+            if self.eof or (m is not None and m.end() < len(self.stream)):
+                return m
+            self.refill()
+
+    def next(self) -> Token:
+        m = self.scan()
+        if m is None:
+            self.ptr = self.start = self.end = self.n
+            return eof
+        group = m.lastindex
+        self.start = self.base + m.start(group)
+        self.ptr = self.end = self.base + m.end()
+        return self.token_of(m, group)
+
+    def next_kind(self) -> int:
+        m = self.scan()
+        if m is None:
+            self.ptr = self.start = self.end = self.n
+            return EOS
+        group = m.lastindex
+        self.start = self.base + m.start(group)
+        self.ptr = self.end = self.base + m.end()
+        return self.kind_of(m, group)
+
+    def set_pos(self, pos: int):
+        if pos < self.base:
+            raise ValueError(f"position {pos} has left the lexer window")
+        if pos < self.n:
+            self.ptr = pos
+
+    def close(self):
+        self.reader.close()
+
+
 if __name__ == '__main__':
     stream = '''
     package pk;
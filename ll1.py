@@ -0,0 +1,127 @@
+from array import array
+
+from diagnostics import Code, Diagnostics
+from grammar import NONTERMINAL, tables
+from lexer import RegexLexer
+from tokens import EOS, kind_names
+
+QUIET = 3
+
+"""
+====================
+   表驱动的LL(1)分析
+====================
+不用parse_*方法，只靠grammar里的分析表和一个符号栈解析：栈顶是token就和当前token比较，
+是非终结符就按TABLE[非终结符][当前token]换成产生式的右部。LOOKAHEAD里有的格子
+再多看几个token决定产生式，向前看用lexer的ptr和set_pos，读完退回去。
+
+出错时按FOLLOW集做恐慌恢复：
+- 栈顶的token对不上：报错，当作它已经在那里了(弹出，不读token)；
+- 非终结符没有可用的产生式：报错，跳过token直到遇到它的FIRST(重新展开)或者
+  FOLLOW(弹出，当作已经推导完)中的token，或者EOS。
+报错之后要连续匹配上QUIET个token才会再报(和yacc一样是3个)，免得一个错误引出一串。
+
+只做识别，不建树；结果是最左推导依次用到的产生式编号(grammar.tables.productions的下标)，
+需要时可以据此重建分析树。错误记在diagnostics.Diagnostics里，都是UNEXPECTED_TOKEN。
+"""
+
+
+class TableParser:
+    def __init__(self, stream, lexer_cls=RegexLexer, lexer=None, diagnostics=None, tables=tables):
+        """
+        lexer_cls, lexer: 同parser.Parser，需要next_kind、set_pos、ptr、start、end
+        """
+        self.lexer = lexer if lexer is not None else lexer_cls(stream)
+        self.diagnostics = Diagnostics() if diagnostics is None else diagnostics
+        self.tables = tables
+        self.derivation = array("H")
+        self.tokens = 0
+        return
+
+    @property
+    def errors(self) -> int:
+        return self.diagnostics.errors
+
+    def parse(self, start: str = "CompilationUnit") -> array:
+        """
+        从非终结符start开始解析到EOS，返回最左推导的产生式编号序列
+        """
+        tables = self.tables
+        table, productions, lookahead = tables.table, tables.productions, tables.lookahead
+        first, follow = tables.first, tables.follow
+        lexer = self.lexer
+        next_kind = lexer.next_kind
+        derivation = self.derivation
+        report = self.diagnostics.add
+        matched = 0
+        # 报过错之后还要匹配上几个token才再报错
+        quiet = 0
+
+        kind = next_kind()
+        stack = [EOS, tables.index[start]]
+        while stack:
+            top = stack.pop()
+            if top < NONTERMINAL:
+                if top == kind:
+                    if kind == EOS:
+                        break
+                    matched += 1
+                    if quiet:
+                        quiet -= 1
+                    kind = next_kind()
+                elif top == EOS:
+                    # 推导完了还有多余的token
+                    if not quiet:
+                        report(Code.UNEXPECTED_TOKEN, lexer.start, lexer.end, "EOS", kind_names[kind])
+                    break
+                else:
+                    if not quiet:
+                        report(Code.UNEXPECTED_TOKEN, lexer.start, lexer.end, kind_names[top], kind_names[kind])
+                    quiet = QUIET
+                continue
+
+            nonterminal = top - NONTERMINAL
+            production = table[nonterminal][kind]
+            if production >= 0:
+                choices = lookahead.get((nonterminal, kind))
+                if choices is not None:
+                    production = self.choose(kind, choices, production)
+                derivation.append(production)
+                stack.extend(reversed(productions[production][1]))
+                continue
+
+            if not quiet:
+                report(
+                    Code.UNEXPECTED_TOKEN,
+                    lexer.start,
+                    lexer.end,
+                    self.expected(nonterminal),
+                    kind_names[kind],
+                )
+            quiet = QUIET
+            while kind != EOS and kind not in first[nonterminal] and kind not in follow[nonterminal]:
+                kind = next_kind()
+            if kind in first[nonterminal]:
+                stack.append(top)
+        self.tokens += matched
+        return derivation
+
+    def choose(self, kind: int, choices: tuple, default: int) -> int:
+        """
+        有冲突的格子：多看k - 1个token，按最长的已知前缀选产生式
+        """
+        k, prefixes = choices
+        lexer = self.lexer
+        pos, start, end = lexer.ptr, lexer.start, lexer.end
+        kinds = (kind,) + tuple(lexer.next_kind() for _ in range(k - 1))
+        lexer.set_pos(pos)
+        lexer.start, lexer.end = start, end
+        for n in range(k, 0, -1):
+            production = prefixes.get(kinds[:n])
+            if production is not None:
+                return production
+        return default
+
+    def expected(self, nonterminal: int) -> str:
+        row = self.tables.table[nonterminal]
+        return "/".join(kind_names[kind] for kind, production in enumerate(row) if production >= 0)
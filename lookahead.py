@@ -0,0 +1,117 @@
+from tokens import *
+
+"""
+====================
+     token缓冲区
+====================
+架在lexer之上的环形缓冲区，每个token只从lexer读一次。
+peek(k)向前看第k个还没被next读走的token，mark()记下当前位置，reset(mark)回到
+那个位置重新读，期间都不会再碰lexer。
+缓冲区按绝对下标编号，实际槽位是下标 & mask。只要还有没释放的mark，
+从最早的mark起的token都会保留，装不下时容量翻倍。
+对外提供和lexer一样的next, start, end，可以直接替换lexer使用。
+"""
+
+
+class TokenBuffer:
+    def __init__(self, lexer, capacity: int = 8):
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self.lexer = lexer
+        self.mask = size - 1
+        self.tokens: list[Token] = [None] * size
+        self.starts = [0] * size
+        self.ends = [0] * size
+        # 读这个token之前lexer的位置，rewind时用
+        self.ptrs = [0] * size
+        # head: 下一次next要返回的绝对下标；tail: 缓冲区中最后一个token之后的下标
+        self.head = 0
+        self.tail = 0
+        self.marks: list[int] = []
+        self.start = self.end = 0
+        return
+
+    def low(self) -> int:
+        """
+        仍需保留的最早下标
+        """
+        if self.marks:
+            return min(min(self.marks), self.head)
+        return self.head
+
+    def fill(self, index: int):
+        """
+        从lexer读token，直到下标index进入缓冲区
+        """
+        lexer = self.lexer
+        while self.tail <= index:
+            if self.tail - self.low() > self.mask:
+                self.grow()
+            slot = self.tail & self.mask
+            self.ptrs[slot] = lexer.ptr
+            self.tokens[slot] = lexer.next()
+            self.starts[slot] = lexer.start
+            self.ends[slot] = lexer.end
+            self.tail += 1
+
+    def grow(self):
+        size = (self.mask + 1) * 2
+        tokens, starts, ends, ptrs = [None] * size, [0] * size, [0] * size, [0] * size
+        for index in range(self.low(), self.tail):
+            old, new = index & self.mask, index & (size - 1)
+            tokens[new] = self.tokens[old]
+            starts[new] = self.starts[old]
+            ends[new] = self.ends[old]
+            ptrs[new] = self.ptrs[old]
+        self.tokens, self.starts, self.ends, self.ptrs = tokens, starts, ends, ptrs
+        self.mask = size - 1
+
+    def next(self) -> Token:
+        index = self.head
+        if index >= self.tail:
+            self.fill(index)
+        slot = index & self.mask
+        self.head = index + 1
+        self.start = self.starts[slot]
+        self.end = self.ends[slot]
+        return self.tokens[slot]
+
+    def peek(self, k: int = 0) -> Token:
+        """
+        不移动位置地看第k个未读token，peek(0)就是下一次next的结果
+        """
+        index = self.head + k
+        if index >= self.tail:
+            self.fill(index)
+        return self.tokens[index & self.mask]
+
+    def rewind(self) -> int:
+        """
+        丢掉最近一次next读出的token以及它之后的所有预读，返回读那个token之前lexer的位置。
+        调用方把lexer移回这个位置之后可以直接在lexer上往前跳，再接着用next读。
+        """
+        index = self.head - 1
+        self.head = self.tail = index
+        return self.ptrs[index & self.mask]
+
+    def mark(self, back: int = 0) -> int:
+        """
+        记下当前位置，back > 0时记下已经读过的倒数第back个token的位置
+        """
+        mark = self.head - back
+        self.marks.append(mark)
+        return mark
+
+    def reset(self, mark: int):
+        """
+        回到mark处并释放这个mark
+        """
+        self.head = mark
+        self.release(mark)
+
+    def release(self, mark: int):
+        """
+        不回退，只是放弃这个mark
+        """
+        self.marks.remove(mark)
@@ -0,0 +1,129 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from Tree import CompilationUnit, shift
+from diagnostics import Diagnostics
+from lexer import RegexLexer
+from parser import Parser
+from tokens import EOS
+from prescan import toplevel_ends
+
+"""
+====================
+   并行解析顶层类
+====================
+按顶层的}(嵌套深度回到0的位置)把源码切成若干段，每段交给进程池单独解析，
+再按顺序拼回一个CompilationUnit，结果和串行解析完全一样，错误结点也一样。
+
+单独解析一段时看不到段外的token，所以只有没出现任何语法错误的段才能直接采用：
+这样的段里每个结构都在段内正常闭合，串行解析走到这里时做的决定完全相同。
+有错误的段从段首开始串行重新解析，错误恢复可能跨过段的边界，
+一直解析到某个类定义结束时恰好停在后面某段的开头，再接着采用那一段的并行结果。
+"""
+
+
+def split_toplevel(stream: str) -> list[tuple[int, int]]:
+    """
+    把源码切成段[start, end)，除最后一段外每段都以顶层的}结尾
+    """
+    bounds = [0] + toplevel_ends(stream)
+    if bounds[-1] < len(stream):
+        bounds.append(len(stream))
+    return list(zip(bounds, bounds[1:]))
+
+
+def first_token_start(stream: str, start: int, end: int) -> int:
+    segment = stream[start:end]
+    return end - len(segment.lstrip(" \n\t")) if segment.strip(" \n\t") else end
+
+
+def parse_segments(text: str, base: int, segments: list[tuple[int, int]], first: bool):
+    """
+    进程池里执行：text是stream[base:...]，逐段解析，返回每段的(包声明, 类定义列表, 错误数, 已解析部分的右界)。
+    first为True时第一段是文件开头，要先解析包声明。
+    """
+    results = []
+    for start, end in segments:
+        segment = text[start - base:end - base]
+        parser = Parser(segment, RegexLexer, diagnostics=Diagnostics.discard())
+        if first:
+            unit = parser.parse_compilation_unit()
+            first = False
+        else:
+            unit = CompilationUnit(None, [])
+            parser.parse_class_decls(unit)
+        shift(unit, start)
+        results.append((unit.package_decl, unit.defs, parser.errors, parser.prev_end + start))
+    return results
+
+
+def make_tasks(segments: list[tuple[int, int]], task_size: int) -> list[list[tuple[int, int]]]:
+    tasks, task = [], []
+    for segment in segments:
+        task.append(segment)
+        if segment[1] - task[0][0] >= task_size:
+            tasks.append(task)
+            task = []
+    if task:
+        tasks.append(task)
+    return tasks
+
+
+def parse_parallel(stream: str, workers: int = None, executor=None) -> CompilationUnit:
+    """
+    stream: 整个源码
+    workers: 进程数，默认os.cpu_count()
+    executor: 可以传入一个现成的进程池反复使用，这时忽略workers
+    """
+    workers = workers or os.cpu_count() or 1
+    segments = split_toplevel(stream)
+    if len(segments) < 2 or (executor is None and workers == 1):
+        return Parser(stream, RegexLexer).parse_compilation_unit()
+
+    tasks = make_tasks(segments, max(len(stream) // (workers * 4), 1))
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(workers)
+    try:
+        futures = [
+            executor.submit(
+                parse_segments, stream[task[0][0]:task[-1][1]], task[0][0], task, i == 0
+            )
+            for i, task in enumerate(tasks)
+        ]
+        results = [result for future in futures for result in future.result()]
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return merge(stream, segments, results)
+
+
+def merge(stream: str, segments, results) -> CompilationUnit:
+    firsts = {first_token_start(stream, start, end): i for i, (start, end) in enumerate(segments)}
+    unit = None
+    recovered_at = -1
+    end = 0
+    i = 0
+    while i < len(segments):
+        pack, defs, errors, segment_end = results[i]
+        if errors == 0:
+            if unit is None:
+                unit = CompilationUnit(pack, defs)
+            else:
+                unit.defs.extend(defs)
+            end = max(end, segment_end)
+            i += 1
+            continue
+        parser = Parser(stream, RegexLexer, diagnostics=Diagnostics.discard())
+        if unit is None:
+            unit = parser.parse_compilation_unit(firsts)
+        else:
+            parser.seek(segments[i][0])
+            parser.recovered_at = recovered_at
+            parser.parse_class_decls(unit, firsts)
+        recovered_at = parser.recovered_at
+        end = max(end, parser.prev_end)
+        i = len(segments) if parser.token.kind == EOS else firsts[parser.token_start]
+    start = first_token_start(stream, 0, len(stream))
+    unit.span = (start, max(start, end))
+    return unit
@@ -1,35 +1,270 @@
-from pytest import Package
+import copy
+
 from Tree import *
-from lexer import Lexer
+from arena import ArenaBuilder
+from diagnostics import Code, Diagnostics, TextReporter
+from lexer import BytesLexer, LineIndex, Lexer, StreamLexer
+from lookahead import TokenBuffer
+from tokenstream import TokenStream
+from prescan import BracketIndex, match_bracket
 from tokens import *
 from recovery import *
 
+# 解析结果(树的结构、区间、错误结点)或结点类的布局有变化时加一，按版本区分的缓存随之失效
+PARSER_VERSION = 4
+
+
+# parse_nested的栈帧种类和状态
+_BLOCK, _IF = 0, 1
+# 在当前token处开始一个新语句
+_START = object()
+# 块刚刚开始，还没有语句交给它
+_CONTINUE = object()
+# 访问修饰符的token种类 -> parse_modifier的返回值
+_modifier_levels = {PUBLIC: 3, PROTECTED: 2, PRIVATE: 1}
+# parse_statement、parse_expression和is_method_declaration只分两三路，仍然用if比较种类编号：
+# 换成种类 -> 处理方法的表要多一次查表和方法调用，实测没有可见的收益
+
 
 class Parser:
-    def __init__(self, stream):
+    def __init__(
+        self,
+        stream,
+        lexer_cls=Lexer,
+        lexer=None,
+        prescan=False,
+        flat=False,
+        diagnostics=None,
+        exceptions=True,
+        profile=None,
+        explicit_stack=False,
+        builder=None,
+        outline=False,
+    ):
+        """
+        lexer_cls: 使用的词法分析器，默认逐字符的Lexer，可换成更快的RegexLexer，
+                   或者换成紧凑的TokenStream
+        lexer: 直接给出一个已经建好的词法分析器，这时忽略lexer_cls
+        prescan: 先用NumPy建好括号配对表(prescan.BracketIndex)，错误恢复时整段跳过括号，
+                 需要整个源码，不能和StreamLexer一起用
+        flat: 直接建出扁平的arena.FlatTree，结点都是下标，parse_compilation_unit返回FlatTree
+        diagnostics: 收集语法错误的diagnostics.Diagnostics，默认全部保留、不输出，
+                     要像以前一样打印出来就传入Diagnostics(reporter=TextReporter())
+        exceptions: 为False时出错不抛异常，parse_*方法直接返回异常对象作为失败的结果，
+                    调用方检查返回值，得到的树和抛异常时完全一样。在Python 3.11上两种方式
+                    耗时差不多(见benchmark.bench_exceptions)
+        profile: profiling.Profile，给出时记录各规则的调用次数和时间、token和恢复的统计，
+                 默认None，不做任何记录
+        explicit_stack: 块和if语句的嵌套用显式栈解析(parse_nested)，不受递归深度限制，
+                        得到的树和诊断与递归解析完全一样。递归解析时嵌套太深会抛出RecursionError，
+                        不会当成语法错误
+        builder: 自定义的结点构造器(比如events.EventBuilder)，给出时忽略flat
+        outline: 方法体只按括号配对找到结尾整段跳过，不做词法分析，MethodDecl.body是
+                 Tree.LazyBlock，第一次访问时才解析(见BodyLoader)。只要类和成员的签名时
+                 快得多。需要整个源码，不能和StreamLexer或flat一起用
+        """
         self.stream = stream
-        self.lexer = Lexer(stream)
+        self.lexer = lexer if lexer is not None else lexer_cls(stream)
+        self.brackets = None
+        if prescan:
+            if isinstance(self.lexer, StreamLexer):
+                raise ValueError("prescan needs the whole source, not a stream")
+            self.brackets = BracketIndex(self.lexer.stream)
+        self.lines = getattr(self.lexer, "lines", None) or LineIndex(self.lexer.stream)
+        self.tokens = TokenBuffer(self.lexer)
+        if builder is None:
+            builder = ArenaBuilder() if flat else TreeBuilder()
+        self.builder = builder
+        self.make = self.builder.make
         self.token: Token = eof
+        self.token_start = self.token_end = 0
+        # 上一个被读过的token的结束位置，也就是已解析部分的右界
+        self.prev_end = 0
+        self.recovered_at = -1
+        self.diagnostics = diagnostics if diagnostics is not None else Diagnostics()
+        self.exceptions = exceptions
+        self.body_loader = None
+        if outline:
+            if isinstance(self.lexer, StreamLexer):
+                raise ValueError("outline needs the whole source, not a stream")
+            if isinstance(self.builder, ArenaBuilder):
+                raise ValueError("outline builds lazy bodies, not a flat tree")
+            self.body_loader = BodyLoader(self.lexer, self.diagnostics, exceptions, explicit_stack)
+        if explicit_stack:
+            self.parse_block = self.parse_block_stack
+            self.parse_statement = self.parse_statement_stack
+        self.profile = profile
+        if profile is not None:
+            profile.attach(self)
         self.next_token()
         return
 
+    @classmethod
+    def from_file(cls, path: str, mode: str = "mmap", chunk_size: int = 1 << 16, **options):
+        """
+        直接解析文件，不把整个源码读成一个str，options是Parser的其他参数
+        mode="mmap": 把文件映射到内存，在字节上做词法分析(ASCII/UTF-8)，位置是字节偏移
+        mode="stream": 按块读入文本，只保留一个有限的滑动窗口，位置是字符偏移
+        文件由lexer持有，用完要close，或者用with Parser.from_file(...) as parser
+        """
+        if mode == "mmap":
+            lexer = BytesLexer.open(path)
+        elif mode == "stream":
+            lexer = StreamLexer(open(path, encoding="utf-8"), chunk_size)
+        else:
+            raise ValueError(f"unknown input mode: {mode}")
+        return cls(None, lexer=lexer, **options)
+
+    def close(self):
+        """
+        关闭lexer持有的文件或mmap，没有的话什么都不做。
+        outline模式下还没解析的方法体之后不能再解析，访问时抛出ValueError
+        """
+        if self.body_loader is not None:
+            self.body_loader.close()
+        close = getattr(self.lexer, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def errors(self) -> int:
+        """
+        遇到过的语法错误个数
+        """
+        return self.diagnostics.errors
+
+    def report(self, code: Code, error: Exception):
+        """
+        记下一条诊断，位置和期望的token取自SyntaxError，其他异常取当前token的位置
+        """
+        span = getattr(error, "span", None) or self.token_span()
+        expected = getattr(error, "token", None)
+        self.diagnostics.add(code, span[0], span[1], expected, str(error))
+
+    def seek(self, offset: int):
+        """
+        丢掉预读的token，从源码偏移offset处重新开始读，lexer需要有skip_to
+        """
+        self.lexer.skip_to(offset)
+        self.tokens = TokenBuffer(self.lexer)
+        self.next_token()
+
     def next_token(self):
         """
         移动到下一个token
         """
-        self.token = self.lexer.next()
+        self.prev_end = self.token_end
+        self.token = self.tokens.next()
+        self.token_start = self.tokens.start
+        self.token_end = self.tokens.end
         return
 
-    def accept(self, token_kind: str):
+    def peek(self, k: int = 1) -> Token:
+        """
+        向前看第k个token，peek(0)是当前token
+        """
+        if k == 0:
+            return self.token
+        return self.tokens.peek(k - 1)
+
+    def mark(self) -> int:
+        """
+        记下当前位置，之后可以用reset回到这里重新解析
+        """
+        return self.tokens.mark(1)
+
+    def reset(self, mark: int):
+        self.tokens.reset(mark)
+        self.next_token()
+
+    def release(self, mark: int):
+        self.tokens.release(mark)
+
+    def token_span(self) -> tuple[int, int]:
         """
-        检查当前token是否为指定类型，是则后移，不是就会报语法错误
+        当前token在源码中的区间[start, end)
         """
-        if self.token.name == token_kind:
+        return self.token_start, self.token_end
+
+    def line_col(self, offset: int) -> tuple[int, int]:
+        return self.lines.line_col(offset)
+
+    def recover(self, policy: RecoveryPolicy) -> tuple[int, int]:
+        """
+        从当前token开始恐慌恢复，返回被跳过的区间，之后当前token是恢复停下的位置。
+        如果上次恢复之后一个token都没有前进，这次至少跳过当前token，保证不会原地打转。
+        """
+        if self.token is eof:
+            return self.token_start, self.token_start
+        stuck = self.token_start == self.recovered_at
+        prev_end = self.prev_end
+        self.lexer.set_pos(self.tokens.rewind())
+        span = recovery(self.lexer, policy, stuck, self.brackets)
+        self.next_token()
+        self.prev_end = span[1] if span[1] > span[0] else prev_end
+        self.recovered_at = self.token_start
+        return span
+
+    def error_node(self, node: Tree, policy: RecoveryPolicy, start: int = None) -> Tree:
+        """
+        把node标记为错误结点：从当前token开始恢复，被跳过的区间记在info里
+        start: 这个结构在源码中的起点，默认是出错的位置
+        """
+        if start is None:
+            start = self.token_start
+        self.builder.set_error(node, self.recover(policy), policy)
+        self.builder.set_span(node, start, max(start, self.prev_end))
+        return node
+
+    def finish(self, node: Tree, start: int) -> Tree:
+        """
+        记下正常结点的区间：从start到刚读过的最后一个token
+        """
+        self.builder.set_span(node, start, max(start, self.prev_end))
+        return node
+
+    def error(self, message: str, expected: Token) -> SyntaxError:
+        """
+        在当前token处构造一个带位置的语法错误
+        """
+        return SyntaxError(message, expected, self.token_span())
+
+    def fail(self, message: str, expected: Token):
+        """
+        在当前token处出错，parse_*方法用return self.fail(...)结束
+        """
+        return self.throw(self.error(message, expected))
+
+    def throw(self, error: Exception):
+        """
+        exceptions为True时抛出error，否则把它作为失败的结果返回，由调用方检查
+        """
+        if self.exceptions:
+            raise error
+        return error
+
+    def accept(self, kind: int):
+        """
+        检查当前token是否为指定种类(tokens里的整数编号)，是则后移，不是就会报语法错误
+        """
+        if self.token.kind == kind:
             prev_token = self.token
             self.next_token()
             return prev_token
         else:
-            print(f"Syntax error: expected {token_kind}, but got {self.token.name}")
+            self.diagnostics.add(
+                Code.UNEXPECTED_TOKEN,
+                self.token_start,
+                self.token_end,
+                kind_names[kind],
+                self.token.name,
+            )
             return None
 
     """
@@ -41,208 +276,253 @@ class Parser:
     处理。先做到这一步好了。
     """
 
-    def parse_compilation_unit(self):
+    def parse_compilation_unit(self, stop=None):
         """
         CompilationUnit: [PackageDecl] ClassDecl*
+        stop: 见parse_class_decls
+        """
+        start = self.token_start
+        unit = self.parse_unit_header()
+        self.parse_class_decls(unit, stop)
+        return self.finish_unit(unit, start)
+
+    def parse_unit_header(self):
+        """
+        [PackageDecl]，返回还没有类定义的CompilationUnit
         """
         try:
             pack = self.parse_package_declaration()
         except SyntaxError as e:
-            print(f"Error parsing package declaration: {e}")
-            erre_node = PackageDecl("")
-            erre_node.is_normal_node = False
-            err_tokens = recovery(self.lexer, RecoveryPolicy.find_toplevel_border)
-            erre_node.info = err_tokens
-            pack = erre_node
-
-        unit = CompilationUnit(pack, [])
-        while self.token.name != "EOS":
-            try:
-                class_decl = self.parse_class_decl()
-                unit.add_def(class_decl)
-            except SyntaxError as e:
-                print(f"Error parsing class declaration: {e}")
-                err_node = ClassDecl(0, "", [])
-                err_node.is_normal_node = False
-                err_tokens = recovery(self.lexer, RecoveryPolicy.find_toplevel_border)
-                err_node.info = err_tokens
-                unit.add_def(err_node)
-        return unit
+            pack = e
+        if type(pack) is SyntaxError:
+            self.report(Code.PACKAGE, pack)
+            pack = self.error_node(
+                self.make(PackageDecl, ""), RecoveryPolicy.find_toplevel_border
+            )
+        return self.make(CompilationUnit, pack, [])
+
+    def finish_unit(self, unit, start: int):
+        """
+        记下整个文件的区间，交给builder得到最终结果
+        """
+        return self.builder.result(self.finish(unit, start))
+
+    def parse_class_decls(self, unit: CompilationUnit, stop=None):
+        """
+        ClassDecl*
+        逐个解析顶层类定义加入unit，直到EOS。
+        stop: 一组源码偏移，每解析完一个类定义回到顶层时，当前token从其中某处开始就提前停下
+        """
+        while self.token.kind != EOS:
+            self.builder.add_def(unit, self.parse_toplevel_def())
+            if stop is not None and self.token_start in stop:
+                return
+
+    def parse_toplevel_def(self):
+        """
+        顶层的一个类定义，出错时恢复到下一个类定义可能开始的地方，返回错误结点
+        """
+        start = self.token_start
+        try:
+            node = self.parse_class_decl()
+        except SyntaxError as e:
+            node = e
+        if type(node) is SyntaxError:
+            self.report(Code.CLASS, node)
+            return self.error_node(
+                self.make(ClassDecl, 0, "", [], None),
+                RecoveryPolicy.find_toplevel_border,
+                start,
+            )
+        return node
 
     def parse_class_decl(self):
         """
         ClassDecl: [Modifier] class ID [extends ID] { ClassMember* }
         """
+        start = self.token_start
         access = self.parse_modifier()
 
-        claz = self.accept("CLASS")
+        claz = self.accept(CLASS)
         if not claz:
-            raise SyntaxError(
+            return self.fail(
                 "Expected 'class' keyword", shared_str_to_terminal["class"]
             )
         class_name = self.parse_ident()
         if not class_name:
-            raise SyntaxError("Expected class name", test_terminal_id)
+            return self.fail("Expected class name", test_terminal_id)
+        self.builder.enter(ClassDecl, class_name, access, start, self.prev_end)
 
         extends = None
-        if self.token.name == "EXTENDS":
-            self.accept("EXTENDS")
+        if self.token.kind == EXTENDS:
+            self.accept(EXTENDS)
             extends = self.parse_ident()
             if not extends:
-                raise SyntaxError(
+                return self.fail(
                     "Expected class name after 'extends'", test_terminal_id
                 )
 
-        lbrace = self.accept("LBRACE")
+        lbrace = self.accept(LBRACE)
         if not lbrace:
-            raise SyntaxError(
+            return self.fail(
                 "Expected '{' after class declaration", shared_str_to_terminal["{"]
             )
 
         members = []
-        while self.token.name != "RBRACE" and self.token.name != "EOS":
-            member = None
-            if self.is_method_declaration():
-                try:
-                    member = self.parse_method_decl()
-                except SyntaxError as e:
-                    print(f"Error parsing method declaration: {e}")
-                    err_node = MethodDecl(0, PrimitiveType("void"), "", [], Block([]))
-                    err_node.is_normal_node = False
-                    err_tokens = recovery(
-                        self.lexer, RecoveryPolicy.find_class_member_border
-                    )
-                    err_node.info = err_tokens
-                    member = err_node
-            else:
-                try:
-                    member = self.parse_var_decl()
-                except SyntaxError as e:
-                    print(f"Error parsing variable declaration: {e}")
-                    err_node = VarDecl(0, PrimitiveType("int"), None)
-                    err_node.is_normal_node = False
-                    err_tokens = recovery(
-                        self.lexer, RecoveryPolicy.find_class_member_border
-                    )
-                    err_node.info = err_tokens
-                    member = err_node
-            members.append(member)
-
-        rbrace = self.accept("RBRACE")
+        while self.token.kind != RBRACE and self.token.kind != EOS:
+            members.append(self.parse_class_member())
+
+        rbrace = self.accept(RBRACE)
         if not rbrace:
-            raise SyntaxError(
+            return self.fail(
                 "Expected '}' at the end of class declaration",
                 shared_str_to_terminal["}"],
             )
 
-        return ClassDecl(access, class_name, members, extends)
+        return self.finish(self.make(ClassDecl, access, class_name, members, extends), start)
 
-    def is_method_declaration(self):
+    def parse_class_member(self):
         """
-        判断是否是方法声明的辅助方法
+        ClassMember: MethodDecl | VarDecl
+        出错时恢复到下一个成员可能开始的地方，返回错误结点
         """
-        saved_pos = self.lexer.ptr
-
-        if self.token.name in ["PUBLIC", "PROTECTED", "PRIVATE"]:
-            self.next_token()
+        start = self.token_start
+        if self.is_method_declaration():
+            try:
+                member = self.parse_method_decl()
+            except SyntaxError as e:
+                member = e
+            if type(member) is SyntaxError:
+                self.report(Code.METHOD, member)
+                return self.error_node(
+                    self.make(
+                        MethodDecl,
+                        0,
+                        self.make(PrimitiveType, "void"),
+                        "",
+                        [],
+                        self.make(Block, []),
+                    ),
+                    RecoveryPolicy.find_class_member_border,
+                    start,
+                )
+        else:
+            try:
+                member = self.parse_var_decl()
+            except SyntaxError as e:
+                member = e
+            if type(member) is SyntaxError:
+                self.report(Code.VARIABLE, member)
+                return self.error_node(
+                    self.make(VarDecl, 0, self.make(PrimitiveType, "int"), None),
+                    RecoveryPolicy.find_class_member_border,
+                    start,
+                )
+        return member
 
-        result = False
-        if self.token.name == "VOID":
-            result = True
-        if self.token.name in ["INT", "BOOLEAN", "ID"]:
-            self.next_token()
-            if self.token.name == "ID":
-                self.next_token()
-                if self.token.name == "LPAREN":
-                    result = True
+    def is_method_declaration(self):
+        """
+        判断是否是方法声明的辅助方法，只向前看，不移动当前位置
+        """
+        k = 0
+        if self.token.kind in MODIFIERS:
+            k = 1
 
-        self.lexer.set_pos(saved_pos)
-        return result
+        token = self.peek(k)
+        if token.kind == VOID:
+            return True
+        if token.kind in VAR_TYPES or token.kind == ID:
+            return self.peek(k + 1).kind == ID and self.peek(k + 2).kind == LPAREN
+        return False
 
     def parse_expression(self):
         """
         Expression: ID = Expression | INT_LITERAL | BOOL_LITERAL
         """
-        if self.token.name == "ID":
+        if self.token.kind == ID:
             ident = self.parse_ident()
-            if self.token.name == "EQ":
+            if self.token.kind == EQ:
                 self.next_token()
                 right = self.parse_expression()
-                return Assignment(ident, right)
+                if isinstance(right, Exception):
+                    return right
+                return self.make(Assignment, ident, right)
             return ident
-        elif self.token.name == "INT_LITERAL":
+        elif self.token.kind == INT_LITERAL:
             value = self.token.content
             self.next_token()
-            return Literal("int", value)
-        elif self.token.name in ["TRUE", "FALSE"]:
-            value = self.token.name == "TRUE"
+            return self.make(Literal, "int", value)
+        elif self.token.kind in BOOL_LITERALS:
+            value = self.token.kind == TRUE
             self.next_token()
-            return Literal("boolean", value)
+            return self.make(Literal, "boolean", value)
         else:
-            raise Exception(f"Unexpected token in expression: {self.token.name}")
+            return self.throw(Exception(f"Unexpected token in expression: {self.token.name}"))
 
     def parse_statement(self):
         """
         Statement: Block | IfStatement | VarDecl | Expression
         """
-        if self.token.name == "LBRACE":
+        start = self.token_start
+        # 不是SyntaxError的失败(表达式里的错误)原样交给外层
+        if self.token.kind == LBRACE:
             try:
                 blk = self.parse_block()
-                return blk
             except SyntaxError as e:
-                print(f"Error parsing block: {e}")
-                error_node = Block([])
-                error_node.is_normal_node = False
-
-                error_tokens = recovery(
-                    self.lexer, RecoveryPolicy.find_statement_border
+                blk = e
+            if type(blk) is SyntaxError:
+                self.report(Code.BLOCK, blk)
+                return self.error_node(
+                    self.make(Block, []), RecoveryPolicy.find_statement_border, start
                 )
-                error_node.info = error_tokens
-                return error_node
-        elif self.token.name == "IF":
+            return blk
+        elif self.token.kind == IF:
             try:
                 ifstmt = self.parse_if_statement()
-                return ifstmt
             except SyntaxError as e:
-                print(f"Error parsing if statement: {e}")
-                error_node = IfStatement(None, None, None)
-                error_node.is_normal_node = False
-
-                error_tokens = recovery(
-                    self.lexer, RecoveryPolicy.find_statement_border
+                ifstmt = e
+            if type(ifstmt) is SyntaxError:
+                self.report(Code.IF, ifstmt)
+                return self.error_node(
+                    self.make(IfStatement, None, None, None),
+                    RecoveryPolicy.find_statement_border,
+                    start,
                 )
-                error_node.info = error_tokens
-                return error_node
-        elif self.token.name in ["INT", "BOOLEAN"]:
+            return ifstmt
+        return self.parse_simple_statement(start)
+
+    def parse_simple_statement(self, start: int):
+        """
+        VarDecl | Expression ;，不包含嵌套的语句
+        """
+        if self.token.kind in VAR_TYPES:
             try:
                 var = self.parse_var_decl()
-                return var
             except SyntaxError as e:
-                print(f"Error parsing variable declaration: {e}")
-                error_node = VarDecl(0, PrimitiveType("int"), None)
-                error_node.is_normal_node = False
-
-                error_tokens = recovery(
-                    self.lexer, RecoveryPolicy.find_statement_border
+                var = e
+            if type(var) is SyntaxError:
+                self.report(Code.VARIABLE, var)
+                return self.error_node(
+                    self.make(VarDecl, 0, self.make(PrimitiveType, "int"), None),
+                    RecoveryPolicy.find_statement_border,
+                    start,
                 )
-                error_node.info = error_tokens
-                return error_node
+            return var
         else:
             try:
                 exp = self.parse_expression()
+            except RecursionError:
+                raise
             except Exception as e:
-                print(f"Error parsing expression: {e}")
-                error_node = Expression()
-                error_node.is_normal_node = False
-
-                error_tokens = recovery(
-                    self.lexer, RecoveryPolicy.find_statement_border
+                exp = e
+            if isinstance(exp, Exception):
+                self.report(Code.EXPRESSION, exp)
+                return self.error_node(
+                    self.make(Expression), RecoveryPolicy.find_statement_border, start
                 )
-                error_node.info = error_tokens
-                return error_node
-            semi = self.accept("SEMI")
+            semi = self.accept(SEMI)
             if not semi:
-                raise SyntaxError(
+                return self.fail(
                     "Expected ';' at the end of statement", shared_str_to_terminal[";"]
                 )
             return exp
@@ -251,55 +531,69 @@ class Parser:
         """
         IfStatement: if ( Expression ) Statement [else Statement]
         """
-        ifs = self.accept("IF")
-        if not ifs:
-            raise SyntaxError("Expected 'if' keyword", shared_str_to_terminal["if"])
-        lparen = self.accept("LPAREN")
-        if not lparen:
-            raise SyntaxError("Expected '(' after 'if'", shared_str_to_terminal["("])
-        cond = condition = self.parse_expression()
-        if not condition:
-            raise SyntaxError(
-                "Expected condition expression", test_terminal_bool_literal
-            )
-        rparen = self.accept("RPAREN")
-        if not rparen:
-            raise SyntaxError(
-                "Expected ')' after condition", shared_str_to_terminal[")"]
-            )
+        start = self.token_start
+        condition = self.parse_if_header()
+        if isinstance(condition, Exception):
+            return condition
 
+        then_start = self.token_start
         try:
             then_part = self.parse_statement()
         except SyntaxError as e:
-            print(f"Error parsing then part of if statement: {e}")
-            error_node = Statement()
-            error_node.is_normal_node = False
-
-            error_tokens = recovery(self.lexer, RecoveryPolicy.find_statement_border)
-            error_node.info = error_tokens
-            then_part = error_node
+            then_part = e
+        if type(then_part) is SyntaxError:
+            self.report(Code.THEN_PART, then_part)
+            then_part = self.error_node(
+                self.make(Statement), RecoveryPolicy.find_statement_border, then_start
+            )
+        elif isinstance(then_part, Exception):
+            return then_part
 
         else_part = None
-        if self.token.name == "ELSE":
+        if self.token.kind == ELSE:
             self.next_token()
+            else_start = self.token_start
             try:
                 else_part = self.parse_statement()
             except SyntaxError as e:
-                print(f"Error parsing else part of if statement: {e}")
-                error_node = Statement()
-                error_node.is_normal_node = False
-
-                error_tokens = recovery(
-                    self.lexer, RecoveryPolicy.find_statement_border
+                else_part = e
+            if type(else_part) is SyntaxError:
+                self.report(Code.ELSE_PART, else_part)
+                else_part = self.error_node(
+                    self.make(Statement), RecoveryPolicy.find_statement_border, else_start
                 )
-                error_node.info = error_tokens
-                else_part = error_node
+            elif isinstance(else_part, Exception):
+                return else_part
 
-        return IfStatement(condition, then_part, else_part)
+        return self.finish(self.make(IfStatement, condition, then_part, else_part), start)
+
+    def parse_if_header(self):
+        """
+        if ( Expression )，返回条件表达式
+        """
+        ifs = self.accept(IF)
+        if not ifs:
+            return self.fail("Expected 'if' keyword", shared_str_to_terminal["if"])
+        lparen = self.accept(LPAREN)
+        if not lparen:
+            return self.fail("Expected '(' after 'if'", shared_str_to_terminal["("])
+        condition = self.parse_expression()
+        if isinstance(condition, Exception):
+            return condition
+        if not condition:
+            return self.fail(
+                "Expected condition expression", test_terminal_bool_literal
+            )
+        rparen = self.accept(RPAREN)
+        if not rparen:
+            return self.fail(
+                "Expected ')' after condition", shared_str_to_terminal[")"]
+            )
+        return condition
 
     def parse_ident(self):
-        if self.token.name == "ID":
-            ident = Ident(self.token.content)
+        if self.token.kind == ID:
+            ident = self.make(Ident, self.token.content)
             self.next_token()
             return ident
         else:
@@ -309,86 +603,98 @@ class Parser:
         """
         VarDecl: [Modifier] Type ID = Expression ;
         """
+        start = self.token_start
         try:
-            access = self.parse_modifier()
-
-            var_type = None
-            if self.token.name in ["INT", "BOOLEAN"]:
-                var_type = PrimitiveType(self.token.content)
-                self.next_token()
-            else:
-                raise SyntaxError(
-                    "Expected variable type", shared_str_to_terminal["int"]
-                )
-
-            var_name = self.parse_ident()
-            if not var_name:
-                raise SyntaxError("Expected variable name", test_terminal_id)
-
-            initialization = None
-            if self.token.name == "EQ":
-                eq = self.accept("EQ")
-                if not eq:
-                    raise SyntaxError("Expected '=' in variable declaration", eq)
-
-                initialization = self.parse_expression()
-                if not initialization:
-                    raise SyntaxError(
-                        "Expected initialization expression", test_terminal_int_literal
-                    )
+            var = self.parse_var_decl_parts(start)
+        except RecursionError:
+            raise
+        except Exception as e:
+            var = e
+        if isinstance(var, Exception):
+            self.report(Code.VARIABLE_NOTE, var)
+            # 交给调用方去做错误恢复，吞掉的话类体循环会停在原地
+            if type(var) is not SyntaxError:
+                var = self.error(str(var), test_terminal_int_literal)
+            return self.throw(var)
+        return var
+
+    def parse_var_decl_parts(self, start: int):
+        access = self.parse_modifier()
 
-            semi = self.accept("SEMI")
-            if not semi:
-                raise SyntaxError(
-                    "Expected ';' at the end of variable declaration",
-                    shared_str_to_terminal[";"],
+        var_type = None
+        if self.token.kind in VAR_TYPES:
+            var_type = self.make(PrimitiveType, self.token.content)
+            self.next_token()
+        else:
+            return self.fail("Expected variable type", shared_str_to_terminal["int"])
+
+        var_name = self.parse_ident()
+        if not var_name:
+            return self.fail("Expected variable name", test_terminal_id)
+
+        initialization = None
+        if self.token.kind == EQ:
+            eq = self.accept(EQ)
+            if not eq:
+                return self.fail("Expected '=' in variable declaration", eq)
+
+            initialization = self.parse_expression()
+            if isinstance(initialization, Exception):
+                return initialization
+            if not initialization:
+                return self.fail(
+                    "Expected initialization expression", test_terminal_int_literal
                 )
-            return VarDecl(access, var_type, initialization)
 
-        except Exception as e:
-            print(f"Error in variable declaration: {str(e)}")
+        semi = self.accept(SEMI)
+        if not semi:
+            return self.fail(
+                "Expected ';' at the end of variable declaration",
+                shared_str_to_terminal[";"],
+            )
+        return self.finish(self.make(VarDecl, access, var_type, initialization), start)
 
     def parse_param_list(self):
         """
         ParamList: (Type ID (COMMA Type ID)*)
         """
         params = []
-        lparen = self.accept("LPAREN")
+        lparen = self.accept(LPAREN)
         if not lparen:
-            raise SyntaxError(
+            return self.fail(
                 "Expected '(' in parameter list", shared_str_to_terminal["("]
             )
 
-        if self.token.name == "RPAREN":
-            self.accept("RPAREN")
+        if self.token.kind == RPAREN:
+            self.accept(RPAREN)
             return params
 
         while True:
             param_type = None
-            if self.token.name in ["INT", "BOOLEAN"]:
-                param_type = PrimitiveType(self.token.content)
+            if self.token.kind in VAR_TYPES:
+                param_type = self.make(PrimitiveType, self.token.content)
                 self.next_token()
             else:
                 break
 
-            if self.token.name != "ID":
+            if self.token.kind != ID:
                 break
             param_name = self.token.content
             self.next_token()
 
-            params.append(VarDecl(0, param_type, None))
+            params.append(self.make(VarDecl, 0, param_type, None))
 
-            if self.token.name != "COMMA":
+            if self.token.kind != COMMA:
                 break
-            comma = self.accept("COMMA")
+            comma = self.accept(COMMA)
             if not comma:
-                raise SyntaxError(
+                return self.fail(
                     "Expected ',' in parameter list", shared_str_to_terminal[","]
                 )
 
-        rparen = self.accept("RPAREN")
+        rparen = self.accept(RPAREN)
         if not rparen:
-            raise SyntaxError(
+            return self.fail(
                 "Expected ')' in parameter list", shared_str_to_terminal[")"]
             )
         return params
@@ -397,121 +703,317 @@ class Parser:
         """
         MethodDecl: [Modifier] Type ID (ParamList) (Block | SEMI)
         """
+        start = self.token_start
         access = self.parse_modifier()
 
         return_type = None
-        if self.token.name == "VOID":
-            return_type = PrimitiveType("void")
+        if self.token.kind == VOID:
+            return_type = self.make(PrimitiveType, "void")
             self.next_token()
-        elif self.token.name in ["INT", "BOOLEAN"]:
-            return_type = PrimitiveType(self.token.content)
+        elif self.token.kind in VAR_TYPES:
+            return_type = self.make(PrimitiveType, self.token.content)
             self.next_token()
         else:
-            raise SyntaxError("Expected return type", shared_str_to_terminal["int"])
+            return self.fail("Expected return type", shared_str_to_terminal["int"])
 
-        if self.token.name != "ID":
-            raise SyntaxError("Expected method name", test_terminal_id)
+        if self.token.kind != ID:
+            return self.fail("Expected method name", test_terminal_id)
         method_name = self.token.content
         self.next_token()
+        self.builder.enter(MethodDecl, method_name, access, start, self.prev_end)
 
         try:
             params = self.parse_param_list()
         except SyntaxError as e:
-            print(f"Error parsing parameter list: {e}")
+            params = e
+        if type(params) is SyntaxError:
+            self.report(Code.PARAMS, params)
             params = []
 
         body = None
-        if self.token.name == "LBRACE":
-            try:
-                body = self.parse_block()
-            except SyntaxError as e:
-                print(f"Error parsing method body: {e}")
-                error_node = Block([])
-                error_node.is_normal_node = False
-
-                error_tokens = recovery(
-                    self.lexer, RecoveryPolicy.find_statement_border
-                )
-                error_node.info = error_tokens
-                body = error_node
+        if self.token.kind == LBRACE:
+            if self.body_loader is not None:
+                body = self.skip_body()
+            if body is None:
+                body = self.method_body()
         else:
-            semi = self.accept("SEMI")
+            semi = self.accept(SEMI)
             if not semi:
-                raise SyntaxError(
+                return self.fail(
                     "Expected ';' at the end of method declaration",
                     shared_str_to_terminal[";"],
                 )
-            body = Block([])
+            body = self.make(Block, [])
+
+        method = self.make(MethodDecl, access, return_type, method_name, params, body)
+        return self.finish(method, start)
 
-        return MethodDecl(access, return_type, method_name, params, body)
+    def method_body(self):
+        """
+        从当前的{开始解析方法体，出错时恢复到语句边界，返回错误结点
+        """
+        start = self.token_start
+        try:
+            body = self.parse_block()
+        except SyntaxError as e:
+            body = e
+        if type(body) is SyntaxError:
+            self.report(Code.METHOD_BODY, body)
+            body = self.error_node(self.make(Block, []), RecoveryPolicy.find_statement_border, start)
+        return body
+
+    def skip_body(self):
+        """
+        outline模式：从当前的{按括号配对找到方法体的}，lexer直接跳到它后面，返回
+        builder.lazy给出的惰性方法体。配对的不是}(括号不平衡)时返回None，照常解析
+        """
+        start = self.token_start
+        stream = self.lexer.stream
+        if self.brackets is not None:
+            close = self.brackets.match_of(start)
+        else:
+            close = match_bracket(stream, start)
+        if close < 0 or stream[close:close + 1] not in ("}", b"}"):
+            return None
+        end = close + 1
+        self.lexer.set_pos(self.tokens.rewind())
+        self.lexer.skip_to(end)
+        self.next_token()
+        self.prev_end = end
+        return self.builder.lazy(self.body_loader, start, end)
 
     def parse_block(self):
         """
         Block: { Statement* }
         """
+        start = self.token_start
         statements = []
 
-        lbrace = self.accept("LBRACE")
+        lbrace = self.accept(LBRACE)
         if not lbrace:
-            raise SyntaxError(
+            return self.fail(
                 "Expected '{' at the beginning of block", shared_str_to_terminal["{"]
             )
 
-        while self.token.name != "RBRACE" and self.token.name != "EOS":
+        while self.token.kind != RBRACE and self.token.kind != EOS:
+            stmt_start = self.token_start
             try:
                 stmt = self.parse_statement()
-                statements.append(stmt)
+            except RecursionError:
+                # 嵌套太深不是语法错误，不能变成错误结点(要解析就用explicit_stack)
+                raise
             except Exception as e:
-                print(f"Error parsing statement: {str(e)}")
-                error_node = Statement()
-                error_node.is_normal_node = False
-
-                error_tokens = recovery(
-                    self.lexer, RecoveryPolicy.find_statement_border
+                stmt = e
+            if isinstance(stmt, Exception):
+                self.report(Code.STATEMENT, stmt)
+                stmt = self.error_node(
+                    self.make(Statement), RecoveryPolicy.find_statement_border, stmt_start
                 )
-                error_node.info = error_tokens
-                statements.append(error_node)
+            statements.append(stmt)
 
-        self.accept("RBRACE")
+        self.accept(RBRACE)
 
-        return Block(statements)
+        return self.finish(self.make(Block, statements), start)
+
+    def parse_block_stack(self):
+        """
+        同parse_block，嵌套的语句由parse_nested处理
+        """
+        start = self.token_start
+        lbrace = self.accept(LBRACE)
+        if not lbrace:
+            return self.fail(
+                "Expected '{' at the beginning of block", shared_str_to_terminal["{"]
+            )
+        return self.parse_nested([_BLOCK, start, [], start])
+
+    def parse_statement_stack(self):
+        """
+        同parse_statement，嵌套的语句由parse_nested处理
+        """
+        result = self.parse_nested(None)
+        if isinstance(result, Exception):
+            return self.throw(result)
+        return result
+
+    def parse_nested(self, frame):
+        """
+        用显式栈代替parse_statement -> parse_block/parse_if_statement -> parse_statement的递归。
+        栈里是还没解析完的块[_BLOCK, 起点, 语句, 当前语句的起点]和
+        if语句[_IF, 起点, 条件, then部分, 当前部分的起点, 是否在else部分]。
+        每个语句的结果(结点或者失败时的异常对象)交给栈顶，按递归版本里对应的调用点处理。
+        frame: 已经读过'{'的块，为None时解析一个语句。
+        返回结点，或者失败时的异常对象(不抛出)
+        """
+        stack = [frame] if frame is not None else []
+        outcome = _CONTINUE if frame is not None else _START
+        border = RecoveryPolicy.find_statement_border
+        while True:
+            if outcome is _START:
+                start = self.token_start
+                kind = self.token.kind
+                if kind == LBRACE:
+                    self.accept(LBRACE)
+                    stack.append([_BLOCK, start, [], start])
+                    outcome = _CONTINUE
+                elif kind == IF:
+                    try:
+                        condition = self.parse_if_header()
+                    except RecursionError:
+                        raise
+                    except Exception as e:
+                        condition = e
+                    if type(condition) is SyntaxError:
+                        self.report(Code.IF, condition)
+                        outcome = self.error_node(
+                            self.make(IfStatement, None, None, None), border, start
+                        )
+                    elif isinstance(condition, Exception):
+                        outcome = condition
+                    else:
+                        stack.append([_IF, start, condition, None, self.token_start, False])
+                        continue
+                else:
+                    try:
+                        outcome = self.parse_simple_statement(start)
+                    except RecursionError:
+                        raise
+                    except Exception as e:
+                        outcome = e
+
+            if not stack:
+                return outcome
+            frame = stack[-1]
+            if frame[0] == _BLOCK:
+                if outcome is not _CONTINUE:
+                    if isinstance(outcome, Exception):
+                        self.report(Code.STATEMENT, outcome)
+                        outcome = self.error_node(self.make(Statement), border, frame[3])
+                    frame[2].append(outcome)
+                if self.token.kind != RBRACE and self.token.kind != EOS:
+                    frame[3] = self.token_start
+                    outcome = _START
+                    continue
+                self.accept(RBRACE)
+                stack.pop()
+                outcome = self.finish(self.make(Block, frame[2]), frame[1])
+                continue
+
+            # if语句：then或else部分解析完了
+            if type(outcome) is SyntaxError:
+                self.report(Code.ELSE_PART if frame[5] else Code.THEN_PART, outcome)
+                outcome = self.error_node(self.make(Statement), border, frame[4])
+            elif isinstance(outcome, Exception):
+                # 表达式里的错误，整个if语句失败，原样交给外层
+                stack.pop()
+                continue
+            if frame[5]:
+                then_part, else_part = frame[3], outcome
+            elif self.token.kind == ELSE:
+                frame[3] = outcome
+                self.next_token()
+                frame[4] = self.token_start
+                frame[5] = True
+                outcome = _START
+                continue
+            else:
+                then_part, else_part = outcome, None
+            stack.pop()
+            outcome = self.finish(
+                self.make(IfStatement, frame[2], then_part, else_part), frame[1]
+            )
 
     def parse_modifier(self) -> int:
-        match self.token.name:
-            case "PUBLIC":
-                self.accept("PUBLIC")
-                return 3
-            case "PROTECTED":
-                self.accept("PROTECTED")
-                return 2
-            case "PRIVATE":
-                self.accept("PRIVATE")
-                return 1
-            case _:
-                return 0
+        modifier = _modifier_levels.get(self.token.kind, 0)
+        if modifier:
+            self.next_token()
+        return modifier
 
     def parse_package_declaration(self) -> str:
         """
         PackageDecl: package ID ;
         """
-        if self.token.name != "PACKAGE":
+        start = self.token_start
+        if self.token.kind != PACKAGE:
             return ""
-        pack = self.accept("PACKAGE")
+        pack = self.accept(PACKAGE)
         if not pack:
-            raise SyntaxError(
+            return self.fail(
                 "Expected 'package' keyword", shared_str_to_terminal["package"]
             )
 
-        package_name = self.accept("ID")
+        package_name = self.accept(ID)
         if not package_name:
-            raise SyntaxError("Expected package name", test_terminal_id)
+            return self.fail("Expected package name", test_terminal_id)
 
-        semi = self.accept("SEMI")
+        semi = self.accept(SEMI)
         if not semi:
-            raise SyntaxError(
+            return self.fail(
                 "Expected ';' after package declaration", shared_str_to_terminal[";"]
             )
-        return PackageDecl(package_name.content)
+        return self.finish(self.make(PackageDecl, package_name.content), start)
+
+
+class BodyLoader:
+    """
+    outline模式下惰性方法体的解析，同一次解析的所有方法体共用一个。
+    用自己的一个Parser跳到start处解析方法体，正好在end处结束时直接采用；否则(方法体里
+    有错误，括号配对和解析的结果不一致)把[start, end)这段源码单独解析，再把树平移回去，
+    段内没解析完的部分并入错误结点的info。所以方法体的范围总是以括号配对为准：
+    完整解析时也正好在配对的}处结束的方法体(没有错误的都是)结果完全一样，
+    否则(比如方法体里多出的class让完整解析提前退出了方法)可能不同。
+    诊断在解析时才记进原来的diagnostics，排在其他诊断之后；没有被访问过的方法体
+    (包括所在的类后来成了错误结点的)里的错误不会报告。
+    只引用源码和几个选项，不引用原来的Parser；Parser.close之后(源码是mmap时映射已经关掉)
+    不能再解析，抛出ValueError
+    """
+
+    def __init__(self, lexer, diagnostics: Diagnostics, exceptions=True, explicit_stack=False):
+        self.stream = lexer.stream
+        self.lexer_cls = type(lexer)
+        # TokenStream已经切好了整个源码，复制一份共用token数组，只有游标是自己的
+        self.lexer = copy.copy(lexer) if isinstance(lexer, TokenStream) else None
+        self.diagnostics = diagnostics
+        self.options = {"exceptions": exceptions, "explicit_stack": explicit_stack}
+        self.parser = None
+        return
+
+    def __call__(self, start: int, end: int) -> Block:
+        if self.stream is None:
+            raise ValueError("source of the lazy method body has been closed")
+        if self.parser is None:
+            self.parser = Parser(
+                self.stream, self.lexer_cls, self.lexer, diagnostics=Diagnostics(), **self.options
+            )
+        parser = self.parser
+        diagnostics = parser.diagnostics = Diagnostics()
+        parser.recovered_at = -1
+        parser.seek(start)
+        body = parser.method_body()
+        delta = 0
+        if parser.prev_end != end:
+            body, diagnostics = self.parse_segment(start, end)
+            delta = start
+        for code, span, expected, detail in diagnostics:
+            self.diagnostics.add(code, span[0] + delta, span[1] + delta, expected, detail)
+        return body
+
+    def parse_segment(self, start: int, end: int) -> tuple[Block, Diagnostics]:
+        diagnostics = Diagnostics()
+        parser = Parser(self.stream[start:end], self.lexer_cls, diagnostics=diagnostics, **self.options)
+        body = parser.method_body()
+        if parser.token.kind != EOS:
+            parser.report(Code.METHOD_BODY, parser.error("Expected end of method body", eof))
+            skipped = (parser.token_start, end - start)
+            if not body.is_normal_node:
+                skipped = (min(body.info[0], skipped[0]), skipped[1])
+            parser.builder.set_error(body, skipped)
+            parser.builder.set_span(body, body.span[0], end - start)
+        shift(body, start)
+        return body, diagnostics
+
+    def close(self):
+        self.stream = self.lexer = self.parser = None
 
 
 if __name__ == "__main__":
@@ -528,5 +1030,5 @@ if __name__ == "__main__":
         }
     }
     """
-    p = Parser(stream)
+    p = Parser(stream, diagnostics=Diagnostics(reporter=TextReporter()))
     p.parse_compilation_unit()
@@ -0,0 +1,148 @@
+import re
+
+# 导入NumPy要一百多毫秒，第一次真正用到时才由_numpy()导入
+np = None
+_numpy_checked = False
+
+"""
+====================
+     括号预扫描
+====================
+用NumPy一次性对整个源码做向量化分类，得到括号嵌套深度和括号配对表，
+之后跳到匹配的右括号只需查一次表，不必逐个token地读。NumPy是可选依赖，第一次建BracketIndex时才导入。
+
+source: str、bytes或mmap。str里有非ASCII字符时按码点处理，偏移都和lexer一致。
+mask: 可选的bool数组，True的位置(比如注释、字符串)不参与括号统计。
+
+brace_depth[i], paren_depth[i]: 读完位置i之后{}和()各自的嵌套深度，可以为负。
+depth[i]: 把{}和()看作同一种嵌套时的深度。
+match[i]: 位置i上的括号所匹配的括号位置，不是括号或者没有匹配时为-1。
+配对和recovery一样，把{}和()看作同一种嵌套。
+"""
+
+
+def _numpy():
+    """
+    导入NumPy并返回，没有安装时返回None
+    """
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        np, _numpy_checked = numpy, True
+    return np
+
+
+class BracketIndex:
+    def __init__(self, source, mask=None):
+        if _numpy() is None:
+            raise ImportError("BracketIndex requires numpy")
+        data = _code_units(source)
+        lbrace, rbrace = data == ord("{"), data == ord("}")
+        lparen, rparen = data == ord("("), data == ord(")")
+        if mask is not None:
+            keep = ~np.asarray(mask, dtype=bool)
+            lbrace &= keep
+            rbrace &= keep
+            lparen &= keep
+            rparen &= keep
+        self.n = len(data)
+        self.brace_depth = _depth(lbrace, rbrace)
+        self.paren_depth = _depth(lparen, rparen)
+        opens, closes = lbrace | lparen, rbrace | rparen
+        self.depth = _depth(opens, closes)
+        self.match = _match(opens, closes, self.depth)
+        self.rbrace = rbrace
+        return
+
+    def match_of(self, pos: int) -> int:
+        return int(self.match[pos])
+
+    def toplevel_ends(self) -> list[int]:
+        """
+        嵌套深度回到0的每个}之后的位置，也就是顶层类定义可能结束的地方
+        """
+        return (np.flatnonzero(self.rbrace & (self.depth == 0)) + 1).tolist()
+
+    def __len__(self):
+        return self.n
+
+
+def _code_units(source):
+    if isinstance(source, str):
+        if source.isascii():
+            return np.frombuffer(source.encode("ascii"), dtype=np.uint8)
+        return np.frombuffer(source.encode("utf-32-le"), dtype=np.uint32)
+    return np.frombuffer(source, dtype=np.uint8)
+
+
+def _depth(opens, closes):
+    delta = opens.astype(np.int32)
+    delta -= closes
+    return np.cumsum(delta, dtype=np.int32)
+
+
+def _match(opens, closes, depth):
+    """
+    左括号的层号是它之后的深度，右括号的层号是它之前的深度。同一层里的括号按位置排好后
+    一定是左右交替出现的，于是相邻的(左, 右)就是一对。
+    """
+    pos = np.flatnonzero(opens | closes)
+    is_open = opens[pos]
+    level = depth[pos] + ~is_open
+    order = np.lexsort((pos, level))
+    pos, is_open, level = pos[order], is_open[order], level[order]
+    pair = is_open[:-1] & ~is_open[1:] & (level[:-1] == level[1:])
+    left = pos[:-1][pair]
+    right = pos[1:][pair]
+    match = np.full(len(opens), -1, dtype=np.int32)
+    match[left] = right
+    match[right] = left
+    return match
+
+
+_brackets = re.compile(r"[{}()]")
+
+
+def toplevel_ends(source) -> list[int]:
+    """
+    同BracketIndex.toplevel_ends，没有NumPy时逐个括号扫描
+    """
+    if _numpy() is not None:
+        return BracketIndex(source).toplevel_ends()
+    if not isinstance(source, str):
+        source = bytes(source).decode()
+    ends = []
+    depth = 0
+    for m in _brackets.finditer(source):
+        c = m.group()
+        if c == "{" or c == "(":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0 and c == "}":
+                ends.append(m.end())
+    return ends
+
+
+_opens_closes = re.compile(r"([{(])|[})]")
+_byte_opens_closes = re.compile(rb"([{(])|[})]")
+
+
+def match_bracket(source, start: int) -> int:
+    """
+    同BracketIndex.match_of(start)，只从start往后扫描到配对的右括号为止，不需要NumPy。
+    source[start]是左括号，{}和()看作同一种嵌套，没有配对时返回-1
+    """
+    pattern = _opens_closes if isinstance(source, str) else _byte_opens_closes
+    depth = 0
+    for m in pattern.finditer(source, start):
+        if m.lastindex:
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return m.start()
+    return -1
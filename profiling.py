@@ -0,0 +1,188 @@
+import argparse
+import json
+import time
+from collections import Counter
+
+"""
+====================
+       性能剖析
+====================
+Parser(..., profile=Profile())时把这个Parser实例上的parse_*方法、is_method_declaration、
+recover以及它的lexer的next、next_kind换成计时的包装，不传profile时什么都不换，没有任何开销。
+记录的内容：
+rules: 每个方法的调用次数、累计时间(包括它调用的，递归时只算最外层)、自身时间(不包括)，
+       单位纳秒。
+       lexer的调用记在"lexer.next"、"lexer.next_kind"下，恢复记在"recover"下，
+       这样能看出时间是花在词法分析、is_method_declaration的预读、恢复还是某条规则上
+tokens_lexed: lexer一共切出的token数
+tokens_relexed: 其中在set_pos退回之后又切了一遍的(结束位置不超过之前切到过的最远处)
+error_nodes: 按RecoveryPolicy统计的错误结点数
+recoveries, skipped_tokens, skipped_chars: 按策略统计的恢复次数、跳过的token数和字符数，
+       用了prescan时整段跳过的括号里没有切token，只算在字符数里
+stacks: 调用栈 -> 自身时间，collapsed()按flamegraph.pl的折叠格式输出
+一个Profile可以依次给多个Parser使用，结果累加。
+python -m profiling Foo.java [--collapsed out.folded]
+"""
+
+
+class Profile:
+    def __init__(self):
+        self.calls = Counter()
+        self.total = Counter()
+        self.own = Counter()
+        self.stacks = Counter()
+        self.tokens_lexed = 0
+        self.tokens_relexed = 0
+        self.error_nodes = Counter()
+        self.recoveries = Counter()
+        self.skipped_tokens = Counter()
+        self.skipped_chars = Counter()
+        # 正在执行的调用，每项是[名字, 调用栈, 子调用花掉的时间]
+        self.frames = []
+        # 每个名字正在执行的层数，累计时间只在最外层计入
+        self.active = Counter()
+        # lexer切到过的最远位置
+        self.high = -1
+        self.lexing = False
+        self.recovering = None
+        return
+
+    def attach(self, parser):
+        """
+        把parser和它的lexer上要计时的方法换成包装，要在parser读第一个token之前调用
+        """
+        for name in dir(type(parser)):
+            if name.startswith("parse_") or name == "is_method_declaration":
+                setattr(parser, name, self.timed(name, getattr(parser, name)))
+        parser.recover = self.timed("recover", self.recover(parser.recover))
+        parser.error_node = self.error_node(parser.error_node)
+        lexer = parser.lexer
+        self.high = -1
+        lexer.next = self.timed("lexer.next", self.lexed(lexer, lexer.next))
+        lexer.next_kind = self.timed("lexer.next_kind", self.lexed(lexer, lexer.next_kind))
+        return parser
+
+    def timed(self, name: str, method):
+        frames, active = self.frames, self.active
+        clock = time.perf_counter_ns
+
+        def wrapper(*args, **kwargs):
+            stack = f"{frames[-1][1]};{name}" if frames else name
+            frame = [name, stack, 0]
+            frames.append(frame)
+            active[name] += 1
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                frames.pop()
+                if frames:
+                    frames[-1][2] += elapsed
+                active[name] -= 1
+                if not active[name]:
+                    self.total[name] += elapsed
+                self.calls[name] += 1
+                self.own[name] += elapsed - frame[2]
+                self.stacks[stack] += elapsed - frame[2]
+
+        return wrapper
+
+    def lexed(self, lexer, method):
+        """
+        数lexer切出的token。Lexer.next_kind内部会调用next，只算外层的那一次
+        """
+
+        def wrapper():
+            if self.lexing:
+                return method()
+            self.lexing = True
+            try:
+                result = method()
+            finally:
+                self.lexing = False
+            self.tokens_lexed += 1
+            if lexer.end <= self.high:
+                self.tokens_relexed += 1
+            else:
+                self.high = lexer.end
+            if self.recovering is not None and lexer.end > lexer.start:
+                self.recovering.append(lexer.start)
+            return result
+
+        return wrapper
+
+    def recover(self, method):
+        def wrapper(policy):
+            self.recovering = starts = []
+            try:
+                begin, end = method(policy)
+            finally:
+                self.recovering = None
+            self.recoveries[policy.name] += 1
+            self.skipped_tokens[policy.name] += sum(1 for s in set(starts) if begin <= s < end)
+            self.skipped_chars[policy.name] += end - begin
+            return begin, end
+
+        return wrapper
+
+    def error_node(self, method):
+        def wrapper(node, policy, start=None):
+            self.error_nodes[policy.name] += 1
+            return method(node, policy, start)
+
+        return wrapper
+
+    def to_dict(self) -> dict:
+        return {
+            "rules": {
+                name: {
+                    "calls": self.calls[name],
+                    "total_ns": self.total[name],
+                    "self_ns": self.own[name],
+                }
+                for name in sorted(self.calls, key=self.total.__getitem__, reverse=True)
+            },
+            "tokens_lexed": self.tokens_lexed,
+            "tokens_relexed": self.tokens_relexed,
+            "error_nodes": dict(self.error_nodes),
+            "recoveries": dict(self.recoveries),
+            "skipped_tokens": dict(self.skipped_tokens),
+            "skipped_chars": dict(self.skipped_chars),
+        }
+
+    def collapsed(self, unit: int = 1000) -> str:
+        """
+        每行"a;b;c 自身时间"，时间以unit纳秒为单位(默认微秒)，可以直接交给flamegraph.pl
+        """
+        lines = []
+        for stack, elapsed in sorted(self.stacks.items()):
+            if elapsed >= unit:
+                lines.append(f"{stack} {elapsed // unit}")
+        return "\n".join(lines) + "\n"
+
+    def write_collapsed(self, path: str, unit: int = 1000):
+        with open(path, "w") as f:
+            f.write(self.collapsed(unit))
+
+
+def main():
+    from diagnostics import Diagnostics
+    from lexer import RegexLexer
+    from parser import Parser
+
+    arg_parser = argparse.ArgumentParser(prog="python -m profiling", description="profile a parse")
+    arg_parser.add_argument("path")
+    arg_parser.add_argument("--collapsed", metavar="PATH", help="write collapsed stacks for flamegraph.pl")
+    args = arg_parser.parse_args()
+    with open(args.path, encoding="utf-8") as f:
+        source = f.read()
+    profile = Profile()
+    Parser(source, RegexLexer, diagnostics=Diagnostics.discard(), profile=profile).parse_compilation_unit()
+    print(json.dumps(profile.to_dict(), indent=2))
+    if args.collapsed:
+        profile.write_collapsed(args.collapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,12 @@
 from lexer import Lexer
-from tokens import Token
+from grammar import tables
+from tokens import *
 from enum import Enum, unique
 
 """
 在parse的不同阶段应使用不同的错误恢复策略，以寻找各种不同的恐慌恢复停止位置。
-现在大致分为这四类阶段，比如说在顶层我们遇到package, public, protected, 
-private, class这些可能为一个类的开头的元素才停止。而在表达式层我们可能遇到
-+, -等等运算符号就要停止，因为遇到它时一个表达式一定已经结束了。
+现在分为顶层、类成员和语句三类阶段，比如说在顶层我们遇到public, protected,
+private, class这些可能为一个类的开头的元素才停止。表达式里的错误由所在的语句恢复。
 """
 
 
@@ -15,23 +15,127 @@ class RecoveryPolicy(Enum):
     find_toplevel_border = 0
     find_class_member_border = 1
     find_statement_border = 2
-    find_expression_border = 3
 
 
 """
-对lexer应用recovery，使其解析位置直接跳转到右界，并返回所有被跳过的token。
-lexer: 要执行恢复的词法分析器
+各策略的同步点，按token种类编号预先算成动作表：
+skip: 跳过；stop: 停在它前面，不吃掉；take: 吃掉它再停；open/close: 括号，调整嵌套深度；
+follow: 已经跳过了东西才停在它前面，否则它就是出错的那个token，跳过。
+同步点只在嵌套深度为0时生效，深度大于0时括号里的内容整体跳过。
+close_stops: 深度回到0的那个右括号是否结束恢复(成员和语句遇到完整的{...}就结束了)。
+
+stop由grammar算出的FOLLOW集得出：每种策略对应一个非终结符，恢复停在它后面可能跟着的
+token前面，其中不能开始这个结构本身的(比如语句后面的else)是follow。
+能开始一个表达式的token(ID、字面量)在出错的代码里太常见，不作同步点；
+括号由嵌套深度处理，FOLLOW里的右括号就是深度为0时要停下的多余右括号。
+take和close_stops说的是这个结构本身怎么结束，仍然手工给出。
+"""
+_skip, _stop, _take, _open, _close, _follow = range(6)
+_openers = frozenset({LBRACE, LPAREN})
+_closers = frozenset({RBRACE, RPAREN})
+
+
+def _sync(stop, take, stop_closers, close_stops: bool, follow=()):
+    """
+    stop_closers: 深度为0时遇到的多余右括号，在这里面就停在它前面，否则当作普通token跳过
+    """
+    actions = [_skip] * len(kind_names)
+    for kind in follow:
+        actions[kind] = _follow
+    for kind in stop:
+        actions[kind] = _stop
+    for kind in take:
+        actions[kind] = _take
+    for kind in _openers:
+        actions[kind] = _open
+    for kind in _closers:
+        actions[kind] = _close
+    return actions, frozenset(stop_closers), close_stops
+
+
+def _follow_sync(nonterminal: str, take, close_stops: bool):
+    follow = tables.follow_of(nonterminal) - tables.first_of("Expression") - {EOS}
+    stop = follow - _openers - _closers
+    only_follow = stop - tables.first_of(nonterminal)
+    return _sync(stop - only_follow, take, follow & _closers, close_stops, only_follow)
+
+
+sync_tables = {
+    RecoveryPolicy.find_toplevel_border: _follow_sync("ClassDecl", [], False),
+    RecoveryPolicy.find_class_member_border: _follow_sync("ClassMember", [SEMI], True),
+    RecoveryPolicy.find_statement_border: _follow_sync("Statement", [SEMI], True),
+}
+
+"""
+对lexer应用recovery，使其解析位置直接跳转到右界，并返回被跳过的区间[start, end)。
+lexer: 要执行恢复的词法分析器，从它当前的位置开始跳过
 policy: 要选择的恢复策略
-还没写好
+skip_first: 第一个token即使是同步点也跳过，用来保证调用方没有前进时恢复也一定前进
+brackets: 可选的prescan.BracketIndex，有它时遇到左括号直接跳到匹配的右括号之后，
+          lexer还需要有skip_to
+只按token种类编号跳过，不创建Token对象。lexer需要有next_kind、set_pos、ptr、start、end，
+停在某个token前面时用set_pos把它退回去。什么都没跳过时返回的区间长度为0。
 """
 
 
-def recovery(lexer: Lexer, policy: RecoveryPolicy) -> list[Token]:
-    return []
+def recovery(
+    lexer: Lexer, policy: RecoveryPolicy, skip_first: bool = False, brackets=None
+) -> tuple[int, int]:
+    actions, stop_closers, close_stops = sync_tables[policy]
+    next_kind = lexer.next_kind
+    match = brackets.match if brackets is not None else None
+    begin = end = -1
+    depth = 0
+    while True:
+        pos = lexer.ptr
+        kind = next_kind()
+        if kind == EOS:
+            break
+        action = actions[kind]
+        if depth == 0 and not skip_first:
+            if (
+                action == _stop
+                or (action == _follow and begin >= 0)
+                or (action == _close and kind in stop_closers)
+            ):
+                lexer.set_pos(pos)
+                break
+        skip_first = False
+        if begin < 0:
+            begin = lexer.start
+        end = lexer.end
+        if action == _open:
+            if depth == 0 and match is not None:
+                close = match[lexer.start]
+                if close >= 0:
+                    end = int(close) + 1
+                    lexer.skip_to(end)
+                    if close_stops:
+                        break
+                    continue
+            depth += 1
+        elif action == _close:
+            if depth > 0:
+                depth -= 1
+                if depth == 0 and close_stops:
+                    break
+        elif action == _take and depth == 0:
+            break
+    if begin < 0:
+        begin = end = lexer.start
+    return begin, end
+
+
+"""
+语法错误
+token: 期望得到的token
+span: 出错token在源码中的区间[start, end)，未知时为None
+"""
 
 
 class SyntaxError(Exception):
-    def __init__(self, message: str, token: Token):
+    def __init__(self, message: str, token: Token, span: tuple[int, int] = None):
         super().__init__(message)
         self.token = token
         self.message = message
+        self.span = span
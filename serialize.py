@@ -0,0 +1,310 @@
+import mmap
+from operator import attrgetter
+
+from Tree import *
+from arena import node_classes
+
+"""
+====================
+   二进制序列化
+====================
+把Tree.py中的树编码成紧凑的字节串，比pickle小，也不依赖类的定义方式。
+
+格式(FORMAT_VERSION = 1)：
+文件头: b"FPT" + 版本号字节
+之后是一个值。每个值以一个标记字节开头：
+  0 None, 1 False, 2 True
+  3 整数，后面是zigzag编码的varint
+  4 新字符串，后面是varint长度和UTF-8字节，按出现顺序编号加入字符串表
+  5 字符串表里的第varint个字符串，重复的标识符只存一次
+  6 list，后面是varint个数和各个元素
+  16以上是结点：16 + (kind << 2 | 错误结点 << 1 | 有span)，kind是arena.node_classes里的编号，
+  有span时接着是起点和长度两个varint，错误结点再接着info的起点和长度，
+  然后按Tree.schemas的顺序是构造函数的各个参数
+CompilationUnit.source不编码。
+
+dumps/loads处理单棵树；dump把一棵树作为一条记录(varint长度 + 内容)追加到文件，
+iter_load逐条读出，不需要把整个文件读进内存。loads可以直接接受memoryview或mmap，
+只在解码字符串时复制对应的那几个字节；load_file用mmap打开文件再解码。
+编码和解码都用显式栈，不受递归深度限制。
+"""
+
+FORMAT_VERSION = 1
+MAGIC = b"FPT"
+HEADER = MAGIC + bytes([FORMAT_VERSION])
+
+_NONE, _FALSE, _TRUE, _INT, _STR, _REF, _LIST = range(7)
+_NODE = 16
+_kind_of = {cls: kind for kind, cls in enumerate(node_classes)}
+# 还没解析的方法体写出时先解析，读回来是普通的Block
+_kind_of[LazyBlock] = _kind_of[Block]
+_arg_names = [[name for name, _ in schemas[cls]] for cls in node_classes]
+_arities = [len(names) for names in _arg_names]
+
+
+def _reversed_getter(names: list[str]):
+    """
+    按逆序取出结点的各个构造参数，总是返回tuple，Encoder直接把结果压栈
+    """
+    if len(names) > 1:
+        return attrgetter(*reversed(names))
+    if names:
+        name = names[0]
+        return lambda node: (getattr(node, name),)
+    return lambda node: ()
+
+
+_reversed_args = [_reversed_getter(names) for names in _arg_names]
+
+
+class Encoder:
+    def __init__(self):
+        self.out = bytearray(HEADER)
+        self.strings: dict[str, int] = {}
+        return
+
+    def varint(self, value: int):
+        out = self.out
+        while value >= 0x80:
+            out.append(value & 0x7F | 0x80)
+            value >>= 7
+        out.append(value)
+
+    def value(self, value):
+        # 和Tree.walk一样用显式栈，不受递归深度限制。格式是先序的，
+        # 出栈一个值就写一个值，结点和list的内容逆序入栈，保证按原来的顺序写出
+        out = self.out
+        strings = self.strings
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            if value is None:
+                out.append(_NONE)
+            elif value is True:
+                out.append(_TRUE)
+            elif value is False:
+                out.append(_FALSE)
+            elif isinstance(value, Tree):
+                stack.extend(_reversed_args[self.node(value)](value))
+            elif isinstance(value, str):
+                index = strings.get(value)
+                if index is not None:
+                    out.append(_REF)
+                    self.varint(index)
+                else:
+                    strings[value] = len(strings)
+                    data = value.encode("utf-8")
+                    out.append(_STR)
+                    self.varint(len(data))
+                    out += data
+            elif isinstance(value, int):
+                out.append(_INT)
+                self.varint(value << 1 if value >= 0 else (-value << 1) - 1)
+            elif isinstance(value, list):
+                out.append(_LIST)
+                self.varint(len(value))
+                stack.extend(reversed(value))
+            else:
+                raise TypeError(f"cannot serialize {type(value).__name__}")
+
+    def node(self, node: Tree) -> int:
+        """
+        写出结点的标记、区间和错误信息，返回kind，构造函数的参数由value接着写
+        """
+        kind = _kind_of[type(node)]
+        span = node.span
+        error = not node.is_normal_node
+        self.out.append(_NODE + (kind << 2 | error << 1 | (span is not None)))
+        if span is not None:
+            self.varint(span[0])
+            self.varint(span[1] - span[0])
+        if error:
+            self.varint(node.info[0])
+            self.varint(node.info[1] - node.info[0])
+        return kind
+
+
+class Decoder:
+    def __init__(self, data):
+        """
+        data: bytes、bytearray、memoryview或mmap，不复制
+        """
+        self.data = memoryview(data).cast("B") if not isinstance(data, bytes) else data
+        if bytes(self.data[:3]) != MAGIC:
+            raise ValueError("not a serialized tree")
+        if self.data[3] != FORMAT_VERSION:
+            raise ValueError(f"unsupported format version {self.data[3]}")
+        self.pos = len(HEADER)
+        self.strings: list[str] = []
+        return
+
+    def varint(self) -> int:
+        data, pos = self.data, self.pos
+        byte = data[pos]
+        pos += 1
+        if byte < 0x80:
+            self.pos = pos
+            return byte
+        result, shift = byte & 0x7F, 7
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                self.pos = pos
+                return result
+            shift += 7
+
+    def value(self):
+        # 用显式栈，不受递归深度限制。栈里是还没读完的结点和list：
+        # [已读出的元素, 总个数, kind(list为-1), span, info]，读完一个值就交给栈顶，
+        # 栈顶凑齐了就建出结点或list，再作为一个值交给下一层
+        data = self.data
+        strings = self.strings
+        stack = []
+        while True:
+            tag = data[self.pos]
+            self.pos += 1
+            if tag >= _NODE:
+                bits = tag - _NODE
+                span, info = self.header(bits)
+                kind = bits >> 2
+                arity = _arities[kind]
+                if arity:
+                    stack.append([[], arity, kind, span, info])
+                    continue
+                value = self.build(kind, (), span, info)
+            elif tag == _REF:
+                value = strings[self.varint()]
+            elif tag == _STR:
+                size = self.varint()
+                start = self.pos
+                self.pos = start + size
+                value = str(data[start:self.pos], "utf-8")
+                strings.append(value)
+            elif tag == _NONE:
+                value = None
+            elif tag == _LIST:
+                size = self.varint()
+                if size:
+                    stack.append([[], size, -1, None, None])
+                    continue
+                value = []
+            elif tag == _INT:
+                value = self.varint()
+                value = value >> 1 if not value & 1 else -((value + 1) >> 1)
+            elif tag == _TRUE:
+                value = True
+            elif tag == _FALSE:
+                value = False
+            else:
+                raise ValueError(f"bad tag {tag} at offset {self.pos - 1}")
+            while stack:
+                frame = stack[-1]
+                items = frame[0]
+                items.append(value)
+                if len(items) < frame[1]:
+                    break
+                stack.pop()
+                value = items if frame[2] < 0 else self.build(frame[2], items, frame[3], frame[4])
+            else:
+                return value
+
+    def header(self, bits: int):
+        """
+        读结点的区间和错误信息
+        """
+        # 区间的varint大多只有一两个字节，在这里直接读，不调用varint
+        data, pos = self.data, self.pos
+        span = info = None
+        if bits & 1:
+            start = data[pos]
+            if start < 0x80:
+                pos += 1
+            else:
+                self.pos = pos
+                start = self.varint()
+                pos = self.pos
+            size = data[pos]
+            if size < 0x80:
+                self.pos = pos + 1
+            else:
+                self.pos = pos
+                size = self.varint()
+            span = (start, start + size)
+        else:
+            self.pos = pos
+        if bits & 2:
+            start = self.varint()
+            info = (start, start + self.varint())
+        return span, info
+
+    @staticmethod
+    def build(kind: int, args, span, info) -> Tree:
+        node = node_classes[kind](*args)
+        node.span = span
+        if info is not None:
+            node.is_normal_node = False
+            node.info = info
+        return node
+
+
+def dumps(node: Tree) -> bytes:
+    encoder = Encoder()
+    encoder.value(node)
+    return bytes(encoder.out)
+
+
+def loads(data) -> Tree:
+    decoder = Decoder(data)
+    node = decoder.value()
+    if decoder.pos != len(decoder.data):
+        raise ValueError("trailing data after serialized tree")
+    return node
+
+
+def dump(node: Tree, file):
+    """
+    作为一条记录追加写到二进制文件file
+    """
+    data = dumps(node)
+    header = Encoder()
+    header.out.clear()
+    header.varint(len(data))
+    file.write(header.out)
+    file.write(data)
+
+
+def iter_load(file):
+    """
+    逐条读出dump写入的树
+    """
+    while True:
+        size, shift = 0, 0
+        while True:
+            byte = file.read(1)
+            if not byte:
+                if shift:
+                    raise ValueError("truncated record header")
+                return
+            size |= (byte[0] & 0x7F) << shift
+            shift += 7
+            if byte[0] < 0x80:
+                break
+        data = file.read(size)
+        if len(data) != size:
+            raise ValueError("truncated record")
+        yield loads(data)
+
+
+def load_file(path: str) -> Tree:
+    """
+    用mmap打开dumps写出的文件直接解码
+    """
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            view = memoryview(data)
+            try:
+                return loads(view)
+            finally:
+                view.release()
@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Tree import to_dict, walk
+from diagnostics import Diagnostics
+from lexer import RegexLexer
+from parser import Parser
+
+"""
+====================
+     常驻解析服务
+====================
+每个文件都起一个新的Python进程时，解释器启动和import比解析本身还慢。
+服务进程一直保持解析器已加载，在Unix域套接字上接受请求，每个连接一个线程，
+可以在同一个连接上连续发多个请求。解析交给进程池(workers > 1)或者直接在线程里做。
+
+协议：每条消息是4字节大端长度加上这么长的UTF-8 JSON。
+请求：{"text": 源码} 或 {"path": 文件路径}，可选"tree": true附带序列化的语法树，
+      {"op": "ping"}检查服务是否在线
+响应：path/errors/error_nodes/seconds，diagnostics是[{code, span, message}]，
+      加tree时还有tree；请求有问题、读文件失败或者解析时出了异常时只有failure，
+      连接可以继续使用
+
+python -m server serve --socket /tmp/fuzzyparser.sock -j 4
+python -m server parse --socket /tmp/fuzzyparser.sock A.java B.java [--tree]
+"""
+
+HEADER = struct.Struct(">I")
+MAX_MESSAGE = 1 << 28
+
+
+def send_message(sock: socket.socket, message: dict):
+    data = json.dumps(message).encode("utf-8")
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise EOFError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock: socket.socket) -> dict:
+    (size,) = HEADER.unpack(recv_exactly(sock, HEADER.size))
+    if size > MAX_MESSAGE:
+        raise ValueError(f"message of {size} bytes is too large")
+    return json.loads(recv_exactly(sock, size).decode("utf-8"))
+
+
+def parse_request(request: dict) -> dict:
+    """
+    处理一个解析请求，在工作进程里执行
+    """
+    start = time.perf_counter()
+    path = request.get("path")
+    source = request.get("text")
+    if not isinstance(path, (str, type(None))) or not isinstance(source, (str, type(None))):
+        return {"failure": "'text' and 'path' must be strings"}
+    if source is None:
+        if path is None:
+            return {"failure": "request needs 'text' or 'path'"}
+        try:
+            with open(path, encoding="utf-8") as f:
+                source = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            return {"path": path, "failure": str(e)}
+
+    parser = Parser(source, RegexLexer, diagnostics=Diagnostics())
+    unit = parser.parse_compilation_unit()
+    result = {
+        "path": path,
+        "errors": parser.errors,
+        "error_nodes": sum(not node.is_normal_node for node in walk(unit)),
+        "diagnostics": [
+            {"code": d.code.name, "span": list(d.span), "message": d.message}
+            for d in parser.diagnostics
+        ],
+        "seconds": time.perf_counter() - start,
+    }
+    if request.get("tree"):
+        result["tree"] = to_dict(unit)
+    return result
+
+
+class Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request = recv_message(self.request)
+            except EOFError:
+                return
+            except ValueError as e:
+                send_message(self.request, {"failure": str(e)})
+                return
+            send_message(self.request, self.server.dispatch(request))
+
+
+class ParseServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, workers: int = 1):
+        """
+        path: 套接字文件，已经存在的套接字(比如上次没有正常退出留下的)先删掉，
+              存在的不是套接字时抛FileExistsError
+        workers: 解析进程数，为1时直接在处理连接的线程里解析
+        """
+        if os.path.lexists(path):
+            if not stat.S_ISSOCK(os.lstat(path).st_mode):
+                raise FileExistsError(f"{path} exists and is not a socket")
+            os.unlink(path)
+        super().__init__(path, Handler)
+        self.path = path
+        # 自己建的套接字文件，关闭时只删它，不删别人后来放在同一路径上的文件
+        self.socket_id = _file_id(path)
+        self.executor = ProcessPoolExecutor(workers) if workers > 1 else None
+        return
+
+    def dispatch(self, request) -> dict:
+        if not isinstance(request, dict):
+            return {"failure": "request must be a JSON object"}
+        if request.get("op") == "ping":
+            return {"pong": True}
+        try:
+            if self.executor is None:
+                return parse_request(request)
+            return self.executor.submit(parse_request, request).result()
+        except Exception as e:
+            return {"path": request.get("path"), "failure": f"{type(e).__name__}: {e}"}
+
+    def server_close(self):
+        super().server_close()
+        if self.executor is not None:
+            self.executor.shutdown()
+        if _file_id(self.path) == self.socket_id:
+            os.unlink(self.path)
+
+
+def _file_id(path: str):
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return None
+    if not stat.S_ISSOCK(st.st_mode):
+        return None
+    return st.st_dev, st.st_ino
+
+
+class Client:
+    """
+    连接到ParseServer，一个连接可以连续发请求，不能在多个线程里同时用
+    """
+
+    def __init__(self, path: str):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        return
+
+    def request(self, message: dict) -> dict:
+        send_message(self.sock, message)
+        return recv_message(self.sock)
+
+    def parse_text(self, text: str, tree: bool = False) -> dict:
+        return self.request({"text": text, "tree": tree})
+
+    def parse_path(self, path: str, tree: bool = False) -> dict:
+        return self.request({"path": os.path.abspath(path), "tree": tree})
+
+    def ping(self) -> bool:
+        return self.request({"op": "ping"}).get("pong", False)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="python -m server", description="warm parse server")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve")
+    serve.add_argument("--socket", required=True)
+    serve.add_argument("-j", "--workers", type=int, default=1)
+    parse = commands.add_parser("parse")
+    parse.add_argument("--socket", required=True)
+    parse.add_argument("paths", nargs="+")
+    parse.add_argument("--tree", action="store_true", help="include the serialized tree")
+    args = arg_parser.parse_args(argv)
+
+    if args.command == "serve":
+        with ParseServer(args.socket, args.workers) as server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        return
+    with Client(args.socket) as client:
+        for path in args.paths:
+            sys.stdout.write(json.dumps(client.parse_path(path, args.tree)) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import functools
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import incremental
+import serialize
+from Tree import LazyBlock, MethodDecl, to_dict, walk
+from lexer import Lexer, RegexLexer
+from parallel import parse_parallel
+from parser import Parser
+from tokenstream import TokenStream
+from benchmark.corpus import generate
+
+"""
+====================
+     等价性测试
+====================
+各种解析方式和逐字符Lexer上的递归下降解析得到的树(to_dict，含span和错误区间)和诊断
+应当完全一样。语料固定：corpus生成的程序(有的注入了错误)，加上对一个正确程序随机
+增删替换token得到的变体，种子都是固定的。
+"""
+
+# 变异时插入或替换的token
+PIECES = ["{", "}", "(", ")", ";", "=", "int", "x", "if", "else", "class", "public", "void", "12", "true"]
+# 增量重解析时插入的文本
+INSERTS = PIECES + [" ", "\n", "y = 1;", "int z;", "{ }", "a"]
+
+
+def mutate(source: str, rng: random.Random) -> str:
+    words = source.split(" ")
+    for _ in range(rng.randint(1, 8)):
+        i = rng.randrange(len(words))
+        r = rng.random()
+        if r < 0.4:
+            del words[i]
+        elif r < 0.8:
+            words.insert(i, rng.choice(PIECES))
+        else:
+            words[i] = rng.choice(PIECES)
+    return " ".join(words)
+
+
+def make_corpus() -> list[str]:
+    sources = []
+    for seed in range(8):
+        for errors in (0.0, 0.05, 0.2):
+            sources.append(generate(3, seed=seed, depth=4, errors=errors))
+    rng = random.Random(0)
+    base = generate(3, seed=100, depth=3)
+    sources.extend(mutate(base, rng) for _ in range(60))
+    return sources
+
+
+SOURCES = make_corpus()
+CLEAN = [generate(3, seed=seed, depth=4) for seed in range(8)]
+
+
+def snapshot(parser: Parser, unit) -> tuple:
+    diagnostics = [(d.code, d.span, str(d.expected), d.detail) for d in parser.diagnostics]
+    return to_dict(unit), diagnostics
+
+
+def parse(source: str, lexer_cls=RegexLexer, **options) -> tuple:
+    parser = Parser(source, lexer_cls, **options)
+    return snapshot(parser, parser.parse_compilation_unit())
+
+
+@functools.lru_cache(maxsize=None)
+def reference(index: int) -> tuple:
+    return parse(SOURCES[index], Lexer)
+
+
+@pytest.mark.parametrize("lexer_cls", [RegexLexer, TokenStream])
+def test_lexers_agree(lexer_cls):
+    for index, source in enumerate(SOURCES):
+        assert parse(source, lexer_cls) == reference(index), index
+
+
+def test_parallel_matches_serial():
+    """
+    parse_parallel不给出诊断，只比较树
+    """
+    with ProcessPoolExecutor(2) as executor:
+        for index, source in enumerate(SOURCES):
+            assert to_dict(parse_parallel(source, executor=executor)) == reference(index)[0], index
+
+
+def test_incremental_matches_full():
+    rng = random.Random(9)
+    reused = edits = 0
+    for index, source in enumerate(CLEAN + SOURCES[1::12]):
+        unit = incremental.parse(source)
+        for _ in range(30):
+            offset = rng.randrange(len(source) + 1)
+            removed = min(rng.choice([0, 0, 1, 2, 5]), len(source) - offset)
+            inserted = rng.choice(INSERTS) if rng.random() < 0.7 else ""
+            edit = (offset, removed, inserted)
+            source = source[:offset] + inserted + source[offset + removed:]
+            result = incremental.reparse(unit, edit)
+            assert to_dict(result) == to_dict(incremental.parse(source)), (index, edit)
+            reused += result is unit
+            edits += 1
+            unit = result
+    # 大部分编辑应当只重解析了一棵子树
+    assert reused > edits // 2
+
+
+@pytest.mark.parametrize("lexer_cls", [Lexer, RegexLexer])
+def test_without_exceptions(lexer_cls):
+    for index, source in enumerate(SOURCES):
+        assert parse(source, lexer_cls, exceptions=False) == reference(index), index
+
+
+@pytest.mark.parametrize("exceptions", [True, False])
+def test_explicit_stack(exceptions):
+    for index, source in enumerate(SOURCES):
+        result = parse(source, Lexer, exceptions=exceptions, explicit_stack=True)
+        assert result == reference(index), index
+
+
+def test_explicit_stack_deep_nesting():
+    depth = 20000
+    body = "if (x) " * depth + "{" * depth + "x = 1;" + "}" * depth
+    source = "class A { void m() { " + body + " } }"
+    # 递归解析嵌套太深时不能把RecursionError当成语法错误
+    with pytest.raises(RecursionError):
+        Parser(source, RegexLexer).parse_compilation_unit()
+    parser = Parser(source, RegexLexer, explicit_stack=True)
+    unit = parser.parse_compilation_unit()
+    assert parser.errors == 0
+    node = unit.defs[0].defs[0].body.defs[0]
+    for _ in range(depth):
+        node = node.then_part
+    for _ in range(depth - 1):
+        node = node.defs[0]
+    assert node.defs[0].rhs.value == 1
+
+
+def test_serialize_deep_nesting():
+    depth = 20000
+    source = "class A { void m() { " + "{" * depth + "x = 1;" + "}" * depth + " } }"
+    parser = Parser(source, RegexLexer, explicit_stack=True)
+    unit = parser.parse_compilation_unit()
+    data = serialize.dumps(unit)
+    loaded = serialize.loads(data)
+    # 嵌套这么深的dict、list不能直接用==比较(比较本身是递归的)，这里比较再编码的结果
+    assert serialize.dumps(loaded) == data
+    node = loaded.defs[0].defs[0].body
+    for _ in range(depth + 1):
+        assert node.span is not None
+        node = node.defs[0]
+    assert node.rhs.value == 1
+    value = to_dict(loaded)["defs"][0]["defs"][0]["body"]
+    for _ in range(depth + 1):
+        value = value["defs"][0]
+    assert value == to_dict(node)
+
+
+@pytest.mark.parametrize(
+    "lexer_cls, options",
+    [(Lexer, {}), (RegexLexer, {}), (TokenStream, {}), (RegexLexer, {"prescan": True, "explicit_stack": True})],
+)
+def test_outline_matches_full_parse(lexer_cls, options):
+    for index, source in enumerate(CLEAN):
+        parser = Parser(source, lexer_cls, outline=True, **options)
+        unit = parser.parse_compilation_unit()
+        # 不能用walk找方法：遍历会解析方法体
+        methods = [node for decl in unit.defs for node in decl.defs if isinstance(node, MethodDecl)]
+        assert any(type(method.body) is LazyBlock for method in methods), index
+        assert snapshot(parser, unit) == parse(source, Lexer), index
+        assert not any(type(method.body) is LazyBlock for method in methods), index
+
+
+def test_outline_after_close(tmp_path):
+    path = tmp_path / "A.java"
+    path.write_bytes(CLEAN[0].encode())
+    with Parser.from_file(str(path), "mmap", outline=True) as parser:
+        unit = parser.parse_compilation_unit()
+        methods = [node for decl in unit.defs for node in decl.defs if isinstance(node, MethodDecl)]
+        loaded = to_dict(methods[0].body)
+    assert len(methods) > 1
+    assert to_dict(methods[0].body) == loaded
+    with pytest.raises(ValueError, match="closed"):
+        methods[1].body.defs
+    assert type(methods[1].body) is LazyBlock
+
+
+def test_outline_bodies_with_errors():
+    """
+    有错误时方法体的范围以括号配对为准，可能和完整解析不同；
+    但区间相同的方法，方法体一定和完整解析的一样
+    """
+    compared = 0
+    for index, source in enumerate(SOURCES):
+        full = Parser(source, RegexLexer).parse_compilation_unit()
+        outline = Parser(source, RegexLexer, outline=True).parse_compilation_unit()
+        bodies = {
+            node.span: to_dict(node.body) for node in walk(full) if isinstance(node, MethodDecl)
+        }
+        for node in walk(outline):
+            if isinstance(node, MethodDecl) and node.span in bodies:
+                assert to_dict(node.body) == bodies[node.span], (index, node.span)
+                compared += 1
+    assert compared > 100
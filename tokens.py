@@ -1,11 +1,63 @@
+from enum import IntEnum
+
+"""
+token种类的整数编号。解析器和lexer按编号比较和查表，名字(kind.name)留给诊断信息用。
+编号也是TokenStream、错误恢复动作表等紧凑结构里的下标，不要改动已有成员的顺序。
+"""
+
+
+class TokenKind(IntEnum):
+    EOS = 0
+    ERROR = 1
+    ID = 2
+    INT_LITERAL = 3
+    BOOL_LITERAL = 4
+    PACKAGE = 5
+    CLASS = 6
+    SEMI = 7
+    PUBLIC = 8
+    PROTECTED = 9
+    PRIVATE = 10
+    LBRACE = 11
+    RBRACE = 12
+    EQ = 13
+    VOID = 14
+    IF = 15
+    LPAREN = 16
+    RPAREN = 17
+    ELSE = 18
+    TRUE = 19
+    FALSE = 20
+    INT = 21
+    BOOLEAN = 22
+    # 语法里有，lexer还不认识，不会出现在token流里
+    EXTENDS = 23
+    COMMA = 24
+
+
+# 热路径里直接用这些模块级的整数，TokenKind.X每次都要经过枚举类的属性查找，慢好几倍
+(
+    EOS, ERROR, ID, INT_LITERAL, BOOL_LITERAL, PACKAGE, CLASS, SEMI, PUBLIC, PROTECTED,
+    PRIVATE, LBRACE, RBRACE, EQ, VOID, IF, LPAREN, RPAREN, ELSE, TRUE, FALSE, INT, BOOLEAN,
+    EXTENDS, COMMA,
+) = map(int, TokenKind)
+
+# token的类别
+MODIFIERS = frozenset({PUBLIC, PROTECTED, PRIVATE})
+VAR_TYPES = frozenset({INT, BOOLEAN})
+BOOL_LITERALS = frozenset({TRUE, FALSE})
+
+
 # token is terminal
 """
 直接用就行
+kind: token种类的整数编号，不给出时按name查
 """
 class Token:
-    def __init__(self, name, content):
+    def __init__(self, name, content, kind=None):
         self.name = name
         self.content = content
+        self.kind = TokenKind[name].value if kind is None else kind
         return
 
     def get_content(self):
@@ -42,3 +94,14 @@ test_terminal_bool_literal = Token("BOOL_LITERAL", "true")
 # like any error tokens
 test_terminal_illegal_token = Token("ERROR", "error_token")
 eof = shared_str_to_terminal["end_of_stream"]
+
+"""
+kind_names[k]是编号k对应的token名，token_kind反过来由名字查编号。
+"""
+kind_names = [kind.name for kind in TokenKind]
+token_kind = {kind.name: kind.value for kind in TokenKind}
+# 除ID、INT_LITERAL外每种token都有唯一的共享实例
+kind_tokens = [None] * len(kind_names)
+for token in shared_str_to_terminal.values():
+    kind_tokens[token_kind[token.name]] = token
+kind_tokens[token_kind["ERROR"]] = test_terminal_illegal_token
@@ -0,0 +1,95 @@
+from array import array
+from bisect import bisect_left
+
+from lexer import LineIndex, RegexLexer
+from tokens import *
+
+"""
+====================
+     紧凑token流
+====================
+一次把整个源码切成token，只用三个平行的array('i')保存种类编号、起始偏移和结束偏移，
+Token对象在被取用时才临时构造，ID和INT_LITERAL的内容从源码切片得到。
+最后一项总是EOS。
+
+它同时实现了Lexer的接口(next, set_pos, ptr, start, end)，可以直接作为
+Parser的lexer_cls使用，这时ptr是token下标而不是字符偏移。
+"""
+
+
+class TokenStream:
+    def __init__(self, source: str, lexer_cls=RegexLexer):
+        self.stream = source
+        self.kinds = array("i")
+        self.starts = array("i")
+        self.ends = array("i")
+        self.lines = LineIndex(source)
+        self.ptr = 0
+        self.start = self.end = 0
+        self.tokenize(lexer_cls(source))
+        return
+
+    def tokenize(self, lexer):
+        kinds, starts, ends = self.kinds, self.starts, self.ends
+        next_kind = getattr(lexer, "next_kind", None)
+        while True:
+            if next_kind is not None:
+                kind = next_kind()
+            else:
+                kind = token_kind[lexer.next().name]
+            kinds.append(kind)
+            starts.append(lexer.start)
+            ends.append(lexer.end)
+            # 源码里的end_of_stream同样会让Lexer停下
+            if kind == EOS:
+                return
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index: int) -> Token:
+        kind = self.kinds[index]
+        token = kind_tokens[kind]
+        if token is not None:
+            return token
+        text = self.stream[self.starts[index]:self.ends[index]]
+        if kind == INT_LITERAL:
+            return Token("INT_LITERAL", int(text), INT_LITERAL)
+        return Token(kind_names[kind], text, kind)
+
+    def span(self, index: int) -> tuple[int, int]:
+        return self.starts[index], self.ends[index]
+
+    def line_col(self, offset: int) -> tuple[int, int]:
+        return self.lines.line_col(offset)
+
+    def next(self) -> Token:
+        index = self.ptr
+        if index < len(self.kinds) - 1:
+            self.ptr += 1
+        else:
+            index = len(self.kinds) - 1
+        self.start = self.starts[index]
+        self.end = self.ends[index]
+        return self[index]
+
+    def next_kind(self) -> int:
+        index = self.ptr
+        if index < len(self.kinds) - 1:
+            self.ptr += 1
+        else:
+            index = len(self.kinds) - 1
+        self.start = self.starts[index]
+        self.end = self.ends[index]
+        return self.kinds[index]
+
+    def set_pos(self, pos: int):
+        if pos < len(self.kinds):
+            self.ptr = pos
+
+    def skip_to(self, offset: int):
+        """
+        跳到第一个从字符偏移offset及之后开始的token
+        """
+        self.ptr = min(bisect_left(self.starts, offset), len(self.kinds) - 1)
+
@@ -0,0 +1,173 @@
+import heapq
+
+from Tree import *
+from arena import FlatTree, _kind_of, node_classes
+
+"""
+====================
+     访问者框架
+====================
+遍历都用显式栈，很深的if/块嵌套也不会RecursionError。
+子结点的查找和先序遍历用Tree里的child_slots、iter_children和walk(可以prune)。
+
+Visitor: 子类定义enter_<类名>/leave_<类名>，找不到时依次找父类的(比如enter_Statement)，
+         最后是enter/leave。查找结果按(访问者类, 结点类)缓存。
+         enter返回SKIP时不进入这个结点的子结点，leave照常调用。
+Transformer: leave的返回值替换原结点，返回None时从list里删掉或者把字段置为None。
+         visit返回(可能被替换了的)根结点。
+TreeIndex: 走一遍建立按类和错误结点的索引，之后找某一类结点不用再遍历整棵树。
+find / error_nodes: 有索引时直接查索引；FlatTree按kinds数组在C层面扫描；
+         否则遍历，prune可以跳过不需要的子树。
+"""
+
+SKIP = object()
+
+
+class Visitor:
+    _dispatch: dict = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = {}
+
+    def hooks(self, cls: type):
+        """
+        结点类cls对应的(enter, leave)方法，按继承关系查找后缓存
+        """
+        hooks = self._dispatch.get(cls)
+        if hooks is None:
+            hooks = self._dispatch[cls] = (self._find("enter", cls), self._find("leave", cls))
+        return hooks
+
+    @classmethod
+    def _find(cls, prefix: str, node_class: type):
+        for base in node_class.__mro__:
+            method = getattr(cls, f"{prefix}_{base.__name__}", None)
+            if method is not None:
+                return method
+        return getattr(cls, prefix)
+
+    def enter(self, node: Tree):
+        return None
+
+    def leave(self, node: Tree):
+        return node
+
+    def visit(self, root: Tree):
+        hooks = self.hooks
+        # leaving为True的项表示子结点已经处理完，该调用leave了
+        stack = [(root, False)]
+        while stack:
+            node, leaving = stack.pop()
+            enter, leave = hooks(type(node))
+            if leaving:
+                self.left(node, leave(self, node))
+                continue
+            stack.append((node, True))
+            if enter(self, node) is SKIP:
+                continue
+            children = list(iter_children(node))
+            stack.extend((child, False) for child in reversed(children))
+        return self.result(root)
+
+    def left(self, node: Tree, replacement):
+        pass
+
+    def result(self, root: Tree):
+        return None
+
+
+class Transformer(Visitor):
+    def visit(self, root: Tree):
+        # id(原结点) -> 替换后的结点，只记录被换掉了的
+        self.replaced = {}
+        try:
+            return super().visit(root)
+        finally:
+            self.replaced = None
+
+    def left(self, node: Tree, replacement):
+        replaced = self.replaced
+        if replaced:
+            for name, many in child_slots(type(node)):
+                value = getattr(node, name, None)
+                if many and isinstance(value, list):
+                    if any(id(child) in replaced for child in value):
+                        children = (replaced.pop(id(child), child) for child in value)
+                        value[:] = [child for child in children if child is not None]
+                elif isinstance(value, Tree) and id(value) in replaced:
+                    setattr(node, name, replaced.pop(id(value)))
+        if replacement is not node:
+            replaced[id(node)] = replacement
+
+    def result(self, root: Tree):
+        return self.replaced.get(id(root), root)
+
+
+class TreeIndex:
+    """
+    按结点类和是否为错误结点建的索引，结点都按先序排列。树被修改后要重新建立
+    """
+
+    def __init__(self, root: Tree):
+        self.root = root
+        self.nodes: list[Tree] = []
+        # 结点类 -> 这一类结点在nodes中的位置
+        self.positions: dict[type, list[int]] = {}
+        self.errors: list[Tree] = []
+        for position, node in enumerate(walk(root)):
+            self.nodes.append(node)
+            positions = self.positions.get(type(node))
+            if positions is None:
+                positions = self.positions[type(node)] = []
+            positions.append(position)
+            if not node.is_normal_node:
+                self.errors.append(node)
+        return
+
+    def of(self, cls: type) -> list[Tree]:
+        """
+        cls及其子类的所有结点
+        """
+        groups = [positions for c, positions in self.positions.items() if issubclass(c, cls)]
+        nodes = self.nodes
+        return [nodes[position] for position in heapq.merge(*groups)]
+
+
+def find(tree, cls: type, index: TreeIndex = None, prune=None):
+    """
+    所有cls(及其子类)的结点。tree是FlatTree时给出结点下标
+    """
+    if isinstance(tree, FlatTree):
+        return _flat_find(tree, [_kind_of[c] for c in node_classes if issubclass(c, cls)])
+    if index is not None:
+        return iter(index.of(cls))
+    return (node for node in walk(tree, prune) if isinstance(node, cls))
+
+
+def error_nodes(tree, index: TreeIndex = None):
+    if isinstance(tree, FlatTree):
+        # 被丢弃的结点flags都是1，不会混进来
+        return _scan(bytes(tree.flags), 0)
+    if index is not None:
+        return iter(index.errors)
+    return (node for node in walk(tree) if not node.is_normal_node)
+
+
+def _flat_find(tree: FlatTree, kinds: list[int]):
+    data = bytes(tree.kinds)
+    if len(kinds) == 1:
+        return _scan(data, kinds[0])
+    wanted = set(kinds)
+    return (i for i, kind in enumerate(data) if kind in wanted and i)
+
+
+def _scan(data: bytes, value: int):
+    """
+    用bytes.find在C层面找出data中等于value的下标，跳过下标0的占位
+    """
+    byte = bytes([value])
+    pos = data.find(byte, 1)
+    while pos >= 0:
+        yield pos
+        pos = data.find(byte, pos + 1)